@@ -8,6 +8,7 @@ from .ioctrl import (
     ResourceNotFoundError,
     create_group,
     create_stream,
+    get_cache_path,
     get_logger,
     get_requested,
     get_resource_path,
@@ -27,6 +28,7 @@ __all__ = (
     'ResourceNotFoundError',
     'create_group',
     'create_stream',
+    'get_cache_path',
     'get_logger',
     'get_requested',
     'get_resource_path',
@@ -9,6 +9,7 @@ from marv_pycapnp import Wrapper
 
 from .iomsgs import (
     CreateStream,
+    GetCachePath,
     GetLogger,
     GetRequested,
     GetResourcePath,
@@ -50,6 +51,24 @@ def create_group(name, **header):
     return CreateStream(parent=None, name=name, group=True, header=header)
 
 
+def get_cache_path(name: str) -> GetCachePath:
+    """Request path to per-file cache directory in store.
+
+    Name cache entries by :func:`marv_api.utils.file_cache_key` of the
+    file they are derived from, optionally followed by an extension.
+    Entries of files no longer in the database are removed by ``marv
+    store gc``.
+
+    Args:
+        name: Name of cache directory, a valid identifier.
+
+    Returns:
+        GetCachePath request to yield to marv, responded to with None
+        if nodes are run without site.
+    """
+    return GetCachePath(name)
+
+
 def get_logger():
     return GetLogger()
 
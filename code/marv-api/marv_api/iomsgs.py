@@ -6,6 +6,7 @@ from collections import namedtuple
 from marv_node.stream import Handle  # noqa: F401,TC001  pylint: disable=unused-import
 
 CreateStream = namedtuple('CreateStream', 'parent name group header')
+GetCachePath = namedtuple('GetCachePath', 'name')
 GetLogger = namedtuple('GetLogger', '')
 GetRequested = namedtuple('GetRequested', '')
 GetResourcePath = namedtuple('GetResourcePath', 'name')
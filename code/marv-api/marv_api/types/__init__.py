@@ -30,6 +30,7 @@ from marv_pycapnp.types_capnp import (
     TimedUInt32,
     TimedUInt64,
     TimelineEvent,
+    TimeseriesChunk,
     Timeslice,
     UInt8Value,
     UInt16Value,
@@ -67,6 +68,7 @@ __all__ = (
     'TimedUInt64',
     'TimedUInt8',
     'TimelineEvent',
+    'TimeseriesChunk',
     'Timeslice',
     'UInt16Value',
     'UInt32Value',
@@ -1,6 +1,7 @@
 # Copyright 2020  Ternaris.
 # SPDX-License-Identifier: AGPL-3.0-only
 
+import hashlib
 import os
 import sys
 from contextlib import contextmanager
@@ -23,6 +24,11 @@ def err(*args, exit=None, **kw):
         sys.exit(exit)
 
 
+def file_cache_key(path, size, mtime):
+    """Create key of per-file cache entry from path, size, and mtime of file."""
+    return hashlib.sha256(f'{path}\0{size}\0{mtime}'.encode()).hexdigest()
+
+
 def find_obj(objpath, name=False):
     try:
         modpath, objname = objpath.split(':')
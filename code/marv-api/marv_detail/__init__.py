@@ -6,7 +6,7 @@ import json
 import capnp  # noqa: F401,TC002  pylint: disable=unused-import
 
 from marv_api.utils import err
-from marv_pycapnp import Wrapper
+from marv_pycapnp import Wrapper, struct_to_dict
 
 from .types_capnp import Detail  # noqa: F401,TC002  pylint: disable=import-error,unused-import
 from .types_capnp import Widget  # noqa: F401,TC002  pylint: disable=import-error,unused-import
@@ -31,7 +31,7 @@ FORMATTER_MAP = {
 
 
 def detail_to_dict(obj):
-    dct = obj.to_dict(verbose=True, which=True)
+    dct = struct_to_dict(obj, which=True)
     widgets = dct.get('summary', {'widgets': []})['widgets'][:]
     widgets.extend(widget for sec in dct['sections'] for widget in sec['widgets'])
     for widget in widgets:
@@ -47,7 +47,7 @@ def detail_to_dict(obj):
 
 def make_map_dict(dct):
     reader = Wrapper.from_dict(Widget.Map, dct)._reader  # pylint: disable=protected-access
-    mapdct = reader.to_dict(verbose=True, which=True)
+    mapdct = struct_to_dict(reader, which=True)
     fixup_map(mapdct)
     return mapdct
 
@@ -3,65 +3,330 @@
 
 from __future__ import annotations
 
+import threading
+from array import array
 from collections.abc import Mapping, Sequence
 from itertools import dropwhile, islice
+from keyword import iskeyword
 from pathlib import Path
 from pickle import PickleBuffer
 from typing import TYPE_CHECKING
 
-from capnp.lib.capnp import _DynamicEnum, _DynamicListReader, _DynamicStructReader
+from capnp.lib.capnp import _DynamicListReader, _DynamicStructReader
 
 if TYPE_CHECKING:
-    from typing import Callable, List
+    from typing import Callable, Dict, List, Tuple
 
 GETATTR_HOOKS: List[Callable] = []
 
+# Field types which are neither wrapped nor possibly unset
+PLAIN_TYPES = {
+    'bool', 'enum', 'float32', 'float64', 'int8', 'int16', 'int32', 'int64', 'uint8', 'uint16',
+    'uint32', 'uint64', 'void',
+}
+NO_DISCRIMINANT = 0xffff
 
-def _to_dict(value, field=None, field_type=None, which=False):
-    if isinstance(value, _DynamicStructReader):
-        schema = value.schema
-        dct = {}
-        for name in schema.non_union_fields:
-            dct[name] = _to_dict(getattr(value, name), field=schema.fields[name], which=which)
+# NumPy dtypes and capnp list element size codes of numeric element types
+ARRAY_TYPES = {
+    'bool': ('bool', 1),
+    'int8': ('<i1', 2),
+    'int16': ('<i2', 3),
+    'int32': ('<i4', 4),
+    'int64': ('<i8', 5),
+    'uint8': ('<u1', 2),
+    'uint16': ('<u2', 3),
+    'uint32': ('<u4', 4),
+    'uint64': ('<u8', 5),
+    'float32': ('<f4', 4),
+    'float64': ('<f8', 5),
+}
 
-        if schema.union_fields:
-            _which = value.which()
-            dct[_which] = _to_dict(getattr(value, _which), field=schema.fields[_which], which=which)
-            if which:
-                dct['_which'] = _which
+# Traversal limit for messages of arbitrary size held in memory
+TRAVERSAL_LIMIT = 2**63 - 1
 
-        return dct
+# Generated to_dict converters by struct schema id and which flag
+_CONVERTERS: Dict[Tuple[int, bool], Callable] = {}
 
-    if isinstance(value, _DynamicListReader):
-        element_type = (field_type or field.proto.slot.type).list.elementType
-        return [_to_dict(element, field_type=element_type, which=which) for element in value]
+# Converters being generated, published to _CONVERTERS once all are complete
+_PENDING: Dict[Tuple[int, bool], Callable] = {}
+_CONVERTERS_LOCK = threading.RLock()
 
-    if isinstance(value, _DynamicEnum):
-        return value._as_str()  # pylint: disable=protected-access
 
-    return value
+def struct_to_dict(reader, which=False):
+    """Convert struct reader recursively to dictionary.
+
+    Args:
+        reader: Capnp struct reader.
+        which: Add set union field names as ``_which``.
+
+    Returns:
+        Dictionary containing all fields.
+
+    """
+    return _struct_converter(reader.schema, which)(reader)
+
+
+def _enum_to_str(value):
+    return value._as_str()  # pylint: disable=protected-access
+
+
+def _make_converter(field_type, get_schema, which):
+    """Return function converting values of field type, None if no conversion needed."""
+    kind = field_type.which()
+    if kind in ('struct', 'group'):
+        return _struct_converter(get_schema(), which)
+
+    if kind == 'enum':
+        return _enum_to_str
+
+    if kind == 'list':
+        element_type = field_type.list.elementType
+        if element_type.which() == 'enum':
+            return lambda value: [x._as_str() for x in value]  # pylint: disable=protected-access
+        if element_type.which() in ('struct', 'list'):
+            convert = _make_converter(element_type, lambda: get_schema().elementType, which)
+            return lambda value: [convert(x) for x in value]
+        return list
 
+    return None
 
-def _wrap(value, streamdir, setdir, field=None, field_type=None):
+
+def _struct_converter(schema, which):
+    """Return function converting struct readers of schema to dicts.
+
+    The function is generated once per schema and cached. It reads all
+    fields, and the set union field; with which, the name of the latter
+    is stored as ``_which``.
+
+    Converters are generated under a lock and only published to the
+    cache once the converters of all nested structs are complete, other
+    threads never see placeholders of recursive references.
+    """
+    key = (schema.node.id, which)
+    converter = _CONVERTERS.get(key)
+    if converter is not None:
+        return converter
+
+    with _CONVERTERS_LOCK:
+        converter = _CONVERTERS.get(key) or _PENDING.get(key)
+        if converter is not None:
+            return converter
+
+        toplevel = not _PENDING
+        try:
+            converter = _generate_struct_converter(schema, which, key)
+            if toplevel:
+                _CONVERTERS.update(_PENDING)
+        finally:
+            if toplevel:
+                _PENDING.clear()
+        return converter
+
+
+def _generate_struct_converter(schema, which, key):
+    # Placeholder for recursive references while generating converters of fields
+    cell = []
+    _PENDING[key] = lambda reader: cell[0](reader)
+
+    namespace = {'union': {}}
+    items = []
+    for name in schema.non_union_fields:
+        field = schema.fields[name]
+        field_type = field.proto.slot.type if field.proto.which() == 'slot' else field.proto
+        convert = _make_converter(field_type, lambda field=field: field.schema, which)
+        access = f'getattr(reader, {name!r})' if iskeyword(name) else f'reader.{name}'
+        if convert is not None:
+            namespace[f'convert_{name}'] = convert
+            access = f'convert_{name}({access})'
+        items.append(f'        {name!r}: {access},')
+
+    lines = ['def convert(reader):', '    dct = {', *items, '    }']
+    if schema.union_fields:
+        for name in schema.union_fields:
+            field = schema.fields[name]
+            field_type = field.proto.slot.type if field.proto.which() == 'slot' else field.proto
+            namespace['union'][name] = _make_converter(
+                field_type,
+                lambda field=field: field.schema,
+                which,
+            )
+        lines += [
+            '    name = reader._which_str()',
+            '    value = getattr(reader, name)',
+            '    convert = union[name]',
+            '    dct[name] = value if convert is None else convert(value)',
+        ]
+        if which:
+            lines.append("    dct['_which'] = name")
+    lines.append('    return dct')
+
+    exec('\n'.join(lines), namespace)  # pylint: disable=exec-used
+    converter = _PENDING[key] = namespace['convert']
+    cell.append(converter)
+    return converter
+
+
+def _wrap(value, streamdir, setdir, field=None, field_type=None, parent=None):
     if isinstance(value, _DynamicStructReader):
         return Wrapper(value, streamdir, setdir)
 
     if isinstance(value, _DynamicListReader):
         if field:
             element_type = field.proto.slot.type.list.elementType
+            parent = (parent, field) if parent is not None else None
         else:
             element_type = field_type.list.elementType
-        return ListWrapper(value, element_type, streamdir, setdir)
+        return ListWrapper(value, element_type, streamdir, setdir, parent=parent)
 
     return value
 
 
+def _resolve_pointer(segments, seg, idx):
+    """Resolve pointer in word idx of segment seg, following far pointers.
+
+    Returns:
+        Tuple of segment index, word index of target, and pointer word
+        describing target.
+
+    """
+    ptr = int(segments[seg][idx])
+    if ptr & 3 == 2:
+        pad = (ptr >> 3) & 0x1fffffff
+        seg = ptr >> 32
+        if not ptr & 4:
+            return _resolve_pointer(segments, seg, pad)
+        far = int(segments[seg][pad])
+        return far >> 32, (far >> 3) & 0x1fffffff, int(segments[seg][pad + 1])
+
+    offset = (ptr >> 2) & 0x3fffffff
+    if offset & 0x20000000:
+        offset -= 0x40000000
+    return seg, idx + 1 + offset, ptr
+
+
+def _readonly(arr):
+    arr.flags.writeable = False
+    return arr
+
+
+def _is_array(value):
+    return isinstance(value, array) or hasattr(value, '__array_interface__')
+
+
+def _split_arrays(struct_schema, data, arrays, path=()):
+    """Replace arrays in data that can be set in bulk with empty lists.
+
+    Arrays are accepted for numeric lists and, if two-dimensional, for
+    numeric lists of lists in fields of the root and nested structs.
+
+    Args:
+        struct_schema: Schema of struct described by data.
+        data: Mapping of field names to values.
+        arrays: List to append tuples of pointer path, array, and
+            element type to.
+        path: Pointer indices leading to struct.
+
+    Returns:
+        Shallow copy of data, if it contained arrays, otherwise data.
+
+    """
+    if not isinstance(data, Mapping):
+        return data
+
+    result = data
+    for name, value in data.items():
+        parts = name.split('_')
+        field_name = parts[0] + ''.join(((x[0].upper() + x[1:]) if x else '_') for x in parts[1:])
+        field = struct_schema.fields.get(field_name)
+        if field is None or field.proto.which() != 'slot':
+            continue
+
+        field_type = field.proto.slot.type
+        which = field_type.which()
+        fieldpath = (*path, field.proto.slot.offset)
+        if which == 'struct':
+            value = _split_arrays(field.schema, value, arrays, fieldpath)
+            if value is data[name]:
+                continue
+        elif which == 'list' and _is_array(value):
+            element_type = field_type.list.elementType
+            ndim = 1
+            if element_type.which() == 'list':
+                element_type = element_type.list.elementType
+                ndim = 2
+            if element_type.which() not in ARRAY_TYPES or element_type.which() == 'bool':
+                continue
+            import numpy as np  # pylint: disable=import-outside-toplevel
+            value = np.asarray(value)
+            if value.ndim != ndim:
+                continue
+            arrays.append((fieldpath, value, element_type.which()))
+            value = []
+        else:
+            continue
+
+        if result is data:
+            result = dict(data)
+        result[name] = value
+    return result
+
+
+def _array_segment(arr, which):
+    """Create segment with landing pad followed by list content of array."""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    dtype, sizecode = ARRAY_TYPES[which]
+    arr = np.ascontiguousarray(arr.astype(dtype, casting='same_kind', copy=False))
+    if arr.ndim == 1:
+        words = (arr.nbytes + 7) // 8
+        segment = np.zeros(1 + words, dtype='<u8')
+        segment[0] = 1 | (sizecode << 32) | (len(arr) << 35)
+        segment.view(np.uint8)[8:8 + arr.nbytes] = arr.view(np.uint8)
+        return segment
+
+    count, size = arr.shape
+    rowbytes = size * arr.itemsize
+    words = (rowbytes + 7) // 8
+    segment = np.zeros(1 + count + count * words, dtype='<u8')
+    segment[0] = 1 | (6 << 32) | (count << 35)
+    idx = np.arange(count, dtype=np.uint64)
+    offsets = np.uint64(count - 1) + idx * np.uint64(words) - idx
+    segment[1:1 + count] = (
+        np.uint64(1) | offsets << np.uint64(2) | np.uint64(sizecode << 32 | size << 35)
+    )
+    if rowbytes:
+        content = segment[1 + count:].view(np.uint8).reshape(count, words * 8)
+        content[:, :rowbytes] = arr.view(np.uint8).reshape(count, rowbytes)
+    return segment
+
+
+def _from_dict_with_arrays(schema, dct, arrays):
+    """Build message and attach array content as segments of their own.
+
+    Every array field pointer is replaced by a far pointer to a
+    landing pad in an additional segment holding the list content.
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    buffers = [bytearray(x) for x in schema.new_message(**dct).to_segments()]
+    segments = [np.frombuffer(x, dtype='<u8') for x in buffers]
+    for fieldpath, arr, which in arrays:
+        seg, idx = 0, 0
+        for offset in fieldpath:
+            seg, start, ptr = _resolve_pointer(segments, seg, idx)
+            idx = start + ((ptr >> 32) & 0xffff) + offset
+        segments[seg][idx] = 2 | (len(buffers) << 32)
+        buffers.append(_array_segment(arr, which))
+    return schema.from_segments(buffers, traversal_limit_in_words=TRAVERSAL_LIMIT)
+
+
 class ListWrapper:
 
-    def __init__(self, list_reader, field_type, streamdir, setdir):
+    def __init__(self, list_reader, field_type, streamdir, setdir, parent=None):
         assert isinstance(list_reader, _DynamicListReader), type(list_reader)
         self._field_type = field_type
         self._reader = list_reader
+        self._parent = parent
         self._streamdir = Path(streamdir) if streamdir else None
         self._setdir = Path(setdir) if setdir else None
 
@@ -85,8 +350,166 @@ class ListWrapper:
     def __repr__(self):
         return f"[{', '.join([repr(x) for x in self])}]"
 
+    def as_array(self):
+        """Return numeric list or list of equally sized numeric lists as NumPy array.
+
+        The returned array is read-only. As pycapnp does not expose the
+        memory of message readers, the struct containing the list is
+        copied once in bulk into a message of its own and the array is
+        a view into that copy. Lists not directly accessed as a struct
+        field are converted element-wise.
+
+        Returns:
+            One- or two-dimensional array.
+
+        Raises:
+            TypeError: List elements are not numeric or numeric lists.
+            ValueError: Nested lists differ in length.
+
+        """
+        import numpy as np  # pylint: disable=import-outside-toplevel
+
+        which = self._field_type.which()
+        nested = which == 'list'
+        if nested:
+            which = self._field_type.list.elementType.which()
+        if which not in ARRAY_TYPES:
+            raise TypeError(f'Cannot convert list of {which} to array')
+        dtype, sizecode = ARRAY_TYPES[which]
+
+        count = len(self._reader)
+        if not count:
+            return _readonly(np.empty((0, 0) if nested else 0, dtype=dtype))
+
+        if self._parent is None or nested and sizecode == 1:
+            return self._as_array_fallback(np, dtype)
+
+        struct_reader, field = self._parent
+        words = struct_reader.total_size.word_count + 1
+        buffers = struct_reader.as_builder(num_first_segment_words=words).to_segments()
+        segments = [np.frombuffer(x, dtype='<u8') for x in buffers]
+        seg, start, ptr = _resolve_pointer(segments, 0, 0)
+        pointer_idx = start + ((ptr >> 32) & 0xffff) + field.proto.slot.offset
+        seg, start, ptr = _resolve_pointer(segments, seg, pointer_idx)
+        assert ptr >> 35 == count, (ptr, count)
+
+        if not nested:
+            if sizecode == 1:
+                bits = np.frombuffer(buffers[seg], dtype=np.uint8, offset=start * 8)
+                return _readonly(np.unpackbits(bits, count=count, bitorder='little').astype(bool))
+            return np.frombuffer(buffers[seg], dtype=dtype, count=count, offset=start * 8)
+
+        return self._as_nested_array(np, dtype, buffers[seg], segments[seg][start:start + count],
+                                     start)
+
+    def _as_nested_array(self, np, dtype, buf, ptrs, start):  # pylint: disable=too-many-arguments
+        if np.any(ptrs & np.uint64(3) != 1):
+            return self._as_array_fallback(np, dtype)
+
+        count = len(ptrs)
+        sizes = ptrs >> np.uint64(35)
+        if np.any(sizes != sizes[0]):
+            raise ValueError('Cannot convert lists of differing lengths to array')
+        size = int(sizes[0])
+        if not size:
+            return _readonly(np.empty((count, 0), dtype=dtype))
+
+        # Inner lists are usually laid out back to back; otherwise copy them
+        offsets = ((ptrs >> np.uint64(2)) & np.uint64(0x3fffffff)).astype(np.int64)
+        offsets[offsets >= 0x20000000] -= 0x40000000
+        targets = start + np.arange(count) + 1 + offsets
+        steps = np.diff(targets)
+        if count > 1 and np.any(steps != steps[0]):
+            return self._as_array_fallback(np, dtype)
+
+        itemsize = np.dtype(dtype).itemsize
+        return _readonly(np.ndarray(
+            shape=(count, size),
+            dtype=dtype,
+            buffer=buf,
+            offset=int(targets[0]) * 8,
+            strides=(int(steps[0]) * 8 if count > 1 else size * itemsize, itemsize),
+        ))
+
+    def _as_array_fallback(self, np, dtype):
+        if self._field_type.which() == 'list':
+            return _readonly(np.array([list(x) for x in self._reader], dtype=dtype))
+        return _readonly(np.array(list(self._reader), dtype=dtype))
+
+
+def _snake_case(name):
+    return ''.join(f'_{x.lower()}' if x.isupper() else x for x in name)
+
+
+def _make_field_property(name, field):
+    """Create property for field with behavior of Wrapper.__getattr__."""
+    proto = field.proto
+    field_name = proto.name
+    kind = proto.slot.type.which() if proto.which() == 'slot' else 'group'
+    needs_has = kind not in PLAIN_TYPES or proto.discriminantValue != NO_DISCRIMINANT
+    slow = Wrapper.__getattr__
+
+    if kind in PLAIN_TYPES:
+
+        def getter(self):
+            if GETATTR_HOOKS or needs_has and not self._reader._has(field_name):
+                return slow(self, name)
+            return getattr(self._reader, field_name)
+
+    elif kind == 'list':
+        element_type = proto.slot.type.list.elementType
+
+        def getter(self):
+            if GETATTR_HOOKS or not self._reader._has(field_name):
+                return slow(self, name)
+            value = getattr(self._reader, field_name)
+            return ListWrapper(value, element_type, self._streamdir, self._setdir,
+                               parent=(self._reader, field))
+
+    else:
+
+        def getter(self):
+            if GETATTR_HOOKS or needs_has and not self._reader._has(field_name):
+                return slow(self, name)
+            value = getattr(self._reader, field_name)
+            return _wrap(value, self._streamdir, self._setdir, field=field, parent=self._reader)
+
+    getter.__name__ = name
+    return property(getter)
+
+
+def _make_wrapper_class(schema):
+    """Create Wrapper subclass with precomputed properties for schema fields.
+
+    Properties are created for camelCase field names and their
+    snake_case equivalents, unless shadowed by Wrapper attributes.
+    """
+    namespace = {'__slots__': (), '_generated': True}
+    for field_name, field in schema.fields.items():
+        for name in {field_name, _snake_case(field_name)}:
+            parts = name.split('_')
+            camel = parts[0] + ''.join(((x[0].upper() + x[1:]) if x else '_') for x in parts[1:])
+            if camel != field_name or hasattr(Wrapper, name) or name == 'userdata':
+                continue
+            namespace[name] = _make_field_property(name, field)
+    return type(f'Wrapper_{schema.node.displayName.rsplit(":", 1)[-1]}', (Wrapper,), namespace)
+
 
 class Wrapper:
+    _generated = False
+    _classes: Dict[int, type] = {}
+
+    def __new__(cls, struct_reader, *args, **kw):  # pylint: disable=unused-argument
+        if cls is not Wrapper:
+            return super().__new__(cls)
+
+        schema = struct_reader.schema
+        key = schema.node.id
+        try:
+            wrapper_class = Wrapper._classes[key]
+        except KeyError:
+            wrapper_class = Wrapper._classes[key] = _make_wrapper_class(schema)
+        return super().__new__(wrapper_class)
 
     def __init__(self, struct_reader, streamdir, setdir, storedir=None, userdata=None):
         assert isinstance(struct_reader, _DynamicStructReader), type(struct_reader)
@@ -110,7 +533,8 @@ class Wrapper:
             'storedir': str(self._storedir),
         }
         segments = builder.to_segments()
-        return (self.from_segments, (meta, *[PickleBuffer(x) for x in segments]))
+        cls = Wrapper if self._generated else type(self)
+        return (cls.from_segments, (meta, *[PickleBuffer(x) for x in segments]))
 
     @property
     def path(self):
@@ -152,6 +576,11 @@ class Wrapper:
         setid = self._setdir.name
         parts = list(islice(dropwhile(lambda x: x != setid, path.parts), 1, None))
 
+        # Stream linked from dataset with identical files, located by streamdir name
+        if not parts and self._streamdir:
+            names = (self._streamdir.name, f'.{self._streamdir.name}')
+            parts = list(dropwhile(lambda x: x not in names, path.parts))
+
         # Path to temporary streamdir during initial node run
         if parts[0][0] == '.':
             parts[0] = parts[0][1:]
@@ -163,7 +592,7 @@ class Wrapper:
         from marv_api.utils import find_obj  # pylint: disable=import-outside-toplevel
 
         schema = find_obj(meta.pop('protoname'))
-        struct_reader = schema.from_segments(segments)
+        struct_reader = schema.from_segments(segments, traversal_limit_in_words=TRAVERSAL_LIMIT)
         return cls(struct_reader, **meta)
 
     @classmethod
@@ -173,12 +602,16 @@ class Wrapper:
         setid = data.pop('id', None)
         if isinstance(setid, SetID):
             data['id0'], data['id1'] = setid.lohi
-        dct = cls._unwrap(data)
-        struct_reader = schema.new_message(**dct).as_reader()
+        arrays = []
+        dct = cls._unwrap(_split_arrays(schema.schema, data, arrays))
+        if arrays:
+            struct_reader = _from_dict_with_arrays(schema, dct, arrays)
+        else:
+            struct_reader = schema.new_message(**dct).as_reader()
         return cls(struct_reader, streamdir, setdir, userdata=userdata)
 
     def to_dict(self, which=None):
-        return _to_dict(self._reader, which=which)
+        return struct_to_dict(self._reader, which=bool(which))
 
     def load(self, node):
         from marv_store import Store  # pylint: disable=import-outside-toplevel
@@ -191,6 +624,9 @@ class Wrapper:
         if isinstance(data, Mapping):
             return {k: unwrap(v) for k, v in data.items()}
 
+        if _is_array(data):
+            return data.tolist()
+
         if isinstance(data, Sequence) and not isinstance(data, (bytes, str)):
             return [unwrap(x) for x in data]
 
@@ -214,7 +650,7 @@ class Wrapper:
         if field_name in self._reader.schema.fieldnames and self._reader._has(field_name):
             field = self._reader.schema.fields[field_name]
             value = getattr(self._reader, name)
-            return _wrap(value, self._streamdir, self._setdir, field=field)
+            return _wrap(value, self._streamdir, self._setdir, field=field, parent=self._reader)
 
         if name == 'id' and self._reader._has('id0') and self._reader._has('id1'):
             return SetID(self._reader.id0, self._reader.id1)
@@ -2,15 +2,20 @@
 # SPDX-License-Identifier: AGPL-3.0-only
 
 import pickle
+import sys
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from threading import Barrier
 
 import capnp  # noqa: F401,TC002  pylint: disable=unused-import
 import pytest
 
+import marv_pycapnp
 from marv_api.types import File
-from marv_pycapnp import Wrapper
+from marv_pycapnp import Wrapper, struct_to_dict
 
-from .test_wrapper_capnp import TestStruct  # pylint: disable=import-error
+from .test_wrapper_capnp import NumericLists, TestStruct  # pylint: disable=import-error
 
 
 def test():
@@ -182,6 +187,16 @@ def test_file_wrapper():
     assert wrapper.path == '/path/to/moved/setdir/streamdir/file'
     assert wrapper.relpath == 'streamdir/file'
 
+    # Linked from other set, streamdir of same name within setdir
+    wrapper = Wrapper.from_dict(
+        File,
+        {'path': '/path/to/othersetdir/.streamdir/file'},
+        setdir='/path/to/setdir',
+        streamdir='/path/to/setdir/streamdir',
+    )
+    assert wrapper.path == '/path/to/setdir/streamdir/file'
+    assert wrapper.relpath == 'streamdir/file'
+
     # Moved, but old path exists, i.e. copied
     # Rhe last component of setdir is the setid, which usually is a random hash and looked for
     # in the stored path to return the new path.
@@ -192,3 +207,156 @@ def test_file_wrapper():
         streamdir='/irrelevant',
     )
     assert wrapper.path == f'/path/to/moved/{Path(__file__).parent.name}/{Path(__file__).name}'
+
+
+def test_generated_wrapper_class(monkeypatch):
+    wrapper = Wrapper.from_dict(TestStruct, {'textList': ['foo'], 'enum': 'bar'})
+    other = Wrapper(TestStruct.new_message().as_reader(), streamdir=None, setdir=None)
+    assert type(wrapper) is type(other)
+    assert type(wrapper) is not Wrapper
+    assert isinstance(wrapper, Wrapper)
+    assert 'text_list' in vars(type(wrapper))
+    assert 'textList' in vars(type(wrapper))
+    assert wrapper.text_list == wrapper.textList == ['foo']
+    assert wrapper.enum == 'bar'
+
+    roundtrip = pickle.loads(pickle.dumps(wrapper, protocol=5))
+    assert type(roundtrip) is type(wrapper)
+    assert roundtrip.to_dict() == wrapper.to_dict()
+
+    file = Wrapper.from_dict(File, {'path': '/foo'})
+    assert 'path' not in vars(type(file))
+    assert file.path == '/foo'
+
+    monkeypatch.setattr(
+        'marv_pycapnp.GETATTR_HOOKS',
+        [lambda wrapper, name, attr: (attr == 'text_list', 'hooked')],
+    )
+    assert wrapper.text_list == 'hooked'
+    assert wrapper.enum == 'bar'
+
+
+def test_list_as_array():
+    np = pytest.importorskip('numpy')
+    wrapper = Wrapper.from_dict(NumericLists, {
+        'float64List': [0.5, 1.5, 2.5],
+        'int16List': [-1, 2, -3],
+        'boolList': [True, False, True, True, False, False, False, False, True],
+        'float64ListInList': [[1., 2.], [3., 4.], [5., 6.]],
+        'textList': ['foo'],
+        'nestedList': [{'float64List': [7.]}],
+    })
+
+    array = wrapper.float64_list.as_array()
+    assert array.dtype == np.float64
+    assert array.tolist() == [0.5, 1.5, 2.5]
+    assert not array.flags.writeable
+
+    assert wrapper.int16_list.as_array().dtype == np.int16
+    assert wrapper.int16_list.as_array().tolist() == [-1, 2, -3]
+    assert wrapper.bool_list.as_array().tolist() == wrapper.bool_list[:]
+
+    array = wrapper.float64_list_in_list.as_array()
+    assert array.shape == (3, 2)
+    assert array.tolist() == [[1., 2.], [3., 4.], [5., 6.]]
+    assert not array.flags.writeable
+    assert wrapper.float64_list_in_list[1].as_array().tolist() == [3., 4.]
+    assert wrapper.nested_list[0].float64_list.as_array().tolist() == [7.]
+
+    empty = Wrapper.from_dict(NumericLists, {'float64List': [], 'float64ListInList': []})
+    assert empty.float64_list.as_array().shape == (0,)
+    assert empty.float64_list_in_list.as_array().shape == (0, 0)
+
+    ragged = Wrapper.from_dict(NumericLists, {'float64ListInList': [[1.], [2., 3.]]})
+    with pytest.raises(ValueError, match='differing lengths'):
+        ragged.float64_list_in_list.as_array()
+
+    with pytest.raises(TypeError):
+        wrapper.text_list.as_array()
+
+
+def test_from_dict_arrays():
+    np = pytest.importorskip('numpy')
+    values = np.arange(12.).reshape(4, 3)
+    wrapper = Wrapper.from_dict(NumericLists, {
+        'float64ListInList': values,
+        'float64List': array('d', [0.5, 1.5]),
+        'int16List': np.array([-1, 2, -3]),
+        'boolList': np.array([True, False]),
+        'textList': ['foo'],
+        'nestedList': [{'float64List': np.array([7.])}],
+    })
+    assert wrapper.float64_list_in_list.as_array().tolist() == values.tolist()
+    assert wrapper.float64_list == [0.5, 1.5]
+    assert wrapper.int16_list == [-1, 2, -3]
+    assert wrapper.bool_list == [True, False]
+    assert wrapper.text_list == ['foo']
+    assert wrapper.nested_list[0].float64_list == [7.]
+
+    roundtrip = pickle.loads(pickle.dumps(wrapper, protocol=5))
+    assert roundtrip.to_dict() == wrapper.to_dict()
+
+    wrapper = Wrapper.from_dict(NumericLists, {
+        'float64ListInList': np.arange(6, dtype=np.float32).reshape(3, 2)[:, :1],
+        'float64List': np.array([]),
+    })
+    assert wrapper.float64_list_in_list == [[0.], [2.], [4.]]
+    assert wrapper.float64_list == []
+
+    with pytest.raises(TypeError):
+        Wrapper.from_dict(NumericLists, {'int16List': np.array([1.5])})
+
+
+def test_struct_to_dict():
+    reader = TestStruct.new_message(
+        nestedList=[{'enum': 'bar', 'nestedList': [{'unionData': b'foo'}]}],
+        textListInList=[['foo']],
+    ).as_reader()
+    dct = struct_to_dict(reader)
+    assert '_which' not in dct
+    assert dct['unionText'] == ''
+    assert dct['textListInList'] == [['foo']]
+    assert dct['nestedList'][0]['enum'] == 'bar'
+    assert dct['nestedList'][0]['nestedList'][0]['unionData'] == b'foo'
+    assert dct['union'] == {'text': ''}
+
+    dct = struct_to_dict(reader, which=True)
+    assert dct['_which'] == 'unionText'
+    assert dct['union'] == {'text': '', '_which': 'text'}
+    assert dct['group'] == {'text': '', 'data': b''}
+    assert dct['nestedList'][0]['nestedList'][0]['_which'] == 'unionData'
+    assert dct == Wrapper(reader, None, None).to_dict(which=True)
+
+
+def test_struct_to_dict_concurrent(monkeypatch):
+    monkeypatch.setattr(marv_pycapnp, '_CONVERTERS', {})
+    reader = TestStruct.new_message(
+        nestedList=[{'enum': 'bar', 'nestedList': [{'unionData': b'foo'}]}],
+    ).as_reader()
+    expected = struct_to_dict(reader, which=True)
+
+    # generation failure leaves no placeholders behind
+    monkeypatch.setattr(marv_pycapnp, '_CONVERTERS', {})
+    with monkeypatch.context() as mpatch:
+        mpatch.setattr(marv_pycapnp, 'iskeyword', lambda name: 1 / 0)
+        with pytest.raises(ZeroDivisionError):
+            struct_to_dict(reader, which=True)
+    assert not marv_pycapnp._CONVERTERS  # pylint: disable=protected-access
+    assert not marv_pycapnp._PENDING  # pylint: disable=protected-access
+
+    workers = 8
+    barrier = Barrier(workers)
+
+    def convert(_):
+        barrier.wait()
+        return struct_to_dict(reader, which=True)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for _ in range(10):
+            monkeypatch.setattr(marv_pycapnp, '_CONVERTERS', {})
+            with ThreadPoolExecutor(workers) as executor:
+                assert list(executor.map(convert, range(workers))) == [expected] * workers
+    finally:
+        sys.setswitchinterval(interval)
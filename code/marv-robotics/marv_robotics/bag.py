@@ -2,18 +2,32 @@
 # SPDX-License-Identifier: AGPL-3.0-only
 
 import heapq
+import json
+import os
 import re
-import sys
+import sqlite3
+import struct
+import time
 import warnings
-from collections import defaultdict, namedtuple
-from contextlib import ExitStack, contextmanager
+from collections import Counter, OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager, suppress
+from functools import partial
+from io import BytesIO
 from itertools import groupby
 from logging import getLogger
 from os import walk
 from pathlib import Path
 
 import capnp  # noqa: F401,TC002  pylint: disable=unused-import
+import numpy as np
+from mcap.data_stream import ReadDataStream
+from mcap.exceptions import McapError
+from mcap.opcode import Opcode
+from mcap.reader import make_reader as make_mcap_reader
+from mcap.records import MessageIndex
 from rosbags import rosbag1, rosbag2, serde
+from rosbags.rosbag2.reader import decompress as rosbag2_decompress
 from rosbags.serde.messages import MSGDEFCACHE
 from rosbags.typesys import get_types_from_idl, get_types_from_msg, register_types, types
 from rosbags.typesys.msg import normalize_msgtype
@@ -21,8 +35,31 @@ from rosbags.typesys.msg import normalize_msgtype
 import marv_api as marv
 import marv_nodes
 from marv_api import DatasetInfo, ReaderError
+from marv_api.utils import file_cache_key
+from marv_pycapnp import Wrapper
 
-from .bag_capnp import Bagmeta, Message  # pylint: disable=import-error
+from .bag_capnp import Bagmeta, Message, TopicStats  # pylint: disable=import-error
+
+# Bag files whose meta information is read concurrently
+BAGMETA_WORKERS = 8
+
+# Segment zero of a Message built around an existing data buffer: root
+# pointer, struct (tidx, timestamp, data pointer), and a double-far landing
+# pad pointing to segment one, which is the data buffer itself.
+MESSAGE_SEGMENT = struct.Struct('<QQQQQQ')
+MESSAGE_ROOT = 0 | (2 << 32) | (1 << 48)
+MESSAGE_DATA_FAR = 2 | (1 << 2) | (4 << 3)
+MESSAGE_LANDING_PAD = 2 | (1 << 32)
+MESSAGE_MAX_SIZE = (1 << 29) - 1
+MESSAGE_TRAVERSAL_LIMIT = 2**63 - 1
+
+# Size of rosbag1 message data record without data: header length,
+# op, conn, and time header fields, and data length.
+ROSBAG1_RECORD_OVERHEAD = 4 + 8 + 13 + 17 + 4
+
+# Size of MCAP message record without data: opcode, record length,
+# channel id, sequence, log time, and publish time.
+MCAP_RECORD_OVERHEAD = 1 + 8 + 2 + 4 + 8 + 8
 
 
 class Baginfo(namedtuple('Baginfo', 'filename basename prefix timestamp idx')):
@@ -117,9 +154,9 @@ def dirscan(dirpath, dirnames, filenames):
 
     For rosbag2 datasets this scanner behaves identical to default :py:func:`scan` below.
 
-    For ROS1 bag files it looks for directories containing at least one bag file and will create a
-    dataset with all files contained, ignoring further subdirectories, including rosbag2 datasets;
-    warnings are logged if any such subdirectories are ignored.
+    For ROS1 bag and MCAP files it looks for directories containing at least one such file and
+    will create a dataset with all files contained, ignoring further subdirectories, including
+    rosbag2 datasets; warnings are logged if any such subdirectories are ignored.
 
     """
     log = getLogger(f'{__name__}.dirscan')
@@ -128,7 +165,7 @@ def dirscan(dirpath, dirnames, filenames):
     if dataset:
         return [dataset]
 
-    if not any(x.endswith('.bag') for x in filenames):
+    if not any(x.endswith(('.bag', '.mcap')) for x in filenames):
         return []
 
     if dirnames:
@@ -139,7 +176,7 @@ def dirscan(dirpath, dirnames, filenames):
 
 
 def scan(dirpath, dirnames, filenames):  # pylint: disable=unused-argument
-    """Scan for sets of ROS bag files (ROS1 and ROS2).
+    """Scan for sets of ROS bag files (ROS1, ROS2, and MCAP).
 
     Find rosbag2 datasets and log warnings if they contain additional files, not listed in
     metadata.yaml
@@ -162,6 +199,8 @@ def scan(dirpath, dirnames, filenames):  # pylint: disable=unused-argument
     In this example the bag with index 2 is missing which results in
     foo_3 and foo_4 to be individual sets with one bag each.
 
+    MCAP files are self-contained, each one results in a set of its own.
+
     The timestamps used by ``rosbag record`` are stripped from the
     name given to sets, but are kept for the remaining individual sets
     in case a bag is missing::
@@ -228,6 +267,8 @@ def scan(dirpath, dirnames, filenames):  # pylint: disable=unused-argument
                 bags[:] = []
         datasets[0:0] = [DatasetInfo(x.basename, [x.filename]) for x in bags]
         bags[:] = []
+
+    datasets.extend(DatasetInfo(x[:-5], [x]) for x in filenames if x.endswith('.mcap'))
     return datasets
 
 
@@ -267,6 +308,137 @@ def open_rosbag1(path):
         ) from None
 
 
+@contextmanager
+def open_mcap(path):
+    """Open MCAP file and read its summary section.
+
+    Yields:
+        Tuple of MCAP reader and summary.
+
+    """
+    with open(path, 'rb') as f:
+        try:
+            reader = make_mcap_reader(f)
+            summary = reader.get_summary()
+        except (McapError, ValueError) as e:
+            raise ReaderError(f'Unreadable MCAP file: {path}\n  {e}') from None
+        if summary is None or summary.statistics is None:
+            raise ReaderError(
+                (
+                    f'MCAP file without summary: {path}\n'
+                    '  File was not copied in full or recording did not finish properly\n'
+                    '  Use `mcap recover` to recover what is there.'
+                ),
+            )
+        yield reader, summary
+
+
+def _register_mcap_types(summary):
+    typs = {}
+    for schema in summary.schemas.values():
+        if schema.encoding in ('ros1msg', 'ros2msg'):
+            typs.update(get_types_from_msg(schema.data.decode(), normalize_msgtype(schema.name)))
+        elif schema.encoding == 'ros2idl':
+            typs.update(get_types_from_idl(schema.data.decode()))
+    register_types(typs)
+
+
+def _read_bagmeta1(path):
+    """Read meta information of one rosbag1 file."""
+    with open_rosbag1(path) as bag:
+        try:
+            start_time = int(bag.start_time)
+            end_time = int(bag.end_time)
+        except ValueError:
+            start_time = 0
+            end_time = 0
+
+        connections = [
+            {
+                'topic': x.topic,
+                'datatype': x.msgtype,
+                'md5sum': x.md5sum,
+                'msg_def': x.msgdef,
+                'msg_count': len(x.indexes),
+                'latching': bool(x.latching),
+            } for x in bag.connections.values()
+        ]
+
+    return {
+        'start_time': start_time,
+        'end_time': end_time,
+        'duration': end_time - start_time,
+        'msg_count': sum(x['msg_count'] for x in connections),
+        'connections': connections,
+        'version': 200,
+    }
+
+
+def _read_bagmeta_mcap(path):
+    """Read meta information of one MCAP file from its summary section."""
+    with open_mcap(path) as (_, summary):
+        stats = summary.statistics
+        connections = []
+        for cid, channel in sorted(summary.channels.items()):
+            schema = summary.schemas.get(channel.schema_id)
+            connections.append(
+                {
+                    'topic': channel.topic,
+                    'datatype': normalize_msgtype(schema.name) if schema else '',
+                    'md5sum': channel.metadata.get('md5sum', ''),
+                    'msg_def': schema.data.decode() if schema else '',
+                    'msg_count': stats.channel_message_counts.get(cid, 0),
+                    'latching': channel.metadata.get('latching') in ('1', 'true'),
+                    'serialization_format': channel.message_encoding,
+                },
+            )
+
+    start_time = stats.message_start_time if stats.message_count else 0
+    end_time = stats.message_end_time + 1 if stats.message_count else 0
+    return {
+        'start_time': start_time,
+        'end_time': end_time,
+        'duration': end_time - start_time,
+        'msg_count': stats.message_count,
+        'connections': connections,
+    }
+
+
+def _read_bagmeta_file(path):
+    return _read_bagmeta_mcap(path) if path.endswith('.mcap') else _read_bagmeta1(path)
+
+
+def _read_bagmeta_cached(cachedir, path, size, mtime):
+    """Read meta information of one rosbag1 or MCAP file, if not cached.
+
+    Args:
+        cachedir: Path of cache directory, or None to not cache.
+        path: Path of bag file.
+        size: Size of bag file.
+        mtime: Modification time of bag file.
+
+    Returns:
+        Tuple of meta information and whether it was read from cache.
+
+    """
+    if cachedir is None:
+        return _read_bagmeta_file(path), False
+
+    key = file_cache_key(path, size, mtime)
+    cachefile = cachedir / f'{key}.json'
+    with suppress(OSError, ValueError):
+        return json.loads(cachefile.read_text()), True
+
+    meta = _read_bagmeta_file(path)
+    try:
+        tmpfile = cachefile.with_name(f'.{key}.{os.getpid()}.{id(meta)}')
+        tmpfile.write_text(json.dumps(meta))
+        tmpfile.replace(cachefile)
+    except OSError as e:
+        getLogger(__name__).warning('Could not cache bag meta information: %s', e)
+    return meta, False
+
+
 @marv.node(Bagmeta)
 @marv.input('dataset', marv_nodes.dataset)
 def bagmeta(dataset):
@@ -277,6 +449,12 @@ def bagmeta(dataset):
 
     A topic's message type and latching mode, and a message type's
     md5sum are assumed not to change across split bags.
+
+    Meta information of individual rosbag1 and MCAP files is read
+    concurrently and cached by path, size, and mtime in the store, see
+    :func:`marv_api.get_cache_path`. Subsequent runs, e.g. after adding
+    a split bag or when forced, only read changed files. For MCAP files
+    only the summary section is read.
     """
     # pylint: disable=too-many-locals
 
@@ -288,61 +466,32 @@ def bagmeta(dataset):
             yield marv.push(meta)
             return
 
-    paths = [x.path for x in files if x.path.endswith('.bag')]
+    keys = [(x.path, x.size, x.mtime) for x in files if x.path.endswith(('.bag', '.mcap'))]
+    cachedir = yield marv.get_cache_path('bagmeta')
+    with ThreadPoolExecutor(max_workers=BAGMETA_WORKERS) as executor:
+        results = list(executor.map(lambda x: _read_bagmeta_cached(cachedir, *x), keys))
+    bags = [x for x, _ in results]
+    if keys:
+        log = yield marv.get_logger()
+        log.verbose('read %d of %d bags, rest cached', sum(not x for _, x in results), len(keys))
 
-    bags = []
-    start_time = sys.maxsize
-    end_time = 0
     connections = {}
-    for path in paths:
-        with open_rosbag1(path) as bag:
-            try:
-                _start_time = int(bag.start_time)
-                _end_time = int(bag.end_time)
-            except ValueError:
-                _start_time = sys.maxsize
-                _end_time = 0
-
-            start_time = _start_time if _start_time < start_time else start_time
-            end_time = _end_time if _end_time > end_time else end_time
-
-            _connections = [
-                {
-                    'topic': x.topic,
-                    'datatype': x.msgtype,
-                    'md5sum': x.md5sum,
-                    'msg_def': x.msgdef,
-                    'msg_count': len(x.indexes),
-                    'latching': bool(x.latching),
-                } for x in bag.connections.values()
-            ]
-
-            _start_time = _start_time if _start_time != sys.maxsize else 0
-            bags.append(
-                {
-                    'start_time': _start_time,
-                    'end_time': _end_time,
-                    'duration': _end_time - _start_time,
-                    'msg_count': sum(x['msg_count'] for x in _connections),
-                    'connections': _connections,
-                    'version': 200,
-                },
-            )
-
-            for _con in _connections:
-                key = (_con['topic'], _con['datatype'], _con['md5sum'])
-                con = connections.get(key)
-                if con:
-                    con['msg_count'] += _con['msg_count']
-                    con['latching'] = con['latching'] or _con['latching']
-                else:
-                    connections[key] = _con.copy()
+    for bag in bags:
+        for _con in bag['connections']:
+            key = (_con['topic'], _con['datatype'], _con['md5sum'])
+            con = connections.get(key)
+            if con:
+                con['msg_count'] += _con['msg_count']
+                con['latching'] = con['latching'] or _con['latching']
+            else:
+                connections[key] = _con.copy()
 
     connections = sorted(
         connections.values(),
         key=lambda x: (x['topic'], x['datatype'], x['md5sum']),
     )
-    start_time = start_time if start_time != sys.maxsize else 0
+    start_time = min((x['start_time'] for x in bags if x['end_time']), default=0)
+    end_time = max((x['end_time'] for x in bags), default=0)
     yield marv.push(
         {
             'start_time': start_time,
@@ -357,8 +506,214 @@ def bagmeta(dataset):
     )
 
 
+def _index_rosbag1(path):
+    """Read timestamps and estimated message sizes from rosbag1 index.
+
+    The index does not record message sizes. They are estimated from the
+    offsets of consecutive records within a chunk, the size of the last
+    message in each chunk is unknown and set to -1.
+
+    """
+    with open_rosbag1(path) as bag:
+        connections = list(bag.connections.values())
+        entries = np.array(
+            [
+                (x.time, x.chunk_pos, x.offset, cidx)
+                for cidx, con in enumerate(connections)
+                for x in con.indexes
+            ],
+            dtype=np.int64,
+        ).reshape(-1, 4)
+
+    order = np.lexsort((entries[:, 2], entries[:, 1]))
+    chunk_pos = entries[order, 1]
+    offsets = entries[order, 2]
+    sizes = np.full(len(entries), -1, dtype=np.int64)
+    sizes[order[:-1]] = np.where(
+        chunk_pos[1:] == chunk_pos[:-1],
+        offsets[1:] - offsets[:-1] - ROSBAG1_RECORD_OVERHEAD,
+        -1,
+    )
+
+    for cidx, con in enumerate(connections):
+        mask = entries[:, 3] == cidx
+        yield con.topic, con.msgtype, entries[mask, 0], sizes[mask]
+
+
+def _index_mcap(path):
+    """Read timestamps and estimated message sizes from MCAP message indexes.
+
+    The message indexes following each chunk record offsets of messages
+    within the uncompressed chunk. Message sizes are estimated from the
+    offsets of consecutive messages and the end of their chunk. Files
+    without message indexes are skipped with a warning.
+
+    """
+    with open_mcap(path) as (_, summary), open(path, 'rb') as f:
+        chunk_indexes = summary.chunk_indexes
+        indexed = chunk_indexes and all(x.message_index_offsets for x in chunk_indexes)
+        if summary.statistics.message_count and not indexed:
+            getLogger(__name__).warning('skipping MCAP file without message indexes: %s', path)
+            return
+
+        chunk_sizes = []
+        entries = []
+        for chunk_no, chunk_index in enumerate(chunk_indexes):
+            chunk_sizes.append(chunk_index.uncompressed_size)
+            f.seek(chunk_index.chunk_start_offset + chunk_index.chunk_length)
+            stream = ReadDataStream(BytesIO(f.read(chunk_index.message_index_length)))
+            while stream.count < chunk_index.message_index_length:
+                opcode = stream.read1()
+                end = stream.read8() + stream.count
+                if opcode == Opcode.MESSAGE_INDEX:
+                    index = MessageIndex.read(stream)
+                    entries.extend(
+                        (timestamp, chunk_no, offset, index.channel_id)
+                        for timestamp, offset in index.records
+                    )
+                stream.read(end - stream.count)
+
+    entries = np.array(entries, dtype=np.int64).reshape(-1, 4)
+    order = np.lexsort((entries[:, 2], entries[:, 1]))
+    chunks = entries[order, 1]
+    offsets = entries[order, 2]
+    ends = np.append(offsets[1:], 0)
+    last = np.append(chunks[1:] != chunks[:-1], True)
+    ends[last] = np.array(chunk_sizes, dtype=np.int64)[chunks[last]]
+    sizes = np.empty(len(entries), dtype=np.int64)
+    sizes[order] = ends - offsets - MCAP_RECORD_OVERHEAD
+
+    for cid, channel in sorted(summary.channels.items()):
+        schema = summary.schemas.get(channel.schema_id)
+        mask = entries[:, 3] == cid
+        bytime = np.argsort(entries[mask, 0], kind='stable')
+        yield (
+            channel.topic,
+            normalize_msgtype(schema.name) if schema else '',
+            entries[mask, 0][bytime],
+            sizes[mask][bytime],
+        )
+
+
+def _index_rosbag2(path):
+    """Read timestamps and message sizes from rosbag2 databases."""
+    reader = rosbag2.Reader(Path(path).parent)
+    for dbpath in reader.paths:
+        with rosbag2_decompress(dbpath, reader.compression_mode == 'file') as dbfile:
+            conn = sqlite3.connect(f'file:{dbfile}?immutable=1', uri=True)
+            try:
+                topics = conn.execute('SELECT id, name, type FROM topics').fetchall()
+                for tid, topic, datatype in topics:
+                    rows = conn.execute(
+                        'SELECT timestamp, length(data) FROM messages '
+                        'WHERE topic_id = ? ORDER BY timestamp',
+                        (tid,),
+                    ).fetchall()
+                    arr = np.array(rows, dtype=np.int64).reshape(-1, 2)
+                    yield topic, datatype, arr[:, 0], arr[:, 1]
+            finally:
+                conn.close()
+
+
+def make_topic_stat(topic, datatype, timestamps, sizes, gap_factor=3.):
+    """Compute statistics for one topic.
+
+    Args:
+        topic: Topic name.
+        datatype: Message type of topic.
+        timestamps: Array of message timestamps in nanoseconds.
+        sizes: Array of message sizes in bytes, negative for unknown.
+        gap_factor: Periods exceeding gap_factor times the median
+            period are counted as gaps.
+
+    Returns:
+        Dictionary suitable for TopicStat.
+
+    """
+    timestamps = np.sort(timestamps)
+    sizes = sizes[sizes >= 0]
+    stat = {
+        'topic': topic,
+        'datatype': datatype,
+        'msg_count': len(timestamps),
+    }
+    if len(timestamps):
+        stat['start_time'] = int(timestamps[0])
+        stat['end_time'] = int(timestamps[-1])
+
+    if len(timestamps) > 1:
+        periods = np.diff(timestamps)
+        duration = timestamps[-1] - timestamps[0]
+        stat['rate'] = float((len(timestamps) - 1) / duration * 1e9) if duration else 0.
+        stat['period_mean'] = float(periods.mean())
+        stat['period_std'] = float(periods.std())
+        stat['max_gap'] = int(periods.max())
+        stat['gap_count'] = int((periods > gap_factor * np.median(periods)).sum())
+
+    if len(sizes):
+        stat['size_min'] = int(sizes.min())
+        stat['size_mean'] = float(sizes.mean())
+        stat['size_max'] = int(sizes.max())
+        stat['size_total'] = int(sizes.sum())
+
+    return stat
+
+
+@marv.node(TopicStats)
+@marv.input('dataset', marv_nodes.dataset)
+@marv.input('gap_factor', default=3.)
+def topic_stats(dataset, gap_factor):
+    """Compute message rate, jitter, gaps, and sizes per topic.
+
+    Statistics are computed from rosbag1 indexes, MCAP message indexes,
+    and rosbag2 databases without reading or deserializing any message
+    data. For rosbag1 and MCAP, message sizes are estimated from the
+    indexes; for rosbag1 they exclude the last message of each chunk.
+
+    The overall maximum gap is useful for listing columns and filters,
+    e.g. ``(get "topic_stats.max_gap")``.
+
+    Args:
+        dataset: Dataset to compute statistics for.
+        gap_factor (float): Periods exceeding gap_factor times the
+            median period of a topic are counted as gaps.
+
+    Yields:
+        TopicStats message.
+
+    """
+    dataset = yield marv.pull(dataset)
+    files = list(dataset.files)
+    if metadatapath := next((x.path for x in files if x.path.endswith('metadata.yaml')), None):
+        indexes = _index_rosbag2(metadatapath)
+    else:
+        indexes = (
+            x
+            for path in (x.path for x in files if x.path.endswith(('.bag', '.mcap')))
+            for x in (_index_mcap(path) if path.endswith('.mcap') else _index_rosbag1(path))
+        )
+
+    bytopic = {}
+    for topic, datatype, timestamps, sizes in indexes:
+        _, tslist, sizelist = bytopic.setdefault(topic, (datatype, [], []))
+        tslist.append(timestamps)
+        sizelist.append(sizes)
+
+    stats = [
+        make_topic_stat(topic, datatype, np.concatenate(tslist), np.concatenate(sizelist),
+                        gap_factor)
+        for topic, (datatype, tslist, sizelist) in sorted(bytopic.items())
+    ]
+    yield marv.push(
+        {
+            'topics': stats,
+            'max_gap': max((x.get('max_gap', 0) for x in stats), default=0),
+        },
+    )
+
+
 def read_messages(paths, topics=None, start_time=None, end_time=None, wipe_typesys=False):
-    """Iterate chronologically raw BagMessage for topic from paths."""
+    """Iterate chronologically raw BagMessage for topic from rosbag1 and MCAP paths."""
     # pylint: disable=too-many-locals
 
     if wipe_typesys:
@@ -378,13 +733,16 @@ def read_messages(paths, topics=None, start_time=None, end_time=None, wipe_types
                 lambda:
                 (types.FIELDDEFS.clear() or types.FIELDDEFS.update(backup) or MSGDEFCACHE.clear()),
             )
-        bags = [stack.enter_context(open_rosbag1(path)) for path in paths]
+        bags = [stack.enter_context(open_rosbag1(path)) for path in paths if path.endswith('.bag')]
+        mcaps = [stack.enter_context(open_mcap(path)) for path in paths if path.endswith('.mcap')]
         if wipe_typesys:
             typs = {}
             for bag in bags:
                 for rconn in bag.connections.values():
                     typs.update(get_types_from_msg(rconn.msgdef, rconn.msgtype))
             register_types(typs)
+            for _, summary in mcaps:
+                _register_mcap_types(summary)
         gens = [
             bag.messages(
                 connections=[x for x in bag.connections.values() if x.topic in topics],
@@ -392,11 +750,86 @@ def read_messages(paths, topics=None, start_time=None, end_time=None, wipe_types
                 stop=end_time,
             ) for bag in bags
         ]
+        # MCAP chunk indexes are used to decompress only chunks with matching topics and time
+        gens.extend(
+            (
+                (channel, msg.log_time, msg.data)
+                for _, channel, msg in reader.iter_messages(
+                    topics=topics,
+                    start_time=start_time,
+                    end_time=end_time,
+                )
+            ) for reader, _ in mcaps
+        )
         prev_time = 0
-        for connection, time, data in heapq.merge(*gens, key=lambda x: x[1]):
-            assert time >= prev_time, (repr(time), repr(prev_time))
-            yield connection, time, data
-            prev_time = time
+        for connection, timestamp, data in heapq.merge(*gens, key=lambda x: x[1]):
+            assert timestamp >= prev_time, (repr(timestamp), repr(prev_time))
+            yield connection, timestamp, data
+            prev_time = timestamp
+
+
+class MessageWrapper(Wrapper):
+    """Message wrapper returning the original data buffer."""
+
+    def __init__(self, struct_reader, streamdir, setdir, storedir=None, userdata=None,
+                 buffer=None):
+        super().__init__(struct_reader, streamdir, setdir, storedir=storedir, userdata=userdata)
+        self._buffer = buffer
+
+    @property
+    def data(self):
+        """Raw message data, without copying it out of the capnp message."""
+        if self._buffer is None:
+            return self._reader.data
+        return self._buffer
+
+
+def make_message(data, timestamp, stats=None):
+    """Create Message around existing data buffer.
+
+    Capnp segments are word-aligned, the data buffer is used as second
+    segment of the message as is, if its size is a multiple of eight
+    bytes. Otherwise it is padded, which is the only copy being made.
+
+    Args:
+        data: Raw message data as bytes-like object.
+        timestamp: Message timestamp in nanoseconds.
+        stats: Optional counter to record messages, bytes, and bytes copied.
+
+    Returns:
+        MessageWrapper with data attribute returning the original buffer.
+
+    """
+    size = len(data)
+    if stats is not None:
+        stats['messages'] += 1
+        stats['bytes'] += size
+
+    if not size or size > MESSAGE_MAX_SIZE:
+        if stats is not None:
+            stats['copied'] += size
+        reader = Message.new_message(data=data, timestamp=timestamp).as_reader()
+        return MessageWrapper(reader, None, None, buffer=data)
+
+    segment = data
+    if size % 8:
+        segment = bytes(data) + bytes(8 - size % 8)
+        if stats is not None:
+            stats['copied'] += size
+
+    head = MESSAGE_SEGMENT.pack(
+        MESSAGE_ROOT,
+        0,
+        timestamp,
+        MESSAGE_DATA_FAR,
+        MESSAGE_LANDING_PAD,
+        1 | (2 << 32) | (size << 35),
+    )
+    reader = Message.from_segments(
+        [head, segment],
+        traversal_limit_in_words=MESSAGE_TRAVERSAL_LIMIT,
+    )
+    return MessageWrapper(reader, None, None, buffer=data)
 
 
 @marv.node(Message, group='ondemand')
@@ -451,7 +884,7 @@ def raw_messages(dataset, bagmeta):  # noqa: C901  # pylint: disable=redefined-o
             'msg_type': con.datatype if con else '',
             'msg_type_def': con.msg_def if con else '',
             'msg_type_md5sum': con.md5sum if con else '',
-            'rosbag2': reader is not None,
+            'rosbag2': reader is not None or bool(con and con.serialization_format == 'cdr'),
             'topic': topic,
         }
 
@@ -501,34 +934,106 @@ def raw_messages(dataset, bagmeta):  # noqa: C901  # pylint: disable=redefined-o
     if not bytopic:
         return
 
+    log = yield marv.get_logger()
+    stats = Counter()
+    start = time.monotonic()
+
     if not reader:
-        paths = [x.path for x in dataset.files if x.path.endswith('.bag')]
+        paths = [x.path for x in dataset.files if x.path.endswith(('.bag', '.mcap'))]
         # TODO: topic with more than one type is not supported
         for conn, timestamp, data in read_messages(paths, topics=list(bytopic), wipe_typesys=True):
-            dct = {'data': data, 'timestamp': timestamp}
+            msg = make_message(data, timestamp, stats)
             for stream in bytopic[conn.topic]:
-                yield stream.msg(dct)
-        return
-
-    with reader:
-        connections = [x for x in reader.connections.values() if x.topic in bytopic]
-        for conn, timestamp, data in reader.messages(connections=connections):
-            dct = {'data': data, 'timestamp': timestamp}
-            for stream in bytopic[conn.topic]:
-                yield stream.msg(dct)
+                yield stream.msg(msg)
+    else:
+        with reader:
+            connections = [x for x in reader.connections.values() if x.topic in bytopic]
+            for conn, timestamp, data in reader.messages(connections=connections):
+                msg = make_message(data, timestamp, stats)
+                for stream in bytopic[conn.topic]:
+                    yield stream.msg(msg)
+
+    elapsed = time.monotonic() - start
+    log.verbose(
+        'streamed %d messages, %d bytes (%d copied) in %.2fs, %.1f MB/s',
+        stats['messages'],
+        stats['bytes'],
+        stats['copied'],
+        elapsed,
+        stats['bytes'] / elapsed / 1e6 if elapsed else 0.,
+    )
 
 
 messages = raw_messages  # pylint: disable=invalid-name
 
 
-def make_deserialize(stream):
-    """Create appropriate deserialize function for rosbag1 and 2."""
+class DeserializeCache:
+    """Bounded cache of deserialized messages.
+
+    Messages streamed by raw_messages are shared by all nodes consuming
+    the same stream, and so is their data buffer. Deserialized messages
+    are cached by identity of that buffer, a reference to which is kept
+    to guarantee the identity is not reused while cached.
+
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def get(self, data, typename, deserialize):
+        """Return cached deserialized message or deserialize and cache it."""
+        key = (id(data), typename)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] is data:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        rosmsg = deserialize(data)
+        self._cache[key] = (data, rosmsg)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return rosmsg
+
+    def clear(self):
+        self._cache.clear()
+
+
+DESERIALIZE_CACHE = DeserializeCache()
+
+
+def make_deserialize(stream, shared=False):
+    """Create appropriate deserialize function for rosbag1 and 2.
+
+    Args:
+        stream: Message stream as returned by raw_messages.
+        shared: Deserialize each message only once for all nodes
+            requesting shared deserialization. The returned messages
+            are shared between these nodes and must not be modified.
+
+    Returns:
+        Function deserializing raw message data.
+
+    """
     deserialize_cdr = serde.deserialize_cdr
     ros1_to_cdr = serde.ros1_to_cdr
     typename = stream.msg_type
     if stream.rosbag2:
-        return lambda data: deserialize_cdr(data, typename)
-    return lambda data: deserialize_cdr(ros1_to_cdr(data, typename), typename)
+        deserialize = partial(deserialize_cdr, typename=typename)
+    else:
+        def deserialize(data):
+            return deserialize_cdr(ros1_to_cdr(data, typename), typename)
+
+    if not shared:
+        return deserialize
+
+    cache = DESERIALIZE_CACHE
+    return lambda data: cache.get(data, typename, deserialize)
 
 
 def get_float_seconds(stamp):
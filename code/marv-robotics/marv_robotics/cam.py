@@ -2,9 +2,14 @@
 # SPDX-License-Identifier: AGPL-3.0-only
 
 import math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import ExitStack
 from itertools import count
+from pathlib import Path
+from queue import Queue
 from subprocess import PIPE
+from threading import Event
 
 import numpy
 
@@ -30,6 +35,88 @@ IMAGE_MSG_TYPES = ','.join([
     '*:sensor_msgs/msg/CompressedImage',
 ])
 
+FRAME_QUEUE_SIZE = 16
+
+# Codec name mapped to file extension and ffmpeg output arguments
+CODECS = {
+    'vp9': ('webm', [
+        '-c:v', 'libvpx-vp9',
+        '-keyint_min', '25',
+        '-g', '25',
+        '-tile-columns', '4',
+        '-frame-parallel', '1',
+        '-threads', '8',
+        '-speed', '{speed}',
+        '-f', 'webm',
+        '-dash', '1',
+    ]),
+    'vp8': ('webm', [
+        '-c:v', 'libvpx',
+        '-deadline', 'realtime',
+        '-cpu-used', '8',
+        '-b:v', '2M',
+        '-threads', '8',
+        '-f', 'webm',
+    ]),
+    'h264': ('mp4', [
+        '-c:v', 'libx264',
+        '-preset', 'ultrafast',
+        '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+        '-movflags', '+faststart',
+        '-f', 'mp4',
+    ]),
+}
+
+
+def get_reduction(source_width, width):
+    """Get largest decode reduction keeping images at least width wide.
+
+    Args:
+        source_width: Width of full resolution image.
+        width: Minimal width of reduced image.
+
+    Returns:
+        Reduction factor of 1, 2, 4, or 8.
+
+    """
+    return next((x for x in (8, 4, 2) if source_width >= width * x), 1)
+
+
+def make_thumbnail(rosmsg, width, scale=1, offset=0, source_width=None):
+    """Create JPEG thumbnail for image message.
+
+    If the width of the stream's images is known from a previous frame,
+    compressed images are decoded at the lowest reduced resolution that
+    is still at least as wide as the thumbnail.
+
+    Args:
+        rosmsg: Image or CompressedImage message.
+        width: Thumbnail width, keeping aspect ratio.
+        scale: Scale factor for FC image values.
+        offset: Offset for FC image values.
+        source_width: Width of previous full resolution image.
+
+    Returns:
+        Encoded JPEG thumbnail and width of full resolution image.
+
+    """
+    img = None
+    if source_width and hasattr(rosmsg, 'format'):
+        reduction = get_reduction(source_width, width)
+        if reduction > 1:
+            img = compressed_imgmsg_to_cv2(rosmsg, reduction=reduction)
+            if img is not None and img.shape[1] < width:
+                img = None
+
+    if img is None:
+        img = ros2cv(rosmsg, scale, offset)
+        source_width = img.shape[1]
+
+    height = int(round(width * img.shape[0] / img.shape[1]))
+    scaled_img = cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA)
+    _, jpeg = cv2.imencode('.jpg', scaled_img, (cv2.IMWRITE_JPEG_QUALITY, 60))
+    return jpeg.tobytes(), source_width
+
 
 def ros2cv(msg, scale=1, offset=0):
     if hasattr(msg, 'format'):
@@ -43,71 +130,178 @@ def ros2cv(msg, scale=1, offset=0):
     return imgmsg_to_cv2(msg, 'mono8' if mono else 'bgr8')
 
 
+class FrameSizeChangedError(Exception):
+    """Size of video frames changed within stream."""
+
+
+def drain(queue):
+    """Discard items of queue up to and including terminating None."""
+    while queue.get() is not None:
+        pass
+
+
+def convert_frames(inqueue, outqueue, convert, failed):
+    """Convert frames from inqueue to outqueue until None is received.
+
+    On error remaining input is drained to not block its producer.
+
+    Args:
+        inqueue: Queue of raw frames terminated by None.
+        outqueue: Queue receiving converted frames terminated by None.
+        convert: Function converting one frame.
+        failed: Event set on error.
+
+    """
+    try:
+        while (data := inqueue.get()) is not None:
+            outqueue.put(convert(data))
+    except BaseException:
+        failed.set()
+        drain(inqueue)
+        raise
+    finally:
+        outqueue.put(None)
+
+
+def write_frames(queue, make_encoder, failed):
+    """Write frames from queue to encoder until None is received.
+
+    The encoder is started for the first frame. On error remaining
+    frames are drained to not block their producer.
+
+    Args:
+        queue: Queue of images terminated by None.
+        make_encoder: Function returning encoder process for first image.
+        failed: Event set on error.
+
+    Returns:
+        True if frames were written.
+
+    Raises:
+        FrameSizeChangedError: If frame size differs from first frame.
+
+    """
+    with ExitStack() as stack:
+        encoder = None
+        try:
+            while (img := queue.get()) is not None:
+                if not encoder:
+                    dims = img.shape[:2]
+                    encoder = stack.enter_context(make_encoder(img))
+
+                if dims != img.shape[:2]:
+                    raise FrameSizeChangedError(f'{dims} != {img.shape[:2]}')
+
+                encoder.stdin.write(img)
+        except BaseException:
+            failed.set()
+            drain(queue)
+            raise
+    return encoder is not None
+
+
 @marv.node(File, version=1)
 @marv.input('stream', foreach=marv.select(messages, IMAGE_MSG_TYPES))
 @marv.input('speed', default=4)
 @marv.input('convert_32FC1_scale', default=1)
 @marv.input('convert_32FC1_offset', default=0)
-def ffmpeg(stream, speed, convert_32FC1_scale, convert_32FC1_offset):  # noqa: N803  pylint: disable=invalid-name
-    """Create video for each image topic with ffmpeg."""
-    # pylint: disable=too-many-locals
+@marv.input('codec', default='vp9')
+@marv.input('max_framerate', default=0)
+def ffmpeg(stream, speed, convert_32FC1_scale, convert_32FC1_offset, codec,  # noqa: N803
+           max_framerate):
+    """Create video for each image topic with ffmpeg.
+
+    Messages are deserialized and converted in a worker thread, which
+    passes frames through a bounded queue to a writer thread feeding the
+    encoder. The scheduler thread is only blocked if the queues are full.
+
+    Args:
+        stream: sensor_msgs/msg/Image or sensor_msgs/msg/CompressedImage stream
+        speed (int): VP9 encoding speed, higher is faster.
+        convert_32FC1_scale (float): Scale factor for FC image values.
+        convert_32FC1_offset (float): Offset for FC image values.
+        codec (str): One of ``vp9``, ``vp8`` (realtime), or ``h264``
+            (ultrafast); see ``CODECS``.
+        max_framerate (float): Drop frames to not exceed framerate, 0 to
+            keep all.
+
+    Yields:
+        Video file.
+
+    Raises:
+        Abort: If frames could not be converted or stream is empty.
+        ValueError: If codec is unknown.
+
+    """
+    # pylint: disable=invalid-name,too-many-arguments,too-many-locals
+
+    if codec not in CODECS:
+        raise ValueError(f'Unknown codec {codec!r}, choose one of {", ".join(CODECS)}')
 
     yield marv.set_header(title=stream.topic)
-    name = f"{stream.topic.replace('/', '_')[1:]}.webm"
+    ext, codec_args = CODECS[codec]
+    name = f"{stream.topic.replace('/', '_')[1:]}.{ext}"
     video = yield marv.make_file(name)
     duration = (stream.end_time - stream.start_time) * 1e-9
     framerate = (stream.msg_count / duration) if duration else 1
+    stride = int(math.ceil(framerate / max_framerate)) if max_framerate else 1
+    framerate /= stride
+
+    def make_encoder(img):
+        # yapf: disable
+        ffargs = [
+            'ffmpeg',
+            '-f', 'rawvideo',
+            '-pixel_format', 'gray' if len(img.shape) == 2 else 'bgr24',
+            '-video_size', f'{img.shape[1]}x{img.shape[0]}',
+            '-framerate', str(framerate),
+            '-i', '-',
+            *[x.format(speed=speed) for x in codec_args],
+            '-an',
+            '-pix_fmt', 'yuv420p',
+            '-loglevel', 'error',
+            '-y',
+            video.path,
+        ]
+        # yapf: enable
+        return popen(ffargs, stdin=PIPE)
 
     deserialize = make_deserialize(stream)
-    with ExitStack() as stack:
-        encoder = None
-        dims = None
-        while msg := (yield marv.pull(stream)):
-            rosmsg = deserialize(msg.data)
-            try:
-                img = ros2cv(rosmsg, convert_32FC1_scale, convert_32FC1_offset)
-            except (ImageFormatError, ImageConversionError) as err:
-                log = yield marv.get_logger()
-                log.error('could not convert image from topic %s: %s ', stream.topic, err)
-                raise marv.Abort('Conversion error')
-
-            if not encoder:
-                dims = img.shape[:2]
-                # yapf: disable
-                ffargs = [
-                    'ffmpeg',
-                    '-f', 'rawvideo',
-                    '-pixel_format', 'gray' if len(img.shape) == 2 else 'bgr24',
-                    '-video_size', f'{img.shape[1]}x{img.shape[0]}',
-                    '-framerate', str(framerate),
-                    '-i', '-',
-                    '-c:v', 'libvpx-vp9',
-                    '-keyint_min', '25',
-                    '-g', '25',
-                    '-tile-columns', '4',
-                    '-frame-parallel', '1',
-                    '-an',
-                    '-f', 'webm',
-                    '-dash', '1',
-                    '-pix_fmt', 'yuv420p',
-                    '-loglevel', 'error',
-                    '-threads', '8',
-                    '-speed', str(speed),
-                    '-y',
-                    video.path,
-                ]
-                # yapf: enable
-                encoder = stack.enter_context(popen(ffargs, stdin=PIPE))
-
-            if dims != img.shape[:2]:
-                log = yield marv.get_logger()
-                log.warning(f'could not encode, image size changed {dims} != {img.shape[:2]}')
-                return
 
-            encoder.stdin.write(img)
+    def convert(data):
+        return ros2cv(deserialize(data), convert_32FC1_scale, convert_32FC1_offset)
 
-        if not encoder:
-            raise marv.Abort('No messages')
+    inqueue = Queue(FRAME_QUEUE_SIZE)
+    outqueue = Queue(FRAME_QUEUE_SIZE)
+    failed = Event()
+    with ThreadPoolExecutor(2) as executor:
+        converter = executor.submit(convert_frames, inqueue, outqueue, convert, failed)
+        writer = executor.submit(write_frames, outqueue, make_encoder, failed)
+        try:
+            counter = count()
+            while not failed.is_set() and (msg := (yield marv.pull(stream))):
+                if next(counter) % stride:
+                    continue
+                inqueue.put(msg.data)
+        finally:
+            inqueue.put(None)
+
+    try:
+        converter.result()
+    except (ImageFormatError, ImageConversionError) as err:
+        log = yield marv.get_logger()
+        log.error('could not convert image from topic %s: %s ', stream.topic, err)
+        raise marv.Abort('Conversion error')
+
+    try:
+        written = writer.result()
+    except FrameSizeChangedError as err:
+        log = yield marv.get_logger()
+        log.warning(f'could not encode, image size changed {err}')
+        return
+
+    if not written:
+        raise marv.Abort('No messages')
 
     yield video
 
@@ -118,21 +312,26 @@ def ffmpeg(stream, speed, convert_32FC1_scale, convert_32FC1_offset):  # noqa: N
 @marv.input('max_frames', default=50)
 @marv.input('convert_32FC1_scale', default=1)
 @marv.input('convert_32FC1_offset', default=0)
-def images(stream, image_width, max_frames, convert_32FC1_scale, convert_32FC1_offset):  # noqa:N803
+@marv.input('workers', default=4)
+def images(stream, image_width, max_frames, convert_32FC1_scale, convert_32FC1_offset,  # noqa: N803
+           workers):
     """Extract max_frames equidistantly spread images from each image stream.
 
+    Thumbnails are decoded, scaled, and encoded in a thread pool.
+
     Args:
         stream: sensor_msgs/msg/Image or sensor_msgs/msg/CompressedImage stream
         image_width (int): Scale to image_width, keeping aspect ratio.
         max_frames (int): Maximum number of frames to extract.
         convert_32FC1_scale (float): Scale factor for FC image values.
         convert_32FC1_offset (float): Offset for FC image values.
+        workers (int): Number of threads creating thumbnails.
 
     Yields:
         Images section.
 
     """
-    # pylint: disable=invalid-name,too-many-locals
+    # pylint: disable=invalid-name,too-many-arguments,too-many-locals
 
     yield marv.set_header(title=stream.topic)
     deserialize = make_deserialize(stream)
@@ -140,22 +339,45 @@ def images(stream, image_width, max_frames, convert_32FC1_scale, convert_32FC1_o
     digits = int(math.ceil(math.log(stream.msg_count) / math.log(10)))
     name_template = '%s-{:0%sd}.jpg' % (stream.topic.replace('/', ':')[1:], digits)  # noqa: FS001
     counter = count()
-    while msg := (yield marv.pull(stream)):
-        idx = next(counter)
-        if idx % interval:
-            continue
+    source_width = None
+    pending = deque()
+    ended = False
+    with ThreadPoolExecutor(max(workers, 1)) as executor:
+        while not ended or pending:
+            if not ended:
+                msg = yield marv.pull(stream)
+                ended = msg is None
+                if msg:
+                    idx = next(counter)
+                    if idx % interval:
+                        continue
 
-        rosmsg = deserialize(msg.data)
-        try:
-            img = ros2cv(rosmsg, convert_32FC1_scale, convert_32FC1_offset)
-        except (ImageFormatError, ImageConversionError) as err:
-            log = yield marv.get_logger()
-            log.error('could not convert image from topic %s: %s ', stream.topic, err)
-            return
-
-        height = int(round(image_width * img.shape[0] / img.shape[1]))
-        scaled_img = cv2.resize(img, (image_width, height), interpolation=cv2.INTER_AREA)
-        name = name_template.format(idx)
-        imgfile = yield marv.make_file(name)
-        cv2.imwrite(imgfile.path, scaled_img, (cv2.IMWRITE_JPEG_QUALITY, 60))
-        yield imgfile
+                    rosmsg = deserialize(msg.data)
+                    future = executor.submit(
+                        make_thumbnail,
+                        rosmsg,
+                        image_width,
+                        convert_32FC1_scale,
+                        convert_32FC1_offset,
+                        source_width,
+                    )
+                    pending.append((idx, future))
+
+                    # The first thumbnail determines the source width for reduced decoding.
+                    if source_width is not None and len(pending) < 2 * workers:
+                        continue
+
+            if not pending:
+                continue
+
+            idx, future = pending.popleft()
+            try:
+                jpeg, source_width = future.result()
+            except (ImageFormatError, ImageConversionError) as err:
+                log = yield marv.get_logger()
+                log.error('could not convert image from topic %s: %s ', stream.topic, err)
+                return
+
+            imgfile = yield marv.make_file(name_template.format(idx))
+            Path(imgfile.path).write_bytes(jpeg)
+            yield imgfile
@@ -9,10 +9,11 @@ import marv_nodes
 from marv_api.types import Section, Widget
 from marv_detail import make_map_dict
 
-from .bag import bagmeta
+from .bag import bagmeta, topic_stats
 from .cam import ffmpeg, images
 from .gnss import gnss_plots
-from .trajectory import trajectory
+from .pointcloud import pointclouds
+from .trajectory import TRAJECTORY_TOLERANCE, simplify_trajectory, trajectory
 
 # pylint: disable=redefined-outer-name
 
@@ -119,7 +120,7 @@ def bagmeta_table(bagmeta, dataset):
         path = Path(file.path)
         if rb2path and path.relative_to(rb2path).parts[0] == 'messages':
             continue
-        if path.suffix == '.bag':
+        if path.suffix in ('.bag', '.mcap'):
             bag = bags.pop(0)
             rows.append(
                 {
@@ -181,6 +182,83 @@ def bagmeta_table(bagmeta, dataset):
     yield marv.push({'table': {'columns': columns, 'rows': rows}})
 
 
+@marv.node(Widget)
+@marv.input('stats', default=topic_stats)
+def topic_stats_table(stats):
+    """Table widget listing message rate, jitter, gaps, and sizes per topic.
+
+    Useful for detail_summary_widgets or custom sections.
+    """
+    stats = yield marv.pull(stats)
+    if not stats or not stats.topics:
+        raise marv.Abort()
+    columns = [
+        {
+            'title': 'Topic',
+        },
+        {
+            'title': 'Message count',
+            'align': 'right',
+        },
+        {
+            'title': 'Rate (Hz)',
+            'align': 'right',
+        },
+        {
+            'title': 'Jitter (ms)',
+            'align': 'right',
+        },
+        {
+            'title': 'Max gap',
+            'formatter': 'timedelta',
+        },
+        {
+            'title': 'Gaps',
+            'align': 'right',
+        },
+        {
+            'title': 'Mean size',
+            'formatter': 'filesize',
+        },
+        {
+            'title': 'Max size',
+            'formatter': 'filesize',
+        },
+    ]
+    rows = [
+        {
+            'id': idx,
+            'cells': [
+                {
+                    'text': stat.topic,
+                },
+                {
+                    'uint64': stat.msg_count,
+                },
+                {
+                    'text': f'{stat.rate:.2f}',
+                },
+                {
+                    'text': f'{stat.period_std / 1e6:.3f}',
+                },
+                {
+                    'timedelta': stat.max_gap,
+                },
+                {
+                    'uint64': stat.gap_count,
+                },
+                {
+                    'uint64': round(stat.size_mean),
+                },
+                {
+                    'uint64': stat.size_max,
+                },
+            ],
+        } for idx, stat in enumerate(stats.topics)
+    ]
+    yield marv.push({'table': {'columns': columns, 'rows': rows}})
+
+
 @marv.node(Section)
 @marv.input('title', default='Position and Orientation')
 @marv.input('plots', default=gnss_plots)
@@ -198,8 +276,19 @@ def gnss_section(plots, title):
     widgets = []
     for plot in plots:
         plotfile = yield marv.pull(plot)
-        if plotfile:
-            widgets.append({'title': plot.title, 'image': {'src': plotfile.relpath}})
+        if not plotfile:
+            continue
+        widgets.append({'title': plot.title, 'image': {'src': plotfile.relpath}})
+        datafile = yield marv.pull(plot)
+        if datafile:
+            widgets.append({
+                'title': f'{plot.title} data',
+                'link': {
+                    'href': datafile.relpath,
+                    'title': 'Full resolution positions (CSV)',
+                    'download': Path(datafile.path).name,
+                },
+            })
     assert len({x['title'] for x in widgets}) == len(widgets)
     if widgets:
         yield marv.push({'title': title, 'widgets': widgets})
@@ -237,6 +326,22 @@ def images_section(galleries, title):
         yield marv.push({'title': title, 'widgets': widgets})
 
 
+@marv.node(Section)
+@marv.input('title', default='Point clouds')
+@marv.input('pointclouds', default=pointclouds)
+def pointcloud_section(pointclouds, title):  # pylint: disable=redefined-outer-name
+    """Section with accumulated point cloud for each PointCloud2 stream."""
+    tmp = []
+    while msg := (yield marv.pull(pointclouds)):
+        tmp.append(msg)
+    if not tmp:
+        raise marv.Abort()
+    streams = sorted(tmp, key=lambda x: x.title)
+    widgets = [x for x in (yield marv.pull_all(*streams)) if x is not None]
+    if widgets:
+        yield marv.push({'title': title, 'widgets': widgets})
+
+
 @marv.node(Section)
 @marv.input('title', default='Connections')
 @marv.input('bagmeta', default=bagmeta)
@@ -304,9 +409,13 @@ def connections_section(bagmeta, dataset, title):
 @marv.input('minzoom', default=-30)
 @marv.input('maxzoom', default=40)
 @marv.input('tile_server_protocol', default='')
-def trajectory_section(geojson, title, minzoom, maxzoom, tile_server_protocol):
+@marv.input('tolerance', default=TRAJECTORY_TOLERANCE)
+def trajectory_section(geojson, title, minzoom, maxzoom, tile_server_protocol, tolerance):
     """Section displaying trajectory on a map.
 
+    The trajectory is simplified with Douglas-Peucker, dropping points
+    that deviate less than the tolerance from the simplified line.
+
     Args:
         title (str): Detail section title.
         geojson: Stream with one GeoJson message.
@@ -314,6 +423,8 @@ def trajectory_section(geojson, title, minzoom, maxzoom, tile_server_protocol):
         maxzoom (int): Maximum zoom level.
         tile_server_protocol (str): Set to ``https:`` if you host marv
             behind http and prefer the tile requests to be secured.
+        tolerance (float): Simplification tolerance in meters, zero
+            for full resolution.
 
     Yields:
         Trajectory section.
@@ -367,7 +478,7 @@ def trajectory_section(geojson, title, minzoom, maxzoom, tile_server_protocol):
         {
             'title': 'Trajectory',
             'color': (0., 1., 0., 1.),
-            'geojson': geojson,
+            'geojson': simplify_trajectory(geojson.to_dict(), tolerance),
         },
     ]
     dct = make_map_dict({
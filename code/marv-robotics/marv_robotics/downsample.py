@@ -0,0 +1,101 @@
+# Copyright 2016 - 2021  Ternaris.
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""Shape-preserving downsampling of series and lines."""
+
+import numpy
+
+PLOT_POINTS = 2000
+
+
+def lttb(x, y, count):
+    """Select points using largest triangle three buckets.
+
+    The first and last points are always kept. All other points are
+    split into ``count - 2`` buckets of consecutive samples; from each
+    bucket the point spanning the largest triangle with the previously
+    selected point and the average of the next bucket is selected. Peaks
+    and the overall shape of the series are preserved.
+
+    Buckets are formed by sample index, so ``x`` need not be monotonic,
+    e.g. for trajectories.
+
+    Args:
+        x: Array of x values.
+        y: Array of y values.
+        count: Number of points to select.
+
+    Returns:
+        Array of sorted indices of selected points.
+
+    """
+    size = len(x)
+    if count >= size or count < 3:
+        return numpy.arange(size)
+
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    edges = numpy.linspace(1, size - 1, count - 1).astype(int)
+
+    # averages per bucket, last point acting as average after last bucket
+    sums_x = numpy.concatenate([[0.], numpy.cumsum(x)])
+    sums_y = numpy.concatenate([[0.], numpy.cumsum(y)])
+    lengths = numpy.diff(edges)
+    avg_x = numpy.append((sums_x[edges[1:]] - sums_x[edges[:-1]]) / lengths, x[-1])
+    avg_y = numpy.append((sums_y[edges[1:]] - sums_y[edges[:-1]]) / lengths, y[-1])
+
+    indices = numpy.empty(count, dtype=int)
+    indices[0] = prev = 0
+    indices[-1] = size - 1
+    for bucket in range(count - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        px, py = x[prev], y[prev]
+        nx, ny = avg_x[bucket + 1], avg_y[bucket + 1]
+        area = numpy.abs((px - nx) * (y[start:stop] - py) - (px - x[start:stop]) * (ny - py))
+        prev = indices[bucket + 1] = start + area.argmax()
+    return indices
+
+
+def douglas_peucker(x, y, tolerance):
+    """Select points using Ramer-Douglas-Peucker line simplification.
+
+    Starting with the line from first to last point, the point farthest
+    from the current line segment is selected and the segment split at
+    it, as long as its distance exceeds the tolerance.
+
+    Args:
+        x: Array of x values.
+        y: Array of y values.
+        tolerance: Maximum distance of dropped points to simplified line.
+
+    Returns:
+        Array of sorted indices of selected points.
+
+    """
+    size = len(x)
+    if size < 3 or tolerance <= 0:
+        return numpy.arange(size)
+
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    keep = numpy.zeros(size, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, size - 1)]
+    while stack:
+        start, stop = stack.pop()
+        if stop - start < 2:
+            continue
+        dx, dy = x[stop] - x[start], y[stop] - y[start]
+        px, py = x[start + 1:stop] - x[start], y[start + 1:stop] - y[start]
+        length = numpy.hypot(dx, dy)
+        if length:
+            dists = numpy.abs(dx * py - dy * px) / length
+        else:
+            dists = numpy.hypot(px, py)
+        idx = dists.argmax()
+        if dists[idx] > tolerance:
+            idx += start + 1
+            keep[idx] = True
+            stack.append((start, idx))
+            stack.append((idx, stop))
+    return numpy.flatnonzero(keep)
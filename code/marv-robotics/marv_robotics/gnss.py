@@ -15,85 +15,90 @@ import marv_api as marv
 from marv_api.types import File
 
 from .bag import make_deserialize, make_get_timestamp, messages
+from .downsample import PLOT_POINTS, lttb
+from .gnss_capnp import Orientations, Positions  # pylint: disable=import-error
 
 
-def yaw_angle(frame):
-    rot = np.zeros((3, 3))
+def yaw_angles(x, y, z, w):
+    """Compute yaw angles of quaternions.
 
-    # consists of time, x, y, z, w
-    q1 = frame.x
-    q2 = frame.y
-    q3 = frame.z
-    q4 = frame.w
+    This is the heading of the rotated x-axis projected onto the xy-plane.
 
-    rot[0, 0] = 1 - 2 * q2 * q2 - 2 * q3 * q3
-    rot[0, 1] = 2 * (q1 * q2 - q3 * q4)
-    rot[0, 2] = 2 * (q1 * q3 + q2 * q4)
-    rot[1, 0] = 2 * (q1 * q2 + q3 * q4)
-    rot[1, 1] = 1 - 2 * q1 * q1 - 2 * q3 * q3
-    rot[1, 2] = 2 * (q2 * q3 - q1 * q4)
-    rot[2, 0] = 2 * (q1 * q3 - q2 * q4)
-    rot[2, 1] = 2 * (q1 * q4 + q2 * q3)
-    rot[2, 2] = 1 - 2 * q1 * q1 - 2 * q2 * q2
+    Args:
+        x: Array of quaternion x components.
+        y: Array of quaternion y components.
+        z: Array of quaternion z components.
+        w: Array of quaternion w components.
 
-    vec = np.dot(rot, [1, 0, 0])
-    return np.arctan2(vec[1], vec[0])
+    Returns:
+        Array of yaw angles in radians.
 
+    """
+    return np.arctan2(2 * (x * y + z * w), 1 - 2 * (y * y + z * z))
 
-@marv.node()
+
+def grow(rows):
+    """Double capacity of preallocated array of rows."""
+    return np.concatenate([rows, np.empty((max(len(rows), 1), rows.shape[1]))])
+
+
+@marv.node(Positions)
 @marv.input('stream', foreach=marv.select(messages, '*:sensor_msgs/msg/NavSatFix'))
 def positions(stream):
     yield marv.set_header(title=stream.topic)
     log = yield marv.get_logger()
-    deserialize = make_deserialize(stream)
+    deserialize = make_deserialize(stream, shared=True)
     get_timestamp = make_get_timestamp(log)
 
     erroneous = 0
-    e_offset = None
-    n_offset = None
-    u_offset = None
-    positions = []
+    rows = np.empty((stream.msg_count, 6))
+    idx = 0
     while msg := (yield marv.pull(stream)):
         rosmsg = deserialize(msg.data)
-
-        if not hasattr(rosmsg, 'status') or \
-           np.isnan(rosmsg.longitude) or \
-           np.isnan(rosmsg.latitude) or \
-           np.isnan(rosmsg.altitude) or \
-           np.isnan(rosmsg.position_covariance[0]):
+        if not hasattr(rosmsg, 'status'):
             erroneous += 1
             continue
 
-        e, n, _, _ = utm.from_latlon(rosmsg.latitude, rosmsg.longitude)
-        if e_offset is None:
-            e_offset = e
-            n_offset = n
-            u_offset = rosmsg.altitude
-        e = e - e_offset
-        n = n - n_offset
-        u = rosmsg.altitude - u_offset
-
-        positions.append(
-            [
-                get_timestamp(rosmsg, msg) / 1e9,
-                rosmsg.latitude,
-                rosmsg.longitude,
-                rosmsg.altitude,
-                e,
-                n,
-                u,
-                rosmsg.status.status,
-                np.sqrt(rosmsg.position_covariance[0]),
-            ],
+        if idx == len(rows):
+            rows = grow(rows)
+        rows[idx] = (
+            get_timestamp(rosmsg, msg) / 1e9,
+            rosmsg.latitude,
+            rosmsg.longitude,
+            rosmsg.altitude,
+            rosmsg.status.status,
+            rosmsg.position_covariance[0],
         )
+        idx += 1
+
+    rows = rows[:idx]
+    valid = ~np.isnan(rows[:, 1:4]).any(axis=1) & ~np.isnan(rows[:, 5])
+    erroneous += len(rows) - np.count_nonzero(valid)
+    rows = rows[valid]
     if erroneous:
-        log = yield marv.get_logger()
         log.warning('skipped %d erroneous messages', erroneous)
-    if positions:
-        yield marv.push({'values': positions})
-
-
-@marv.node()
+    if not len(rows):
+        return
+
+    timestamps, lat, lon, alt, status, variance = rows.T
+    zone = utm.latlon_to_zone_number(lat[0], lon[0])
+    letter = utm.latitude_to_zone_letter(lat[0])
+    e, n, _, _ = utm.from_latlon(lat, lon, force_zone_number=zone, force_zone_letter=letter)
+    values = np.stack([
+        timestamps,
+        lat,
+        lon,
+        alt,
+        e - e[0],
+        n - n[0],
+        alt - alt[0],
+        status,
+        np.sqrt(variance),
+    ], axis=1)
+    yield marv.push({'values': values})
+
+
+@marv.node(Orientations)
 @marv.input('stream', foreach=marv.select(messages, '*:sensor_msgs/msg/Imu'))
 def imus(stream):
     yield marv.set_header(title=stream.topic)
@@ -101,23 +106,34 @@ def imus(stream):
     deserialize = make_deserialize(stream)
     get_timestamp = make_get_timestamp(log)
 
-    erroneous = 0
-    imus = []
+    rows = np.empty((stream.msg_count, 5))
+    idx = 0
     while msg := (yield marv.pull(stream)):
         rosmsg = deserialize(msg.data)
-        if np.isnan(rosmsg.orientation.x):
-            erroneous += 1
-            continue
+        orientation = rosmsg.orientation
+        if idx == len(rows):
+            rows = grow(rows)
+        rows[idx] = (
+            get_timestamp(rosmsg, msg) / 1e9,
+            orientation.x,
+            orientation.y,
+            orientation.z,
+            orientation.w,
+        )
+        idx += 1
 
-        imus.append([get_timestamp(rosmsg, msg) / 1e9, yaw_angle(rosmsg.orientation)])
+    rows = rows[:idx]
+    valid = ~np.isnan(rows[:, 1])
+    erroneous = len(rows) - np.count_nonzero(valid)
+    rows = rows[valid]
     if erroneous:
-        log = yield marv.get_logger()
         log.warning('skipped %d erroneous messages', erroneous)
-    if imus:
-        yield marv.push({'values': imus})
+    if len(rows):
+        values = np.stack([rows[:, 0], yaw_angles(*rows[:, 1:].T)], axis=1)
+        yield marv.push({'values': values})
 
 
-@marv.node()
+@marv.node(Orientations)
 @marv.input('stream', foreach=marv.select(messages, '*:nmea_navsat_driver/msg/NavSatOrientation'))
 def navsatorients(stream):
     yield marv.set_header(title=stream.topic)
@@ -155,7 +171,23 @@ def orientations(imus, navsatorients):
 # @marv.input('orientation', foreach=orientations)
 @marv.input('gps', default=positions)
 @marv.input('orientation', default=orientations)
-def gnss_plots(gps, orientation):
+@marv.input('points', default=PLOT_POINTS, type=int)
+def gnss_plots(gps, orientation, points):
+    """Plot GNSS positions and orientations.
+
+    Each plot is downsampled to at most ``points`` points, preserving its
+    shape. After the plot image, a CSV file with the positions in full
+    resolution is pushed.
+
+    Args:
+        gps: GNSS positions.
+        orientation: Orientations.
+        points: Maximum number of points per plot.
+
+    Yields:
+        Plot image file followed by positions CSV file.
+
+    """
     # pylint: disable=too-many-locals,too-many-statements
 
     # TODO: framework does not yet support multiple foreach
@@ -175,16 +207,16 @@ def gnss_plots(gps, orientation):
         log.error('No valid gps messages')
         raise marv.Abort()
 
-    gps = gps['values']
+    gps = gps.values.as_array()
     if orientation is not None:
         otitle = orientation.title
         orientation = yield marv.pull(orientation)
     if orientation is None:
         log.warning('No orientations found')
         otitle = 'none'
-        orientation = []
+        orientation = np.empty((0, 2))
     else:
-        orientation = orientation['values']
+        orientation = orientation.values.as_array()
 
     name = '__'.join(x.replace('/', ':')[1:] for x in [gtitle, otitle]) + '.jpg'
     title = f'{gtitle} with {otitle}'
@@ -201,15 +233,18 @@ def gnss_plots(gps, orientation):
     ax5 = fig.add_subplot(2, 3, 6)  # n-time plot
 
     # masking for finite values
-    gps = np.array(gps)
     gps = gps[np.isfinite(gps[:, 1])]
 
-    # precompute plot vars
-    c = cm.prism(gps[:, 7] / 2)  # pylint: disable=no-member
+    def plot_over_time(ax, timestamps, values):
+        idx = lttb(timestamps, values, points)
+        ax.plot([datetime.fromtimestamp(x) for x in timestamps[idx]], values[idx])  # noqa: DTZ
+
+    idx = lttb(gps[:, 4], gps[:, 5], points)
+    c = cm.prism(gps[idx, 7] / 2)  # pylint: disable=no-member
 
     ax1.scatter(
-        gps[:, 4],
-        gps[:, 5],
+        gps[idx, 4],
+        gps[idx, 5],
         c=c,
         edgecolor='none',
         s=3,
@@ -221,17 +256,13 @@ def gnss_plots(gps, orientation):
     ax4.xaxis.set_major_formatter(xfmt)
     ax5.xaxis.set_major_formatter(xfmt)
 
-    if orientation:
+    if len(orientation):
         ax2.xaxis.set_major_formatter(xfmt)
-        orientation = np.array(orientation)
-        ax2.plot(
-            [datetime.fromtimestamp(x) for x in orientation[:, 0]],  # noqa: DTZ
-            orientation[:, 1],
-        )
+        plot_over_time(ax2, orientation[:, 0], orientation[:, 1])
 
-    ax3.plot([datetime.fromtimestamp(x) for x in gps[:, 0]], gps[:, 4])  # noqa: DTZ
-    ax4.plot([datetime.fromtimestamp(x) for x in gps[:, 0]], gps[:, 6])  # noqa: DTZ
-    ax5.plot([datetime.fromtimestamp(x) for x in gps[:, 0]], gps[:, 5])  # noqa: DTZ
+    plot_over_time(ax3, gps[:, 0], gps[:, 4])
+    plot_over_time(ax4, gps[:, 0], gps[:, 6])
+    plot_over_time(ax5, gps[:, 0], gps[:, 5])
 
     fig.autofmt_xdate()
 
@@ -250,3 +281,14 @@ def gnss_plots(gps, orientation):
     finally:
         plt.close()
     yield plotfile
+
+    datafile = yield marv.make_file(name.replace('.jpg', '.csv'))
+    np.savetxt(
+        datafile.path,
+        gps,
+        fmt='%.17g',
+        delimiter=',',
+        header='time,latitude,longitude,altitude,easting,northing,up,status,stddev',
+        comments='',
+    )
+    yield datafile
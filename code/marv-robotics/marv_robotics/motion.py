@@ -5,20 +5,172 @@
 # pylint: disable=redefined-outer-name
 
 import json
-import math
-from math import asin, cos, radians, sin, sqrt
 from pathlib import Path
 
 import numpy
 import utm
 
 import marv_api as marv
-from marv_api.types import TimedFloat64
+from marv_api.types import TimeseriesChunk
 from marv_detail.types_capnp import Section  # pylint: disable=no-name-in-module
 from marv_robotics.bag import make_deserialize, make_get_timestamp, messages
+from marv_robotics.downsample import PLOT_POINTS, lttb
+from marv_robotics.trajectory import EARTH_RADIUS
 
+CHUNK_SIZE = 4096
 
-@marv.node()
+
+def make_chunk(timestamps, values, names):
+    """Create timeseries chunk message.
+
+    Args:
+        timestamps: Sequence of timestamps.
+        values: Sequence of value rows, one per timestamp.
+        names: Names of value columns.
+
+    Returns:
+        Timeseries chunk message dict.
+
+    """
+    return {
+        'timestamps': numpy.array(timestamps, dtype=numpy.uint64),
+        'names': list(names),
+        'values': numpy.array(values, dtype=numpy.float64).reshape(len(timestamps), -1).T,
+    }
+
+
+def read_chunk(chunk):
+    """Read timeseries chunk into arrays.
+
+    Args:
+        chunk: Timeseries chunk message.
+
+    Returns:
+        Timestamps and dict mapping column names to values.
+
+    """
+    return chunk.timestamps.as_array(), dict(zip(chunk.names, chunk.values.as_array()))
+
+
+def push_chunks(timestamps, columns):
+    """Push timeseries in chunks.
+
+    Args:
+        timestamps: Array of timestamps.
+        columns: Dict mapping column names to arrays of values.
+
+    Yields:
+        Push requests.
+
+    """
+    names = list(columns)
+    values = numpy.stack([columns[x] for x in names])
+    for start in range(0, len(timestamps), CHUNK_SIZE):
+        yield marv.push({
+            'timestamps': timestamps[start:start + CHUNK_SIZE],
+            'names': names,
+            'values': values[:, start:start + CHUNK_SIZE],
+        })
+
+
+def pull_chunks(*streams, first=None):
+    """Pull all chunks of timeseries streams in lock-step.
+
+    Args:
+        streams: Handles of timeseries streams.
+        first: Chunk already pulled from single stream.
+
+    Yields:
+        Pull requests.
+
+    Returns:
+        Concatenated timestamps and dict of columns per stream.
+
+    """
+    chunks = {x: [] for x in streams}
+    if first is not None:
+        chunks[streams[0]].append(read_chunk(first))
+    active = list(streams)
+    while active:
+        msgs = yield marv.pull_all(*active)
+        for stream, msg in zip(active[:], msgs):
+            if msg is None:
+                active.remove(stream)
+            else:
+                chunks[stream].append(read_chunk(msg))
+
+    result = []
+    for stream in streams:
+        if not chunks[stream]:
+            result.append((numpy.empty(0, dtype=numpy.uint64), {}))
+            continue
+        timestamps = numpy.concatenate([x[0] for x in chunks[stream]])
+        columns = {
+            name: numpy.concatenate([x[1][name] for x in chunks[stream]])
+            for name in chunks[stream][0][1]
+        }
+        result.append((timestamps, columns))
+    return result
+
+
+def shifted(values, previous):
+    """Shift values by one sample.
+
+    Args:
+        values: Array of values.
+        previous: Value preceding first value, None for first chunk.
+
+    Returns:
+        Array starting with previous value, or first value if None.
+
+    """
+    return numpy.concatenate([values[:1] if previous is None else [previous], values[:-1]])
+
+
+def haversine(lat, lon, alt, lat_p, lon_p, alt_p):  # pylint: disable=too-many-arguments
+    """Calculate distances between GPS positions.
+
+    Args:
+        lat: Latitudes in radians.
+        lon: Longitudes in radians.
+        alt: Altitudes.
+        lat_p: Previous latitudes in radians.
+        lon_p: Previous longitudes in radians.
+        alt_p: Previous altitudes.
+
+    Returns:
+        Distances, including altitude differences if known.
+
+    """
+    dis = numpy.sin((lat_p - lat) * .5)**2 + \
+        numpy.cos(lat) * numpy.cos(lat_p) * numpy.sin((lon_p - lon) * .5)**2
+    dis = 2 * EARTH_RADIUS * numpy.arcsin(numpy.sqrt(dis))
+    alt_d = alt_p - alt
+    # euclidean approx taking altitude into account
+    return numpy.where(numpy.isnan(alt_d), dis, numpy.hypot(dis, alt_d))
+
+
+def per_second(deltas, timestamps, ts_p):
+    """Calculate rate of change.
+
+    Args:
+        deltas: Array of value changes since previous sample.
+        timestamps: Array of timestamps.
+        ts_p: Timestamp preceding first timestamp, None for first chunk.
+
+    Returns:
+        Change of value per second, 0 where no time passed.
+
+    """
+    timestamps = timestamps.astype(numpy.int64)
+    durations = timestamps - shifted(timestamps, ts_p)
+    result = numpy.zeros(len(deltas))
+    valid = durations != 0
+    result[valid] = deltas[valid] * 1e9 / durations[valid]
+    return result
+
+
+@marv.node(TimeseriesChunk)
 @marv.input('stream', marv.select(messages, '*:geometry_msgs/msg/PoseStamped'))
 def position_xyz(stream):
     """Extract position from Pose.
@@ -27,7 +179,7 @@ def position_xyz(stream):
         stream: ROS message stream with Pose messages.
 
     Yields:
-        Message stream with Cartesian positions.
+        Timeseries chunks with Cartesian positions.
 
     """
     stream = yield marv.pull(stream)
@@ -38,20 +190,21 @@ def position_xyz(stream):
     log = yield marv.get_logger()
     deserialize = make_deserialize(stream)
     get_timestamp = make_get_timestamp(log)
+    timestamps, values = [], []
     while msg := (yield marv.pull(stream)):
         rosmsg = deserialize(msg.data)
         pos = rosmsg.pose.position
-        yield marv.push(
-            {
-                'x': pos.x,
-                'y': pos.y,
-                'z': pos.z,
-                'timestamp': get_timestamp(rosmsg, msg),
-            },
-        )
+        timestamps.append(get_timestamp(rosmsg, msg))
+        values.append((pos.x, pos.y, pos.z))
+        if len(timestamps) == CHUNK_SIZE:
+            yield marv.push(make_chunk(timestamps, values, ('x', 'y', 'z')))
+            timestamps, values = [], []
 
+    if timestamps:
+        yield marv.push(make_chunk(timestamps, values, ('x', 'y', 'z')))
 
-@marv.node()
+
+@marv.node(TimeseriesChunk)
 @marv.input('stream', marv.select(messages, '*:sensor_msgs/msg/NavSatFix'))
 def position_gps(stream):
     """Extract position from GPS.
@@ -60,7 +213,7 @@ def position_gps(stream):
         stream: ROS message stream with GPS messages.
 
     Yields:
-        Message stream with GPS positions.
+        Timeseries chunks with GPS positions.
 
     """
     stream = yield marv.pull(stream)
@@ -69,18 +222,19 @@ def position_gps(stream):
 
     yield marv.set_header(title=stream.topic)
     log = yield marv.get_logger()
-    deserialize = make_deserialize(stream)
+    deserialize = make_deserialize(stream, shared=True)
     get_timestamp = make_get_timestamp(log)
+    timestamps, values = [], []
     while msg := (yield marv.pull(stream)):
         rosmsg = deserialize(msg.data)
-        yield marv.push(
-            {
-                'lat': rosmsg.latitude,
-                'lon': rosmsg.longitude,
-                'alt': rosmsg.altitude,
-                'timestamp': get_timestamp(rosmsg, msg),
-            },
-        )
+        timestamps.append(get_timestamp(rosmsg, msg))
+        values.append((rosmsg.latitude, rosmsg.longitude, rosmsg.altitude))
+        if len(timestamps) == CHUNK_SIZE:
+            yield marv.push(make_chunk(timestamps, values, ('lat', 'lon', 'alt')))
+            timestamps, values = [], []
+
+    if timestamps:
+        yield marv.push(make_chunk(timestamps, values, ('lat', 'lon', 'alt')))
 
 
 @marv.node()
@@ -88,83 +242,182 @@ def dummy():
     yield
 
 
-@marv.node()
+def kalman_filter(timestamps, positions, pvar, qvar, rvar, state=None):  # pylint: disable=too-many-arguments,too-many-locals
+    """Kalman filter positions using constant velocity model.
+
+    Each axis is modeled with position and velocity. As the motion
+    model, its noise, and the measurement noise are the same for all
+    axes and axes are not coupled, a single 2x2 covariance is tracked
+    and the innovation covariance reduces to a scalar, i.e. solving for
+    the gain is a division.
+
+    Args:
+        timestamps: Array of timestamps.
+        positions: Array of positions with one row per timestamp.
+        pvar: Model uncertainty.
+        qvar: Process uncertainty.
+        rvar: Measurement uncertainty.
+        state: State returned by previous call to continue filtering.
+
+    Returns:
+        Filtered positions, history of filtered states and covariances
+        for smoothing, and state to continue with.
+
+    """
+    # pylint: disable=invalid-name
+    count, naxes = positions.shape
+    if state is None:
+        last_ts = int(timestamps[0])
+        pos = positions[0].tolist()
+        vel = [0.] * naxes
+        cov = (pvar, 0., pvar)
+    else:
+        last_ts, pos, vel, cov = state
+
+    dts = numpy.diff(timestamps.astype(numpy.int64), prepend=numpy.int64(last_ts)) / 1e9
+    covs = numpy.empty((count, 3))
+    preds = numpy.empty((count, 3))
+
+    # Covariance and gains do not depend on measurements, compute once for all axes.
+    p00, p01, p11 = cov
+    gains0 = [0.] * count
+    gains1 = [0.] * count
+    start = 0
+    if state is None:
+        # first measurement is taken as is
+        gains0[0] = 1.
+        covs[0] = preds[0] = cov
+        start = 1
+
+    for idx, dt in enumerate(dts[start:].tolist(), start):
+        dt2 = dt * dt
+
+        # predict: P = F P F' + G G' qvar with G = [dt**2 / 2, dt]
+        a = p00 + 2 * dt * p01 + dt2 * p11 + .25 * dt2 * dt2 * qvar
+        b = p01 + dt * p11 + .5 * dt2 * dt * qvar
+        c = p11 + dt2 * qvar
+        preds[idx] = (a, b, c)
+
+        # update: K = P H' / (H P H' + rvar) and P = P - K H P
+        k0 = gains0[idx] = a / (a + rvar)
+        k1 = gains1[idx] = b / (a + rvar)
+        p00, p01, p11 = a - k0 * a, b - k0 * b, c - k1 * b
+        covs[idx] = (p00, p01, p11)
+
+    states = numpy.empty((count, naxes, 2))
+    steps = list(zip(dts.tolist(), gains0, gains1))
+    for axis in range(naxes):
+        x, v = pos[axis], vel[axis]
+        xs = [0.] * count
+        vs = [0.] * count
+        for idx, ((dt, k0, k1), z) in enumerate(zip(steps, positions[:, axis].tolist())):
+            x += dt * v
+            res = z - x
+            x += k0 * res
+            v += k1 * res
+            xs[idx] = x
+            vs[idx] = v
+        pos[axis], vel[axis] = x, v
+        states[:, axis, 0] = xs
+        states[:, axis, 1] = vs
+
+    history = {'states': states, 'covs': covs, 'preds': preds, 'dts': dts}
+    return states[:, :, 0], history, (int(timestamps[-1]), pos, vel, (p00, p01, p11))
+
+
+def rts_smooth(history):
+    """Smooth Kalman filter output with Rauch-Tung-Striebel smoother.
+
+    Args:
+        history: History of filtered states as returned by kalman_filter.
+
+    Returns:
+        Smoothed positions.
+
+    """
+    states = history['states']
+    count = len(states)
+    if count < 2:
+        return states[:, :, 0].copy()
+
+    def matrices(entries):
+        return numpy.stack([entries[:, 0], entries[:, 1], entries[:, 1], entries[:, 2]],
+                           axis=1).reshape(-1, 2, 2)
+
+    covs = matrices(history['covs'][:-1])
+    preds = matrices(history['preds'][1:])
+    trans = numpy.zeros((count - 1, 2, 2))
+    trans[:, 0, 0] = trans[:, 1, 1] = 1
+    trans[:, 0, 1] = history['dts'][1:]
+
+    # Gains C = P F' Ppred^-1, solved as C' = Ppred^-1 F P for symmetric covariances
+    gains = numpy.linalg.solve(preds, trans @ covs).transpose(0, 2, 1)
+    predicted = numpy.einsum('kij,kaj->kai', trans, states[:-1])
+
+    gains = gains.reshape(-1, 4).tolist()
+    smoothed = numpy.empty(states.shape[:2])
+    for axis in range(states.shape[1]):
+        filtered = states[:-1, axis].tolist()
+        priors = predicted[:, axis].tolist()
+        x, v = states[-1, axis].tolist()
+        xs = [0.] * count
+        xs[-1] = x
+        for idx in range(count - 2, -1, -1):
+            c00, c01, c10, c11 = gains[idx]
+            dx, dv = x - priors[idx][0], v - priors[idx][1]
+            x, v = filtered[idx]
+            x, v = x + c00 * dx + c01 * dv, v + c10 * dx + c11 * dv
+            xs[idx] = x
+        smoothed[:, axis] = xs
+    return smoothed
+
+
+@marv.node(TimeseriesChunk)
 @marv.input('pos', dummy)
 @marv.input('pvar', type=float)
 @marv.input('qvar', type=float)
 @marv.input('rvar', type=float)
 @marv.input('keys', (), type=tuple)
-def filter_pos(pos, pvar, qvar, rvar, keys):  # pylint: disable=too-many-arguments,too-many-locals
+@marv.input('smooth', False, type=bool)
+def filter_pos(pos, pvar, qvar, rvar, keys, smooth):  # pylint: disable=too-many-arguments,too-many-locals
     """Kalman filter input stream using simple linear motion model.
 
     Args:
-        pos: Message stream with timestamped positional data.
+        pos: Timeseries chunks with positional data.
         pvar: Model uncertainty.
         qvar: Process uncertainty.
         rvar: Measurement uncertainty.
-        keys: Keynames of positional data.
+        keys: Column names of positional data.
+        smooth: Smooth filtered positions in a backward pass over all samples.
 
     Yields:
-        Message stream with timestamped filtered positions.
+        Timeseries chunks with filtered positions.
 
     """
-    # pylint: disable=invalid-name
-    msg = yield marv.pull(pos)
-    if msg is None:
+    chunk = yield marv.pull(pos)
+    if chunk is None:
         return
 
     yield marv.set_header(title=pos.title)
-    yield marv.push(msg)
-
-    F = numpy.eye(6)
-    x = numpy.array([
-        msg[keys[0]],
-        0.,
-        msg[keys[1]],
-        0.,
-        msg[keys[2]],
-        0.,
-    ])
-    P = numpy.eye(6) * pvar
-    Q = numpy.eye(6)
-
-    R = numpy.eye(3) * rvar
-    H = numpy.array([
-        [1, 0, 0, 0, 0, 0],
-        [0, 0, 1, 0, 0, 0],
-        [0, 0, 0, 0, 1, 0],
-    ])
-
-    last_ts = msg['timestamp']
-    while msg := (yield marv.pull(pos)):
-        dt = (msg['timestamp'] - last_ts) / 1e9
-        last_ts = msg['timestamp']
-
-        F[0, 1] = dt
-        F[2, 3] = dt
-        F[4, 5] = dt
-
-        G = numpy.array([[.5 * dt**2, dt]]).T
-        subQ = G.dot(G.T) * qvar
-        Q[0:2, 0:2] = subQ
-        Q[2:4, 2:4] = subQ
-        Q[4:6, 4:6] = subQ
-
-        x = F.dot(x)
-        P = F.dot(P).dot(F.T) + Q
-
-        z = numpy.array([msg[x] for x in keys])
-        K = P.dot(H.T).dot(numpy.linalg.inv(H.dot(P).dot(H.T) + R))
-        x = x + K.dot(z - H.dot(x))
-        P = P - K.dot(H).dot(P)
-
-        res = H.dot(x)
-        dct = {x: float(res[i]) for i, x in enumerate(keys)}
-        dct['timestamp'] = last_ts
-        yield marv.push(dct)
-
-
-@marv.node(TimedFloat64, version=1)
+
+    if smooth:
+        (timestamps, columns), = yield from pull_chunks(pos, first=chunk)
+        positions = numpy.stack([columns[key] for key in keys], axis=1)
+        _, history, _ = kalman_filter(timestamps, positions, pvar, qvar, rvar)
+        smoothed = rts_smooth(history)
+        yield from push_chunks(timestamps, dict(zip(keys, smoothed.T)))
+        return
+
+    state = None
+    while chunk:
+        timestamps, columns = read_chunk(chunk)
+        positions = numpy.stack([columns[key] for key in keys], axis=1)
+        res, _, state = kalman_filter(timestamps, positions, pvar, qvar, rvar, state)
+        yield marv.push({'timestamps': timestamps, 'names': list(keys), 'values': res.T})
+        chunk = yield marv.pull(pos)
+
+
+@marv.node(TimeseriesChunk, version=2)
 @marv.input(
     'pos',
     filter_pos.clone(pos=position_xyz, pvar=100., qvar=4., rvar=.1, keys=['x', 'y', 'z']),
@@ -174,30 +427,28 @@ def distance_xyz(pos):
     """Calculate distance from Cartesian positions.
 
     Args:
-        pos: Message stream with Cartesian position messages.
+        pos: Timeseries chunks with Cartesian positions.
 
     Yields:
-        Message stream with distances.
+        Timeseries chunks with distances.
 
     """
-    msg = yield marv.pull(pos)
-    if msg is None:
+    chunk = yield marv.pull(pos)
+    if chunk is None:
         return
 
     yield marv.set_header(title=pos.title)
-    yield marv.push({'value': 0, 'timestamp': msg['timestamp']})
-    prev = msg
+    prev = None
+    while chunk:
+        timestamps, columns = read_chunk(chunk)
+        xyz = numpy.stack([columns['x'], columns['y'], columns['z']], axis=1)
+        dist = numpy.linalg.norm(xyz - shifted(xyz, prev), axis=1)
+        yield marv.push({'timestamps': timestamps, 'names': ['distance'], 'values': [dist]})
+        prev = xyz[-1]
+        chunk = yield marv.pull(pos)
 
-    while msg := (yield marv.pull(pos)):
-        diffe = msg['x'] - prev['x']
-        diffn = msg['y'] - prev['y']
-        diffa = msg['z'] - prev['z']
-        dist = (diffe**2 + diffn**2 + diffa**2)**0.5
-        yield marv.push({'value': dist, 'timestamp': msg['timestamp']})
-        prev = msg
 
-
-@marv.node(TimedFloat64, version=1)
+@marv.node(TimeseriesChunk, version=2)
 @marv.input(
     'pos',
     filter_pos.clone(
@@ -213,40 +464,37 @@ def distance_gps(pos):
     """Calculate distance from GPS positions.
 
     Args:
-        pos: Message stream with GPS position messages.
+        pos: Timeseries chunks with GPS positions.
 
     Yields:
-        Message stream with distances.
+        Timeseries chunks with distances.
 
     """
-    msg = yield marv.pull(pos)
-    if msg is None:
+    chunk = yield marv.pull(pos)
+    if chunk is None:
         return
 
     yield marv.set_header(title=pos.title)
-    yield marv.push({'value': 0, 'timestamp': msg['timestamp']})
-    lat_p = radians(msg['lat'])
-    lon_p = radians(msg['lon'])
-    alt_p = msg['alt']
-
-    while msg := (yield marv.pull(pos)):
-        lat = radians(msg['lat'])
-        lon = radians(msg['lon'])
-        alt = msg['alt']
-        lat_d = lat_p - lat
-        lon_d = lon_p - lon
-        alt_d = alt_p - alt
-        dis = sin(lat_d * 0.5)**2 + cos(lat) * cos(lat_p) * sin(lon_d * 0.5)**2
-        dis = 2 * 6371008.8 * asin(sqrt(dis))
-        if not math.isnan(alt_d):
-            dis = sqrt(dis**2 + alt_d**2)  # euclidean approx taking altitude into account
-        yield marv.push({'value': dis, 'timestamp': msg['timestamp']})
-        lat_p = lat
-        lon_p = lon
-        alt_p = alt
-
-
-@marv.node(TimedFloat64, version=1)
+    prev = (None, None, None)
+    while chunk:
+        timestamps, columns = read_chunk(chunk)
+        lat = numpy.radians(columns['lat'])
+        lon = numpy.radians(columns['lon'])
+        alt = columns['alt']
+        dist = haversine(
+            lat,
+            lon,
+            alt,
+            shifted(lat, prev[0]),
+            shifted(lon, prev[1]),
+            shifted(alt, prev[2]),
+        )
+        yield marv.push({'timestamps': timestamps, 'names': ['distance'], 'values': [dist]})
+        prev = (lat[-1], lon[-1], alt[-1])
+        chunk = yield marv.pull(pos)
+
+
+@marv.node(TimeseriesChunk, version=2)
 @marv.input('distance', distance_gps)
 def speed(distance):
     """Calculate speed from distance stream.
@@ -255,27 +503,27 @@ def speed(distance):
     data from a sensor is available.
 
     Args:
-        distance: Message stream with timestamped distance values.
+        distance: Timeseries chunks with distance values.
 
     Yields:
-        Message stream with speed values.
+        Timeseries chunks with speed values.
 
     """
-    msg = yield marv.pull(distance)
-    if msg is None:
+    chunk = yield marv.pull(distance)
+    if chunk is None:
         return
 
     yield marv.set_header(title=distance.title)
-    yield marv.push({'value': 0, 'timestamp': msg.timestamp})
-    pts = msg.timestamp
+    pts = None
+    while chunk:
+        timestamps, columns = read_chunk(chunk)
+        values = per_second(columns['distance'], timestamps, pts)
+        yield marv.push({'timestamps': timestamps, 'names': ['speed'], 'values': [values]})
+        pts = int(timestamps[-1])
+        chunk = yield marv.pull(distance)
 
-    while msg := (yield marv.pull(distance)):
-        speed = msg.value * 1e9 / (msg.timestamp - pts)
-        yield marv.push({'value': speed, 'timestamp': msg.timestamp})
-        pts = msg.timestamp
 
-
-@marv.node(TimedFloat64, version=1)
+@marv.node(TimeseriesChunk, version=2)
 @marv.input('speed', speed)
 def acceleration(speed):
     """Calculate acceleration from speed stream.
@@ -284,32 +532,28 @@ def acceleration(speed):
     acceleration data from a sensor is available.
 
     Args:
-        speed: Message stream with timestamped speed values.
+        speed: Timeseries chunks with speed values.
 
     Yields:
-        Message stream with acceleration values.
+        Timeseries chunks with acceleration values.
 
     """
-    msg = yield marv.pull(speed)
-    if msg is None:
+    chunk = yield marv.pull(speed)
+    if chunk is None:
         return
 
     yield marv.set_header(title=speed.title)
-    yield marv.push({'value': 0, 'timestamp': msg.timestamp})
-
-    msg = yield marv.pull(speed)
-    if msg is None:
-        return
-
-    yield marv.push({'value': 0, 'timestamp': msg.timestamp})
-    pts = msg.timestamp
-    psp = msg.value
-
-    while msg := (yield marv.pull(speed)):
-        acceleration = (msg.value - psp) * 1e9 / (msg.timestamp - pts)
-        yield marv.push({'value': acceleration, 'timestamp': msg.timestamp})
-        pts = msg.timestamp
-        psp = msg.value
+    prev = (None, None)
+    while chunk:
+        timestamps, columns = read_chunk(chunk)
+        speeds = columns['speed']
+        values = per_second(speeds - shifted(speeds, prev[0]), timestamps, prev[1])
+        if prev[0] is None:
+            # first speed is no measurement
+            values[:2] = 0
+        yield marv.push({'timestamps': timestamps, 'names': ['acceleration'], 'values': [values]})
+        prev = (speeds[-1], int(timestamps[-1]))
+        chunk = yield marv.pull(speed)
 
 
 def empty_trace(name, tracetype):
@@ -366,17 +610,19 @@ def empty_plotly_widget(trace, title):
     }
 
 
-@marv.node()
+@marv.node(TimeseriesChunk)
 @marv.input('stream', marv.select(messages, '*:sensor_msgs/msg/NavSatFix'))
 #  @marv.input('stream', marv.select(messages, '*:geometry_msgs/msg/PoseStamped'))
 def easting_northing(stream):
     """Extract easting and northing.
 
+    GPS positions are projected into the UTM zone of the first position.
+
     Args:
         stream: ROS message stream with Pose or GPS messages.
 
     Yields:
-        Message stream with easting and northing.
+        Timeseries chunks with easting and northing.
 
     """
     stream = yield marv.pull(stream)  # take first matching connection
@@ -384,14 +630,35 @@ def easting_northing(stream):
         return
 
     yield marv.set_header(title=stream.topic)
-    deserialize = make_deserialize(stream)
-    while msg := (yield marv.pull(stream)):
-        rosmsg = deserialize(msg.data)
-        if stream.msg_type.endswith('/NavSatFix'):
-            easting, northing, _, _ = utm.from_latlon(rosmsg.latitude, rosmsg.longitude)
-        else:
-            easting, northing = rosmsg.pose.position.x, rosmsg.pose.position.y
-        yield marv.push({'e': easting, 'n': northing})
+    log = yield marv.get_logger()
+    deserialize = make_deserialize(stream, shared=True)
+    get_timestamp = make_get_timestamp(log)
+    navsatfix = stream.msg_type.endswith('/NavSatFix')
+    zone = None
+    timestamps, values = [], []
+    while True:
+        msg = yield marv.pull(stream)
+        if msg:
+            rosmsg = deserialize(msg.data)
+            timestamps.append(get_timestamp(rosmsg, msg))
+            if navsatfix:
+                values.append((rosmsg.latitude, rosmsg.longitude))
+            else:
+                values.append((rosmsg.pose.position.x, rosmsg.pose.position.y))
+            if len(timestamps) < CHUNK_SIZE:
+                continue
+        elif not timestamps:
+            break
+
+        chunk = make_chunk(timestamps, values, ('e', 'n'))
+        if navsatfix:
+            lat, lon = chunk['values']
+            if zone is None:
+                zone = utm.latlon_to_zone_number(lat[0], lon[0])
+            easting, northing, _, _ = utm.from_latlon(lat, lon, force_zone_number=zone)
+            chunk['values'] = numpy.stack([easting, northing])
+        yield marv.push(chunk)
+        timestamps, values = [], []
 
 
 @marv.node(Section)
@@ -399,14 +666,19 @@ def easting_northing(stream):
 @marv.input('distance', distance_gps)
 @marv.input('speed', speed)
 @marv.input('acceleration', acceleration)
-def motion_section(easting_northing, distance, speed, acceleration):  # pylint: disable=too-many-arguments,too-many-locals
+@marv.input('points', PLOT_POINTS, type=int)
+def motion_section(easting_northing, distance, speed, acceleration, points):  # pylint: disable=too-many-arguments,too-many-locals
     """Create motion section.
 
+    Plots are downsampled to at most ``points`` points each, preserving
+    their shape. The full resolution data is provided as CSV file.
+
     Args:
-        easting_northing: Message stream of easting/northing coordinates.
-        distance: Message stream of distances.
-        speed: Message stream of speeds.
-        acceleration: Message stream of accelerations.
+        easting_northing: Timeseries chunks of easting/northing coordinates.
+        distance: Timeseries chunks of distances.
+        speed: Timeseries chunks of speeds.
+        acceleration: Timeseries chunks of accelerations.
+        points: Maximum number of points per plot.
 
     Yields:
         Motion section for frontend.
@@ -429,42 +701,40 @@ def motion_section(easting_northing, distance, speed, acceleration):  # pylint:
     del plots['acceleration']['layout']['margin']
     plots['acceleration']['layout']['yaxis']['title'] = 'acceleration (m/s²)'
 
-    firste = None
-    firstn = None
-    distsum = 0
-    while True:
-        msg_en, msg_distance, msg_speed, msg_acceleration = yield marv.pull_all(
-            easting_northing,
-            distance,
-            speed,
-            acceleration,
-        )
-        if msg_en is None or msg_distance is None or msg_speed is None or msg_acceleration is None:
-            break
-
-        if firste is None:
-            firste = msg_en['e']
-            firstn = msg_en['n']
-            rele = 0
-            reln = 0
-        else:
-            rele = msg_en['e'] - firste
-            reln = msg_en['n'] - firstn
-
-        traces['en']['x'].append(rele)
-        traces['en']['y'].append(reln)
-
-        tsval = int(msg_distance.timestamp / 1e6)
-        traces['distance']['x'].append(tsval)
-        traces['speed']['x'].append(tsval)
-        traces['acceleration']['x'].append(tsval)
-
-        distsum += msg_distance.value
-        traces['distance']['y'].append(distsum)
-        traces['speed']['y'].append(msg_speed.value)
-        traces['acceleration']['y'].append(msg_acceleration.value)
+    series = yield from pull_chunks(easting_northing, distance, speed, acceleration)
+    (_, en), (timestamps, dist), (_, spd), (_, acc) = series
+    count = min(len(x[0]) for x in series)
+
+    if count:
+        columns = {
+            'timestamp': timestamps[:count],
+            'easting': en['e'][:count] - en['e'][0],
+            'northing': en['n'][:count] - en['n'][0],
+            'distance': numpy.cumsum(dist['distance'][:count]),
+            'speed': spd['speed'][:count],
+            'acceleration': acc['acceleration'][:count],
+        }
+        tsvals = timestamps[:count] // 10**6
+        for name, x, y in [
+            ('en', columns['easting'], columns['northing']),
+            ('distance', tsvals, columns['distance']),
+            ('speed', tsvals, columns['speed']),
+            ('acceleration', tsvals, columns['acceleration']),
+        ]:
+            idx = lttb(x, y, points)
+            traces[name]['x'] = x[idx].tolist()
+            traces[name]['y'] = y[idx].tolist()
 
     if traces['distance']['x']:
+        file_data = yield marv.make_file('motion.csv')
+        numpy.savetxt(
+            file_data.path,
+            numpy.stack(list(columns.values()), axis=1),
+            fmt=['%d'] + ['%.17g'] * (len(columns) - 1),
+            delimiter=',',
+            header=','.join(columns),
+            comments='',
+        )
         file_en = yield marv.make_file('easting_northing.json')
         Path(file_en.path).write_text(json.dumps(plots['en']), encoding='utf-8')
         file_dist = yield marv.make_file('distance.json')
@@ -493,6 +763,14 @@ def motion_section(easting_northing, distance, speed, acceleration):  # pylint:
                         'title': '',
                         'plotly': f'marv-partial:{file_accel.relpath}',
                     },
+                    {
+                        'title': '',
+                        'link': {
+                            'href': file_data.relpath,
+                            'title': 'Full resolution data (CSV)',
+                            'download': 'motion.csv',
+                        },
+                    },
                 ],
             },
         )
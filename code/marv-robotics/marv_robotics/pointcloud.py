@@ -0,0 +1,193 @@
+# Copyright 2016 - 2021  Ternaris.
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import numpy
+
+import marv_api as marv
+from marv_api.types import Widget
+
+from .bag import make_deserialize, messages
+
+# sensor_msgs/msg/PointField datatypes
+POINTFIELD_DTYPES = {
+    1: 'i1',
+    2: 'u1',
+    3: 'i2',
+    4: 'u2',
+    5: 'i4',
+    6: 'u4',
+    7: 'f4',
+    8: 'f8',
+}
+
+KEY_BITS = 21
+KEY_OFFSET = 1 << (KEY_BITS - 1)
+
+
+def pointcloud_dtype(msg):
+    """Create structured dtype for points of PointCloud2 message.
+
+    Args:
+        msg: sensor_msgs/msg/PointCloud2 message.
+
+    Returns:
+        NumPy structured dtype with one field per point field.
+
+    """
+    order = '>' if msg.is_bigendian else '<'
+    return numpy.dtype({
+        'names': [x.name for x in msg.fields],
+        'formats': [
+            (f'{order}{POINTFIELD_DTYPES[x.datatype]}', (x.count,))
+            if x.count > 1 else f'{order}{POINTFIELD_DTYPES[x.datatype]}' for x in msg.fields
+        ],
+        'offsets': [x.offset for x in msg.fields],
+        'itemsize': msg.point_step,
+    })
+
+
+def read_points(msg):
+    """Read points of PointCloud2 message without copying.
+
+    Args:
+        msg: sensor_msgs/msg/PointCloud2 message.
+
+    Returns:
+        Structured array of points with shape height x width.
+
+    """
+    return numpy.ndarray(
+        shape=(msg.height, msg.width),
+        dtype=pointcloud_dtype(msg),
+        buffer=memoryview(msg.data),
+        strides=(msg.row_step, msg.point_step),
+    )
+
+
+class VoxelGrid:
+    """Accumulate points in voxel grid with bounded number of voxels.
+
+    Each occupied voxel is represented by the centroid of its points and
+    their mean value. Whenever the number of voxels exceeds the budget,
+    the voxel size is doubled and voxels are merged.
+
+    Voxel indices are limited to 21 bits per axis, points beyond are
+    dropped.
+
+    Args:
+        size: Initial edge length of voxels.
+        max_points: Maximum number of voxels.
+
+    """
+
+    def __init__(self, size, max_points):
+        self.size = size
+        self.max_points = max_points
+        self.keys = numpy.empty(0, dtype=numpy.int64)
+        self.sums = numpy.empty((0, 4))
+        self.counts = numpy.empty(0)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def make_keys(self, xyz):
+        idx = numpy.floor(xyz / self.size) + KEY_OFFSET
+        valid = ((idx >= 0) & (idx < 1 << KEY_BITS)).all(axis=1)
+        idx = idx.astype(numpy.int64)
+        keys = (idx[:, 0] << 2 * KEY_BITS) | (idx[:, 1] << KEY_BITS) | idx[:, 2]
+        return keys, valid
+
+    def reduce(self, keys, sums, counts):
+        self.keys, inverse = numpy.unique(keys, return_inverse=True)
+        self.sums = numpy.stack([
+            numpy.bincount(inverse, weights=x, minlength=len(self.keys)) for x in sums.T
+        ], axis=1)
+        self.counts = numpy.bincount(inverse, weights=counts, minlength=len(self.keys))
+
+    def add(self, points):
+        """Add points to grid.
+
+        Args:
+            points: Array with x, y, z, and value per row.
+
+        """
+        points = points[numpy.isfinite(points).all(axis=1)]
+        keys, valid = self.make_keys(points[:, :3])
+        self.reduce(
+            numpy.concatenate([self.keys, keys[valid]]),
+            numpy.concatenate([self.sums, points[valid]]),
+            numpy.concatenate([self.counts, numpy.ones(numpy.count_nonzero(valid))]),
+        )
+        while len(self.keys) > self.max_points:
+            self.size *= 2
+            keys, _ = self.make_keys(self.points()[:, :3])
+            self.reduce(keys, self.sums, self.counts)
+
+    def points(self):
+        """Get centroid and mean value per voxel."""
+        return self.sums / self.counts[:, None]
+
+
+@marv.node(Widget)
+@marv.input('stream', foreach=marv.select(messages, '*:sensor_msgs/msg/PointCloud2'))
+@marv.input('voxel_size', default=.1)
+@marv.input('max_points', default=500000)
+def pointclouds(stream, voxel_size, max_points):
+    """Accumulate point clouds of each stream in voxel grid.
+
+    Points are accumulated in the coordinate frame of the point clouds,
+    e.g. a static sensor's frame. The voxel size is increased as needed
+    to stay within the point budget.
+
+    The points are written to a binary file with little-endian float32
+    x, y, z, and value per point. The value is the intensity if the
+    point clouds have an intensity field, otherwise the distance to the
+    origin.
+
+    Args:
+        stream: sensor_msgs/msg/PointCloud2 stream.
+        voxel_size (float): Initial voxel edge length.
+        max_points (int): Maximum number of points.
+
+    Yields:
+        Pointcloud widget.
+
+    """
+    yield marv.set_header(title=stream.topic)
+    deserialize = make_deserialize(stream)
+    grid = VoxelGrid(voxel_size, max_points)
+    frameid = None
+    while msg := (yield marv.pull(stream)):
+        rosmsg = deserialize(msg.data)
+        if frameid is None:
+            frameid = rosmsg.header.frame_id
+        points = read_points(rosmsg).ravel()
+        xyz = numpy.stack([points['x'], points['y'], points['z']], axis=1).astype(float)
+        if 'intensity' in points.dtype.names:
+            value = points['intensity']
+        else:
+            value = numpy.linalg.norm(xyz, axis=1)
+        grid.add(numpy.column_stack([xyz, value]))
+
+    if not len(grid):
+        raise marv.Abort()
+
+    points = grid.points().astype('<f4')
+    name = f"{stream.topic.replace('/', '_')[1:]}.bin"
+    blob = yield marv.make_file(name)
+    points.tofile(blob.path)
+    mins = points.min(axis=0).tolist()
+    maxs = points.max(axis=0).tolist()
+    yield marv.push({
+        'title': stream.topic,
+        'pointcloud': {
+            'uri': blob.relpath,
+            'size': points.nbytes,
+            'pointsize': grid.size,
+            'rangex': [mins[0], maxs[0]],
+            'rangey': [mins[1], maxs[1]],
+            'rangez': [mins[2], maxs[2]],
+            'ranged': [mins[3], maxs[3]],
+            'frameid': frameid,
+        },
+    })
@@ -0,0 +1,71 @@
+# Copyright 2016 - 2021  Ternaris.
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import pytest
+from mcap.writer import Writer
+
+from marv_api import DatasetInfo as DSI  # noqa: N814
+from marv_api import ReaderError
+from marv_robotics.bag import _read_bagmeta_mcap, read_messages, scan
+
+MD5SUM = '27ffa0c9c4b8fb8492252bcad9e5c57b'
+
+
+def write_mcap(path, chunk_size=64):
+    with path.open('wb') as f:
+        writer = Writer(f, chunk_size=chunk_size)
+        writer.start(profile='ros1')
+        sid = writer.register_schema('std_msgs/Int8', 'ros1msg', b'int8 data')
+        foo = writer.register_channel('/foo', 'ros1', sid, {'md5sum': MD5SUM})
+        bar = writer.register_channel('/bar', 'ros1', sid, {'latching': '1'})
+        for idx in range(20):
+            writer.add_message(foo, idx * 10, bytes([idx]), idx * 10)
+            if idx % 2:
+                writer.add_message(bar, idx * 10 + 1, bytes([idx]), idx * 10 + 1)
+        writer.finish()
+
+
+def test_scan_mcap():
+    assert scan('/', [''], ['a.bag', 'b.mcap', 'c.mcap']) == [
+        DSI(name='a', files=['a.bag']),
+        DSI(name='b', files=['b.mcap']),
+        DSI(name='c', files=['c.mcap']),
+    ]
+
+
+def test_read_bagmeta_mcap(tmp_path):
+    path = tmp_path / 'test.mcap'
+    write_mcap(path)
+    meta = _read_bagmeta_mcap(str(path))
+    assert meta['start_time'] == 0
+    assert meta['end_time'] == 192
+    assert meta['msg_count'] == 30
+    foo, bar = meta['connections']
+    assert foo['topic'] == '/foo'
+    assert foo['datatype'] == 'std_msgs/msg/Int8'
+    assert foo['md5sum'] == MD5SUM
+    assert foo['msg_def'] == 'int8 data'
+    assert foo['msg_count'] == 20
+    assert not foo['latching']
+    assert foo['serialization_format'] == 'ros1'
+    assert bar['msg_count'] == 10
+    assert bar['latching']
+
+    path.write_bytes(path.read_bytes()[:200])
+    with pytest.raises(ReaderError):
+        _read_bagmeta_mcap(str(path))
+
+
+def test_read_messages_mcap(tmp_path):
+    path = tmp_path / 'test.mcap'
+    write_mcap(path)
+    msgs = [
+        (con.topic, timestamp, data)
+        for con, timestamp, data in read_messages([str(path)], topics=['/bar'], start_time=50,
+                                                  end_time=100)
+    ]
+    assert msgs == [('/bar', x * 10 + 1, bytes([x])) for x in (5, 7, 9)]
+
+    msgs = list(read_messages([str(path)], topics=['/foo', '/bar'], wipe_typesys=True))
+    assert len(msgs) == 30
+    assert [x[1] for x in msgs] == sorted(x[1] for x in msgs)
@@ -1,9 +1,23 @@
 # Copyright 2016 - 2020  Ternaris.
 # SPDX-License-Identifier: AGPL-3.0-only
 
+import pickle
+from collections import Counter
 from unittest.mock import Mock
 
-from marv_robotics.bag import make_get_timestamp
+import pytest
+from rosbags import rosbag1
+
+from marv_api import ReaderError
+from marv_api.utils import file_cache_key
+from marv_robotics import bag
+from marv_robotics.bag import (
+    DESERIALIZE_CACHE,
+    DeserializeCache,
+    make_deserialize,
+    make_get_timestamp,
+    make_message,
+)
 
 
 def test_make_get_timestamp():
@@ -45,3 +59,65 @@ def test_make_get_timestamp():
     bagmsg = Mock([], timestamp=601 * 10**9)
     nanosec = get_timestamp(rosmsg, bagmsg)
     assert nanosec == 0
+
+
+def test_make_message():
+    stats = Counter()
+    for data in (b'', b'abc', b'12345678', bytes(range(256)) * 4):
+        msg = make_message(data, 42, stats)
+        assert msg.data is data
+        assert msg._reader.data == data  # pylint: disable=protected-access
+        assert msg.timestamp == 42
+
+        msg = pickle.loads(pickle.dumps(msg, protocol=5))
+        assert msg.data == data
+        assert msg.timestamp == 42
+
+    assert stats == {'messages': 4, 'bytes': 1035, 'copied': 3}
+
+
+def test_make_deserialize_shared():
+    DESERIALIZE_CACHE.clear()
+    stream = Mock([], msg_type='std_msgs/msg/Int8', rosbag2=True)
+    data = bytes([0, 1, 0, 0, 42])
+    first = make_deserialize(stream, shared=True)
+    second = make_deserialize(stream, shared=True)
+    assert first(data) is second(data)
+    assert first(data).data == 42
+    assert first(bytes([0, 1, 0, 0, 42])) is not second(data)
+    assert make_deserialize(stream)(data) is not first(data)
+
+    cache = DeserializeCache(maxsize=2)
+    deserialize = Mock(side_effect=lambda x: object())
+    bufs = [b'a', b'b', b'c']
+    results = [cache.get(x, 'type', deserialize) for x in bufs]
+    assert cache.get(bufs[2], 'type', deserialize) is results[2]
+    assert cache.get(bufs[0], 'type', deserialize) is not results[0]
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_read_bagmeta_cached(tmp_path):
+    # pylint: disable=protected-access
+    cachedir = tmp_path / 'cache'
+    cachedir.mkdir()
+    path = tmp_path / 'test.bag'
+    with rosbag1.Writer(path) as writer:
+        con = writer.add_connection('/foo', 'std_msgs/msg/Int8', 'int8 data')
+        writer.write(con, 42, b'\x01')
+        writer.write(con, 43, b'\x02')
+
+    assert bag._read_bagmeta_cached(None, str(path), 1, 2)[1] is False
+    assert not list(cachedir.iterdir())
+
+    meta, cached = bag._read_bagmeta_cached(cachedir, str(path), 1, 2)
+    assert not cached
+    assert meta['start_time'] == 42
+    assert meta['end_time'] == 44
+    assert meta['msg_count'] == 2
+    assert meta['connections'][0]['topic'] == '/foo'
+    assert [x.name for x in cachedir.iterdir()] == [f'{file_cache_key(str(path), 1, 2)}.json']
+
+    path.unlink()
+    assert bag._read_bagmeta_cached(cachedir, str(path), 1, 2) == (meta, True)
+    with pytest.raises(ReaderError):
+        bag._read_bagmeta_cached(cachedir, str(path), 1, 3)
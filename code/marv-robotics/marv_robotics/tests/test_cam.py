@@ -0,0 +1,112 @@
+# Copyright 2016 - 2021  Ternaris.
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from subprocess import Popen
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+from marv_api.iomsgs import GetLogger, MakeFile, Pull, SetHeader
+from marv_node.stream import Handle
+from marv_robotics import cam
+
+
+class FakeHandle(Handle):
+    def __init__(self, header):  # pylint: disable=super-init-not-called
+        self.setid, self.node, self.name = None, None, 'stream'
+        self.header = header
+
+
+def make_jpeg(width, height):
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    img[:, :width // 2] = (255, 0, 0)
+    img[height // 2:, :, 2] = 255
+    _, data = cv2.imencode('.jpg', img)
+    return SimpleNamespace(format='jpeg', data=data.tobytes())
+
+
+def drive(gen, msgs, tmp_path):
+    output = []
+    send = None
+    while True:
+        try:
+            request = gen.send(send)
+        except StopIteration:
+            return output
+        send = None
+        if isinstance(request, Pull):
+            send = next(msgs, None)
+        elif isinstance(request, MakeFile):
+            send = SimpleNamespace(path=str(tmp_path / request.name))
+        elif isinstance(request, GetLogger):
+            send = SimpleNamespace(error=output.append, warning=output.append)
+        elif not isinstance(request, SetHeader):
+            output.append(request)
+
+
+def test_make_thumbnail():
+    assert cam.get_reduction(3840, 320) == 8
+    assert cam.get_reduction(1280, 320) == 4
+    assert cam.get_reduction(1000, 320) == 2
+    assert cam.get_reduction(600, 320) == 1
+
+    msg = make_jpeg(3840, 2160)
+    full, source_width = cam.make_thumbnail(msg, 320)
+    assert source_width == 3840
+    reduced, source_width = cam.make_thumbnail(msg, 320, source_width=source_width)
+    assert source_width == 3840
+
+    full = cv2.imdecode(np.frombuffer(full, np.uint8), cv2.IMREAD_COLOR)
+    reduced = cv2.imdecode(np.frombuffer(reduced, np.uint8), cv2.IMREAD_COLOR)
+    assert full.shape == reduced.shape == (180, 320, 3)
+    assert np.abs(full.astype(int) - reduced).mean() < 2
+
+    # too small for reduced decode
+    _, source_width = cam.make_thumbnail(make_jpeg(600, 400), 320, source_width=3840)
+    assert source_width == 600
+
+
+def test_images(tmp_path, monkeypatch):
+    monkeypatch.setattr(cam, 'make_deserialize', lambda stream: lambda data: data)
+    msgs = iter([SimpleNamespace(data=make_jpeg(1280, 720)) for _ in range(20)])
+    stream = FakeHandle({'topic': '/cam', 'msg_count': 20})
+
+    files = [x.path for x in drive(cam.images(stream, 320, 5, 1, 0, 2), msgs, tmp_path)]
+    assert [x.rsplit('/', 1)[1] for x in files] == [f'cam-{x:02d}.jpg' for x in range(0, 20, 4)]
+    for path in files:
+        assert cv2.imread(path).shape == (180, 320, 3)
+
+
+def test_ffmpeg(tmp_path, monkeypatch):
+    calls = []
+
+    def popen(args, **kw):
+        calls.append(args)
+        return Popen(['sh', '-c', f'cat > {args[-1]}'], **kw)  # pylint: disable=consider-using-with
+
+    monkeypatch.setattr(cam, 'popen', popen)
+    monkeypatch.setattr(cam, 'make_deserialize', lambda stream: lambda data: data)
+    stream = FakeHandle({
+        'topic': '/cam',
+        'msg_count': 30,
+        'start_time': 0,
+        'end_time': 3 * 10**9,
+    })
+
+    frame = make_jpeg(64, 48)
+    msgs = iter([SimpleNamespace(data=frame) for _ in range(30)])
+    output = drive(cam.ffmpeg(stream, 4, 1, 0, 'h264', 4), msgs, tmp_path)
+    assert [x.path for x in output] == [str(tmp_path / 'cam.mp4')]
+    assert calls[0][calls[0].index('-framerate') + 1] == '3.3333333333333335'
+    assert calls[0][calls[0].index('-c:v') + 1] == 'libx264'
+    assert (tmp_path / 'cam.mp4').stat().st_size == 10 * 64 * 48 * 3
+
+    msgs = iter([SimpleNamespace(data=frame), SimpleNamespace(data=make_jpeg(32, 24))])
+    output = drive(cam.ffmpeg(stream, 4, 1, 0, 'vp9', 0), msgs, tmp_path)
+    assert output == ['could not encode, image size changed (48, 64) != (24, 32)']
+    assert calls[1][calls[1].index('-speed') + 1] == '4'
+
+    with pytest.raises(ValueError, match='choose one of vp9, vp8, h264'):
+        drive(cam.ffmpeg(stream, 4, 1, 0, 'av1', 0), msgs, tmp_path)
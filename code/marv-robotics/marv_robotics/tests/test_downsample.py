@@ -0,0 +1,46 @@
+# Copyright 2016 - 2021  Ternaris.
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import numpy as np
+
+from marv_robotics.downsample import douglas_peucker, lttb
+
+
+def test_lttb():
+    x = np.arange(1000)
+    y = np.sin(x / 50)
+    y[321] = 10.
+    y[654] = -10.
+
+    idx = lttb(x, y, 100)
+    assert len(idx) == 100
+    assert idx[0] == 0
+    assert idx[-1] == 999
+    assert (np.diff(idx) > 0).all()
+    assert {321, 654} <= set(idx.tolist())
+
+    assert lttb(x[:50], y[:50], 100).tolist() == list(range(50))
+    assert lttb(x[:10], y[:10], 2).tolist() == list(range(10))
+
+
+def test_lttb_trajectory():
+    angle = np.linspace(0, 4 * np.pi, 5000)
+    idx = lttb(np.cos(angle), np.sin(angle), 200)
+    assert len(idx) == 200
+    assert np.abs(np.hypot(np.cos(angle[idx]), np.sin(angle[idx])) - 1).max() < 1e-9
+
+
+def test_douglas_peucker():
+    x = np.arange(11.)
+    y = np.zeros(11)
+    y[5] = 1.
+    y[8] = .05
+    assert douglas_peucker(x, y, .1).tolist() == [0, 4, 5, 6, 10]
+    assert douglas_peucker(x, y, .01).tolist() == [0, 4, 5, 6, 7, 8, 9, 10]
+    assert douglas_peucker(x, y, 2.).tolist() == [0, 10]
+    assert douglas_peucker(x, y, 0.).tolist() == list(range(11))
+
+    # closed loop with identical first and last point
+    angle = np.linspace(0, 2 * np.pi, 101)
+    idx = douglas_peucker(np.cos(angle), np.sin(angle), .01)
+    assert 3 < len(idx) < 101
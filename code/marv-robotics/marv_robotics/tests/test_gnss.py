@@ -0,0 +1,34 @@
+# Copyright 2016 - 2021  Ternaris.
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import numpy as np
+import pytest
+
+from marv_robotics.gnss import grow, yaw_angles
+
+
+def test_yaw_angles():
+    rng = np.random.default_rng(42)
+    quats = rng.normal(size=(50, 4))
+    quats /= np.linalg.norm(quats, axis=1)[:, None]
+
+    expected = []
+    for x, y, z, w in quats:  # pylint: disable=invalid-name
+        rot = np.array([
+            [1 - 2 * y * y - 2 * z * z, 2 * (x * y - z * w), 2 * (x * z + y * w)],
+            [2 * (x * y + z * w), 1 - 2 * x * x - 2 * z * z, 2 * (y * z - x * w)],
+            [2 * (x * z - y * w), 2 * (x * w + y * z), 1 - 2 * x * x - 2 * y * y],
+        ])
+        vec = rot.dot([1, 0, 0])
+        expected.append(np.arctan2(vec[1], vec[0]))
+
+    assert yaw_angles(*quats.T).tolist() == pytest.approx(expected)
+
+
+def test_grow():
+    rows = grow(np.empty((0, 3)))
+    assert rows.shape == (1, 3)
+    rows[0] = 1, 2, 3
+    rows = grow(rows)
+    assert rows.shape == (2, 3)
+    assert rows[0].tolist() == [1, 2, 3]
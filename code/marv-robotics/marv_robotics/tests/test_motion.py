@@ -0,0 +1,197 @@
+# Copyright 2019 - 2021  Ternaris, all rights reserved.
+# SPDX-License-Identifier: PROPRIETARY
+
+from math import asin, cos, radians, sin, sqrt
+
+import numpy as np
+import pytest
+
+from marv_api.ioctrl import NODE_SCHEMA
+from marv_api.iomsgs import Pull, PullAll, Push, SetHeader
+from marv_api.types import TimeseriesChunk
+from marv_node.stream import Handle
+from marv_pycapnp import Wrapper
+from marv_robotics import motion
+
+
+class FakeHandle(Handle):
+    def __init__(self, name, msgs):  # pylint: disable=super-init-not-called
+        self.setid, self.node, self.name = None, None, name
+        self.header = {'title': name}
+        self.msgs = iter(msgs)
+
+
+def run(node, *args):
+    """Drive node generator with messages of fake handles."""
+    token = NODE_SCHEMA.set(TimeseriesChunk)
+    try:
+        gen = node(*args)
+        output = []
+        send = None
+        while True:
+            try:
+                request = gen.send(send)
+            except StopIteration:
+                return output
+            send = None
+            if isinstance(request, Pull):
+                send = next(request.handle.msgs, None)
+            elif isinstance(request, PullAll):
+                send = [next(x.msgs, None) for x in request.handles]
+            elif isinstance(request, Push):
+                output.append(request.output)
+            else:
+                assert isinstance(request, SetHeader), request
+    finally:
+        NODE_SCHEMA.reset(token)
+
+
+def chunks(timestamps, **columns):
+    return [
+        Wrapper.from_dict(TimeseriesChunk, {
+            'timestamps': timestamps[start:start + 7],
+            'names': list(columns),
+            'values': np.stack([x[start:start + 7] for x in columns.values()]),
+        }) for start in range(0, len(timestamps), 7)
+    ]
+
+
+def values(output, name):
+    return np.concatenate([motion.read_chunk(x)[1][name] for x in output])
+
+
+def test_chunk_helpers(monkeypatch):
+    monkeypatch.setattr(motion, 'CHUNK_SIZE', 3)
+    timestamps = np.arange(8, dtype=np.uint64)
+    token = NODE_SCHEMA.set(TimeseriesChunk)
+    try:
+        output = [x.output for x in motion.push_chunks(timestamps, {'a': timestamps * 2.})]
+    finally:
+        NODE_SCHEMA.reset(token)
+    assert [len(x.timestamps) for x in output] == [3, 3, 2]
+    stamps, columns = motion.read_chunk(output[1])
+    assert stamps.tolist() == [3, 4, 5]
+    assert columns['a'].tolist() == [6., 8., 10.]
+
+    chunk = motion.make_chunk([1, 2], [(1., 2.), (3., 4.)], 'xy')
+    chunk = Wrapper.from_dict(TimeseriesChunk, chunk)
+    assert chunk.values == [[1., 3.], [2., 4.]]
+
+
+def test_motion_chain():
+    # pylint: disable=too-many-locals
+    rng = np.random.default_rng(42)
+    count = 30
+    timestamps = np.cumsum(rng.integers(10**8, 2 * 10**8, count)).astype(np.uint64)
+    lat = 48. + np.cumsum(rng.random(count)) * 1e-5
+    lon = 16. + np.cumsum(rng.random(count)) * 1e-5
+    alt = rng.random(count)
+    alt[5] = np.nan
+
+    pos = FakeHandle('pos', chunks(timestamps, lat=lat, lon=lon, alt=alt))
+    dist = run(motion.distance_gps, pos)
+    distances = values(dist, 'distance')
+    expected = [0.]
+    for idx in range(1, count):
+        lat_p, lon_p = radians(lat[idx - 1]), radians(lon[idx - 1])
+        lat_c, lon_c = radians(lat[idx]), radians(lon[idx])
+        dis = sin((lat_p - lat_c) * .5)**2 + cos(lat_c) * cos(lat_p) * sin((lon_p - lon_c) * .5)**2
+        dis = 2 * 6371008.8 * asin(sqrt(dis))
+        alt_d = alt[idx - 1] - alt[idx]
+        expected.append(dis if np.isnan(alt_d) else sqrt(dis**2 + alt_d**2))
+    assert distances.tolist() == pytest.approx(expected)
+
+    speeds = values(run(motion.speed, FakeHandle('distance', dist)), 'speed')
+    expected = [0.] + [
+        distances[idx] * 1e9 / int(timestamps[idx] - timestamps[idx - 1])
+        for idx in range(1, count)
+    ]
+    assert speeds.tolist() == pytest.approx(expected)
+
+    accs = values(run(motion.acceleration, FakeHandle('speed', chunks(timestamps, speed=speeds))),
+                  'acceleration')
+    expected = [0., 0.] + [
+        (speeds[idx] - speeds[idx - 1]) * 1e9 / int(timestamps[idx] - timestamps[idx - 1])
+        for idx in range(2, count)
+    ]
+    assert accs.tolist() == pytest.approx(expected)
+
+
+def test_filter_pos():
+    rng = np.random.default_rng(42)
+    count = 20
+    timestamps = np.cumsum(rng.integers(10**8, 2 * 10**8, count)).astype(np.uint64)
+    xyz = np.cumsum(rng.random((count, 3)), axis=0)
+    output = run(
+        motion.filter_pos,
+        FakeHandle('pos', chunks(timestamps, x=xyz[:, 0], y=xyz[:, 1], z=xyz[:, 2])),
+        100.,
+        4.,
+        .1,
+        ('x', 'y', 'z'),
+        False,
+    )
+    filtered = np.stack([values(output, x) for x in 'xyz'], axis=1)
+    assert np.concatenate([x.timestamps.as_array() for x in output]).tolist() == \
+        timestamps.tolist()
+    assert filtered[0].tolist() == xyz[0].tolist()
+    assert np.abs(filtered - xyz).max() < .5
+    assert filtered.ravel().tolist() == \
+        pytest.approx(reference_filter(timestamps, xyz, 100., 4., .1).ravel().tolist())
+
+    output = run(
+        motion.filter_pos,
+        FakeHandle('pos', chunks(timestamps, x=xyz[:, 0], y=xyz[:, 1], z=xyz[:, 2])),
+        100.,
+        4.,
+        .1,
+        ('x', 'y', 'z'),
+        True,
+    )
+    smoothed = np.stack([values(output, x) for x in 'xyz'], axis=1)
+    assert np.concatenate([x.timestamps.as_array() for x in output]).tolist() == \
+        timestamps.tolist()
+    assert smoothed[-1].tolist() == pytest.approx(filtered[-1].tolist())
+    assert np.abs(smoothed - xyz).max() < .5
+
+
+def reference_filter(timestamps, zs, pvar, qvar, rvar):
+    """Kalman filter with full state as implemented before batching."""
+    # pylint: disable=invalid-name
+    F = np.eye(6)
+    P = np.eye(6) * pvar
+    Q = np.eye(6)
+    R = np.eye(3) * rvar
+    H = np.zeros((3, 6))
+    H[0, 0] = H[1, 2] = H[2, 4] = 1
+    x = np.array([zs[0, 0], 0., zs[0, 1], 0., zs[0, 2], 0.])
+    res = [zs[0]]
+    for idx in range(1, len(zs)):
+        dt = int(timestamps[idx] - timestamps[idx - 1]) / 1e9
+        F[0, 1] = F[2, 3] = F[4, 5] = dt
+        G = np.array([[.5 * dt**2, dt]]).T
+        Q[0:2, 0:2] = Q[2:4, 2:4] = Q[4:6, 4:6] = G.dot(G.T) * qvar
+        x = F.dot(x)
+        P = F.dot(P).dot(F.T) + Q
+        K = P.dot(H.T).dot(np.linalg.inv(H.dot(P).dot(H.T) + R))
+        x = x + K.dot(zs[idx] - H.dot(x))
+        P = P - K.dot(H).dot(P)
+        res.append(H.dot(x))
+    return np.array(res)
+
+
+def test_rts_smooth():
+    rng = np.random.default_rng(42)
+    count = 200
+    timestamps = np.cumsum(rng.integers(10**8, 2 * 10**8, count)).astype(np.uint64)
+    truth = np.cumsum(np.full((count, 2), .1), axis=0)
+    noisy = truth + rng.normal(0, .05, (count, 2))
+    filtered, history, _ = motion.kalman_filter(timestamps, noisy, 100., .01, .05**2)
+    smoothed = motion.rts_smooth(history)
+    assert smoothed.shape == noisy.shape
+    assert np.abs(smoothed - truth).mean() < np.abs(filtered - truth).mean()
+
+    # continuing from state yields identical results
+    first, _, state = motion.kalman_filter(timestamps[:50], noisy[:50], 100., .01, .05**2)
+    second, _, _ = motion.kalman_filter(timestamps[50:], noisy[50:], 100., .01, .05**2, state)
+    assert np.concatenate([first, second]).tolist() == filtered.tolist()
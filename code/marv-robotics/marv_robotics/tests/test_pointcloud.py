@@ -0,0 +1,75 @@
+# Copyright 2016 - 2021  Ternaris.
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from marv_robotics.pointcloud import VoxelGrid, read_points
+
+
+def make_cloud(xyz, intensity, width):
+    height = len(xyz) // width
+    row_step = width * 32 + 8
+    data = np.zeros(height * row_step, dtype=np.uint8)
+    for idx, (point, value) in enumerate(zip(xyz, intensity)):
+        row, col = divmod(idx, width)
+        start = row * row_step + col * 32
+        data[start:start + 12] = np.frombuffer(np.array(point, '<f4').tobytes(), np.uint8)
+        data[start + 16:start + 24] = np.frombuffer(np.array(value, '<f8').tobytes(), np.uint8)
+    field = SimpleNamespace
+    return SimpleNamespace(
+        height=height,
+        width=width,
+        fields=[
+            field(name='x', offset=0, datatype=7, count=1),
+            field(name='y', offset=4, datatype=7, count=1),
+            field(name='z', offset=8, datatype=7, count=1),
+            field(name='intensity', offset=16, datatype=8, count=1),
+        ],
+        is_bigendian=False,
+        point_step=32,
+        row_step=row_step,
+        data=data,
+    )
+
+
+def test_read_points():
+    rng = np.random.default_rng(42)
+    xyz = rng.random((12, 3)).astype('<f4')
+    intensity = rng.random(12)
+    msg = make_cloud(xyz, intensity, 4)
+
+    points = read_points(msg)
+    assert points.shape == (3, 4)
+    assert np.shares_memory(points, msg.data)
+    points = points.ravel()
+    assert np.stack([points['x'], points['y'], points['z']], axis=1).tolist() == xyz.tolist()
+    assert points['intensity'].tolist() == intensity.tolist()
+
+
+def test_voxel_grid():
+    grid = VoxelGrid(1., 10)
+    grid.add(np.array([
+        [.1, .1, .1, 1.],
+        [.3, .5, .7, 3.],
+        [1.5, .5, .5, 5.],
+        [-.5, .5, .5, 7.],
+        [np.nan, 0., 0., 0.],
+    ]))
+    assert len(grid) == 3
+    assert grid.points().ravel().tolist() == pytest.approx([
+        -.5, .5, .5, 7.,
+        .2, .3, .4, 2.,
+        1.5, .5, .5, 5.,
+    ])
+
+    grid.add(np.array([[.5, .5, .5, 6.]]))
+    assert len(grid) == 3
+    assert grid.points()[1].tolist() == pytest.approx([.3, 1.1 / 3, 1.3 / 3, 10 / 3])
+
+    grid.add(np.random.default_rng(42).random((1000, 4)) * 20)
+    assert len(grid) <= 10
+    assert grid.size > 1.
+    assert grid.counts.sum() == 1005
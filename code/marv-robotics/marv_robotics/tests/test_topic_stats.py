@@ -0,0 +1,83 @@
+# Copyright 2016 - 2021  Ternaris.
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import numpy as np
+import pytest
+from rosbags import rosbag1, rosbag2
+
+from marv_robotics.bag import _index_mcap, _index_rosbag1, _index_rosbag2, make_topic_stat
+from marv_robotics.tests.test_bag_mcap import write_mcap
+
+MSGDEF = 'int8 data'
+
+
+def test_index_rosbag1(tmp_path):
+    path = tmp_path / 'test.bag'
+    with rosbag1.Writer(path) as writer:
+        foo = writer.add_connection('/foo', 'std_msgs/msg/Int8', MSGDEF)
+        bar = writer.add_connection('/bar', 'std_msgs/msg/Int8', MSGDEF)
+        for idx in range(10):
+            writer.write(foo, idx * 10**8, b'x' * (idx + 1))
+            writer.write(bar, idx * 10**8 + 1, b'y' * 3)
+
+    index = {x[0]: x[1:] for x in _index_rosbag1(str(path))}
+    datatype, timestamps, sizes = index['/foo']
+    assert datatype == 'std_msgs/msg/Int8'
+    assert timestamps.tolist() == [x * 10**8 for x in range(10)]
+    assert sizes.tolist() == list(range(1, 11))
+    datatype, timestamps, sizes = index['/bar']
+    assert sizes.tolist() == [3] * 9 + [-1]
+
+
+def test_index_mcap(tmp_path):
+    path = tmp_path / 'test.mcap'
+    write_mcap(path)
+
+    index = {x[0]: x[1:] for x in _index_mcap(str(path))}
+    datatype, timestamps, sizes = index['/foo']
+    assert datatype == 'std_msgs/msg/Int8'
+    assert timestamps.tolist() == [x * 10 for x in range(20)]
+    assert sizes.tolist() == [1] * 20
+    datatype, timestamps, sizes = index['/bar']
+    assert timestamps.tolist() == [x * 10 + 1 for x in range(1, 20, 2)]
+    assert sizes.tolist() == [1] * 10
+
+
+def test_index_rosbag2(tmp_path):
+    path = tmp_path / 'rosbag2'
+    with rosbag2.Writer(path) as writer:
+        foo = writer.add_connection('/foo', 'std_msgs/msg/Int8')
+        for idx in range(5):
+            writer.write(foo, idx * 10**8, b'x' * (idx + 1))
+
+    (topic, datatype, timestamps, sizes), = _index_rosbag2(str(path / 'metadata.yaml'))
+    assert topic == '/foo'
+    assert datatype == 'std_msgs/msg/Int8'
+    assert timestamps.tolist() == [x * 10**8 for x in range(5)]
+    assert sizes.tolist() == [1, 2, 3, 4, 5]
+
+
+def test_make_topic_stat():
+    timestamps = np.array([0, 10, 20, 30, 100, 110], dtype=np.int64) * 10**6
+    sizes = np.array([4, 8, 4, 8, 4, -1])
+    stat = make_topic_stat('/foo', 'std_msgs/msg/Int8', timestamps, sizes)
+    assert stat['msg_count'] == 6
+    assert stat['start_time'] == 0
+    assert stat['end_time'] == 110 * 10**6
+    assert stat['rate'] == pytest.approx(5 / 0.11)
+    assert stat['period_mean'] == 22 * 10**6
+    assert stat['max_gap'] == 70 * 10**6
+    assert stat['gap_count'] == 1
+    assert stat['size_min'] == 4
+    assert stat['size_mean'] == 5.6
+    assert stat['size_max'] == 8
+    assert stat['size_total'] == 28
+
+    stat = make_topic_stat('/foo', 'std_msgs/msg/Int8', timestamps[:1], sizes[:0])
+    assert stat == {
+        'topic': '/foo',
+        'datatype': 'std_msgs/msg/Int8',
+        'msg_count': 1,
+        'start_time': 0,
+        'end_time': 0,
+    }
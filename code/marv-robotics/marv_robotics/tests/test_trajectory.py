@@ -0,0 +1,52 @@
+# Copyright 2016 - 2021  Ternaris.
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import numpy as np
+import pytest
+
+from marv_robotics.trajectory import equirectangular, simplify_trajectory
+
+
+def test_equirectangular():
+    x, y = equirectangular(np.array([0., .001, 0.]), np.array([60., 60., 60.001]))
+    assert x[1] - x[0] == pytest.approx(55.6, abs=.1)
+    assert y[2] - y[0] == pytest.approx(111.2, abs=.1)
+
+
+def test_simplify_trajectory():
+    count = 1000
+    lon = np.linspace(8., 8.01, count)
+    lat = np.full(count, 48.)
+    lat[500] += 1e-4  # ~11m
+    geojson = {'featureCollection': {'features': [
+        {
+            'geometry': {'lineString': {'coordinates': np.stack([lon, lat], axis=1).tolist()}},
+            'properties': {
+                'coordinatesystem': 'WGS84',
+                'color': [0., 1., 0., 1.],
+                'colors': [],
+                'timestamps': list(range(count)),
+                'width': 4.,
+            },
+        },
+        {
+            'geometry': {'point': {'coordinates': [8., 48.]}},
+            'properties': {'coordinatesystem': 'WGS84', 'timestamps': [0]},
+        },
+    ]}}
+
+    simplified = simplify_trajectory(geojson, 1.)
+    line, point = simplified['featureCollection']['features']
+    assert line['geometry']['lineString']['coordinates'].tolist() == [
+        [lon[x], lat[x]] for x in (0, 499, 500, 501, 999)
+    ]
+    assert line['properties']['timestamps'] == [0, 499, 500, 501, 999]
+    assert line['properties']['color'] == [0., 1., 0., 1.]
+    assert line['properties']['colors'] == []
+    assert point is geojson['featureCollection']['features'][1]
+
+    simplified = simplify_trajectory(geojson, 20.)
+    line = simplified['featureCollection']['features'][0]
+    assert line['properties']['timestamps'] == [0, 999]
+
+    assert simplify_trajectory(geojson, 0.) == geojson
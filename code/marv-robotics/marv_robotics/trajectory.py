@@ -7,6 +7,16 @@ import marv_api as marv
 from marv_api.types import GeoJson
 
 from .bag import make_deserialize, make_get_timestamp, messages
+from .downsample import douglas_peucker
+
+# Mean earth radius in meters
+EARTH_RADIUS = 6371008.8
+
+# Tolerance in meters to simplify displayed trajectories with, roughly
+# the size of a pixel at zoom level 18.
+TRAJECTORY_TOLERANCE = .25
+
+VERTEX_PROPERTIES = ('colors', 'fillcolors', 'rotations', 'timestamps')
 
 
 @marv.node()
@@ -14,7 +24,7 @@ from .bag import make_deserialize, make_get_timestamp, messages
 def navsatfix(stream):
     yield marv.set_header(title=stream.topic)
     log = yield marv.get_logger()
-    deserialize = make_deserialize(stream)
+    deserialize = make_deserialize(stream, shared=True)
     get_timestamp = make_get_timestamp(log)
     erroneous = 0
     while msg := (yield marv.pull(stream)):
@@ -112,3 +122,60 @@ def trajectory(navsatfixes):
     if features:
         out = {'feature_collection': {'features': features}}
         yield marv.push(out)
+
+
+def equirectangular(lon, lat):
+    """Project WGS84 coordinates onto plane at latitude of first point.
+
+    Args:
+        lon: Array of longitudes in degrees.
+        lat: Array of latitudes in degrees.
+
+    Returns:
+        Arrays of x and y coordinates in meters.
+
+    """
+    lat = np.radians(lat)
+    return np.radians(lon) * np.cos(lat[0]) * EARTH_RADIUS, lat * EARTH_RADIUS
+
+
+def simplify_trajectory(geojson, tolerance):
+    """Simplify line strings of trajectory feature collection.
+
+    WGS84 coordinates are projected onto a local plane to apply the
+    tolerance in meters. Per vertex properties are reduced accordingly.
+
+    Args:
+        geojson: GeoJson feature collection as dictionary.
+        tolerance: Maximum deviation of simplified lines in meters, zero
+            to keep all points.
+
+    Returns:
+        GeoJson feature collection dictionary with simplified line strings.
+
+    """
+    features = []
+    for feature in geojson['featureCollection']['features']:
+        line = feature['geometry'].get('lineString')
+        if not tolerance or line is None:
+            features.append(feature)
+            continue
+
+        coords = np.array(line['coordinates'])
+        properties = feature['properties']
+        if properties['coordinatesystem'] == 'WGS84':
+            x, y = equirectangular(coords[:, 0], coords[:, 1])
+        else:
+            x, y = coords[:, 0], coords[:, 1]
+        idx = douglas_peucker(x, y, tolerance)
+
+        properties = {
+            key: [value[i] for i in idx]
+            if key in VERTEX_PROPERTIES and len(value) == len(coords) else value
+            for key, value in properties.items()
+        }
+        features.append({
+            'geometry': {'lineString': {'coordinates': coords[idx]}},
+            'properties': properties,
+        })
+    return {'featureCollection': {'features': features}}
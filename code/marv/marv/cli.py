@@ -37,6 +37,7 @@ from marv.db import (
 )
 from marv.site import SiteError, load_sitepackages, make_config
 from marv.utils import within_pyinstaller_bundle
+from marv.watch import watch as watch_scanroots
 from marv_api import ReaderError
 from marv_api.utils import echo, err, find_obj
 from marv_cli import PDB
@@ -170,7 +171,28 @@ async def marvcli_cleanup(ctx, discarded, filters):
         if filters:
             await site.cleanup_relations()
 
-        # TODO: cleanup unused store paths / unused generations
+
+@marvcli.group('store')
+def marvcli_store():
+    """Manage node output store."""
+
+
+@marvcli_store.command('gc')
+@click.option('--dry-run', is_flag=True, help='Report what would be removed without removing')
+@click_async
+async def marvcli_store_gc(dry_run):
+    """Remove unreachable directories from store.
+
+    Removed are set directories of datasets no longer in the database,
+    e.g. after marv cleanup --discarded, generations of node output
+    superseded by later runs, leftovers of aborted node runs, and cache
+    entries of files no longer in the database. Directories of node
+    runs in progress are skipped.
+    """
+    async with create_site() as site:
+        removed, reclaimed = await site.collect_garbage(dry_run=dry_run)
+    verb = 'Would reclaim' if dry_run else 'Reclaimed'
+    click.echo(f'{verb} {reclaimed:,} bytes in {len(removed)} directories and cache entries')
 
 
 @marvcli.group('develop')
@@ -688,12 +710,40 @@ async def marvcli_run(  # noqa: C901
 
 @marvcli.command('scan')
 @click.option('-n', '--dry-run', is_flag=True)
+@click.option(
+    '--full',
+    is_flag=True,
+    help='Scan all directories, also those unchanged since the last scan',
+)
+@click.option('--watch', is_flag=True, help='Keep watching scanroots for changes')
+@click.option(
+    '--interval',
+    default=3600,
+    show_default=True,
+    help='Seconds between scans of all scanroots in watch mode',
+)
+@click.pass_context
 @click_async
-async def marvcli_scan(dry_run):
-    """Scan for new and changed files."""
+async def marvcli_scan(ctx, dry_run, full, watch, interval):
+    """Scan for new and changed files.
+
+    Directories unchanged since the last scan are skipped, use --full
+    after changing a collection's scanner.
+
+    With --watch, scanroots are scanned and then watched for changes
+    using inotify. Directories are scanned once no more events occurred
+    for a few seconds. To catch changes missed by the watch, all
+    scanroots are scanned periodically.
+    """
+    if watch and (dry_run or full):
+        ctx.fail('--watch is mutually exclusive with --dry-run and --full')
+
     async with create_site() as site:
         try:
-            await site.scan(dry_run)
+            if watch:
+                await watch_scanroots(site, interval)
+            else:
+                await site.scan(dry_run, full=full)
         except ConfigError as exc:
             err(f'ERROR: {exc}', exit=1)
 
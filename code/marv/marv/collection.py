@@ -1,22 +1,27 @@
 # Copyright 2016 - 2019  Ternaris.
 # SPDX-License-Identifier: AGPL-3.0-only
 
+import asyncio
 import functools
 import json
 import os
 import re
+import threading
+import time
 import traceback
 from collections import OrderedDict, defaultdict, namedtuple
 from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import suppress
 from inspect import getmembers
 from itertools import groupby
 from logging import getLogger
 
+from pypika import Parameter
 from pypika import SQLLiteQuery as Query
 from pypika import Tables
 
-from marv import utils
+from marv import scanjournal, utils
 from marv.config import ConfigError, calltree, getdeps, make_funcs, parse_function
 from marv.db import scoped_session
 from marv.model import Comment, Dataset, File, make_listing_model, make_table_descriptors
@@ -25,7 +30,7 @@ from marv_api.utils import find_obj
 from marv_detail import FORMATTER_MAP, detail_to_dict
 from marv_detail.types_capnp import Detail  # pylint: disable=no-name-in-module
 from marv_node.node import Node
-from marv_store import Store
+from marv_store import Store, files_fingerprint
 
 FILTER_OPERATORS = \
     'lt le eq ne ge gt substring startswith any all substring_any words'.split()
@@ -41,6 +46,18 @@ FILTER_MAP = {
     'words': lambda lst: ' '.join(lst or []),
 }
 
+# Directories of known files listed concurrently during scan
+STAT_WORKERS = 16
+
+# Details of new datasets rendered concurrently
+RENDER_WORKERS = 4
+
+# Datasets added per bulk insert
+BULK_BATCHSIZE = 200
+
+# Files hashed concurrently for collections with content_hash
+HASH_WORKERS = 4
+
 Filter = namedtuple('Filter', 'name value operator type')
 FilterSpec = namedtuple('FilterSpec', 'name title operators value_type function')
 ListingColumn = namedtuple('ListingColumn', 'name heading formatter islist function')
@@ -89,6 +106,56 @@ def postprocess_functree(name, arguments):
     return (name, *(postprocess_functree(*x) for x in arguments))
 
 
+async def hash_files(files):
+    """Set hash of files, reading them in a pool of worker threads."""
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(HASH_WORKERS) as executor:
+        hashes = await asyncio.gather(
+            *[loop.run_in_executor(executor, utils.hash_file, x.path) for x in files],
+        )
+    for file, hash_ in zip(files, hashes):
+        file.hash = hash_
+
+
+def make_dataset_obj(name, discarded, status, time_added, timestamp, setid, files):
+    """Create lightweight dataset object for rendering without database roundtrip."""
+    # pylint: disable=too-many-arguments
+    return type(
+        'dataset',
+        (),
+        {
+            'id': None,
+            'discarded': discarded,
+            'name': name,
+            'status': status,
+            'time_added': time_added,
+            'timestamp': timestamp,
+            'setid': setid,
+            'files': [type(
+                'file',
+                (),
+                {
+                    'hash': None,
+                    'missing': False,
+                    **x,
+                },
+            )() for x in files],
+            '__repr__': lambda _: f'<Dataset {setid} {name}>',
+        },
+    )()
+
+
+def get_generation(setdir, name):
+    try:
+        return os.readlink(os.path.join(setdir, name))
+    except OSError:
+        return None
+
+
+def lap(started):
+    return time.monotonic() - started
+
+
 def rowdumps(*args, **kw):
     return json.dumps(*args, sort_keys=True, separators=(',', ':'), allow_nan=False, **kw)
 
@@ -155,6 +222,81 @@ def cached_property(func):
     return property(cached_func)
 
 
+async def scan_roots(site, roots, dry_run=False, full=False):  # noqa: C901
+    """Scan roots of collections concurrently.
+
+    Known files are checked one root after another. Afterwards all roots
+    are walked concurrently in worker threads, each invoking its
+    collection's scanner. Found datasets are funneled to the calling
+    coroutine, which is the only one writing to the database. It adds
+    them root by root, keeping the order of a sequential scan.
+
+    Args:
+        site: Site the collections belong to.
+        roots: List of collection and scanroot tuples.
+        dry_run: Only log datasets that would be added.
+        full: Scan also directories unchanged since last scan.
+
+    """
+    # pylint: disable=too-many-locals,protected-access
+    scans = []
+    for collection, scanpath in roots:
+        log = getLogger('.'.join([__name__, collection.name]))
+        scanpath = str(scanpath)
+        if not os.path.isdir(scanpath):
+            log.warning('%s does not exist or is not a directory', scanpath)
+        log.verbose("scanning %s'%s'", 'dry_run ' if dry_run else '', scanpath)
+        journal = site.scanjournal.load(collection.name, scanpath)
+        scans.append((collection, log, scanpath, journal))
+
+    loop = asyncio.get_running_loop()
+    queues = [asyncio.Queue() for _ in scans]
+    stop = threading.Event()
+
+    def find(queue, collection, log, scanpath, journal, known_filenames):
+        try:
+            found = collection.find_datasets(log, scanpath, known_filenames, journal, full, stop)
+            for item in found:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    async with scoped_session(site.db) as connection:
+        knowns = [
+            await collection.check_known_files(connection, log, scanpath, dry_run)
+            for collection, log, scanpath, _ in scans
+        ]
+
+        with ThreadPoolExecutor(len(scans) or 1) as executor:
+            futures = [
+                loop.run_in_executor(executor, find, queue, *scan, known)
+                for queue, scan, known in zip(queues, scans, knowns)
+            ]
+            try:
+                for queue, (collection, log, _, _) in zip(queues, scans):
+                    batch = []
+                    while True:
+                        item = await queue.get()
+                        if item and dry_run:
+                            log.info("would add '%s': '%s'", item[0], item[1])
+                            continue
+                        if item:
+                            batch.append({'name': item[1], 'files': item[2]})
+                        if batch and (item is None or len(batch) >= BULK_BATCHSIZE):
+                            await collection.make_datasets(connection, batch)
+                            batch.clear()
+                        if item is None:
+                            break
+            finally:
+                stop.set()
+            await asyncio.gather(*futures)
+
+    for collection, log, scanpath, journal in scans:
+        if not dry_run:
+            site.scanjournal.store(collection.name, scanpath, journal)
+        log.verbose("finished %s'%s'", 'dry_run ' if dry_run else '', scanpath)
+
+
 class Collection:
     # pylint: disable=too-many-public-methods
 
@@ -320,138 +462,221 @@ class Collection:
         self.name = name
         self.site = site
 
-    async def scan(self, scanpath, dry_run=False):  # noqa: C901
-        # pylint: disable=too-many-locals,too-many-branches,too-many-statements
-
-        log = getLogger('.'.join([__name__, self.name]))
-        if not os.path.isdir(scanpath):
-            log.warning('%s does not exist or is not a directory', scanpath)
+    async def scan(self, scanpath, dry_run=False, full=False):
+        await scan_roots(self.site, [(self, scanpath)], dry_run=dry_run, full=full)
+
+    async def find_identical(self, connection, dataset):
+        """Find other dataset of collection with files of identical content.
+
+        Args:
+            connection: Database connection.
+            dataset: Dataset with prefetched files.
+
+        Returns:
+            Dataset or None if dataset has unhashed files or there is
+            no identical dataset.
+
+        """
+        hashes = [x.hash for x in sorted(dataset.files, key=lambda x: x.idx)]
+        if not hashes or None in hashes:
+            return None
+
+        candidates = await Dataset.filter(
+            collection_id=dataset.collection_id,
+            discarded__not=True,
+            files__hash=hashes[0],
+        ).exclude(id=dataset.id).distinct().order_by('id').prefetch_related('files')\
+         .using_db(connection)
+        for candidate in candidates:
+            if [x.hash for x in sorted(candidate.files, key=lambda x: x.idx)] == hashes:
+                return candidate
+        return None
+
+    async def check_known_files(self, connection, log, scanpath, dry_run=False):
+        """Update missing and mtime of known files within scanpath.
+
+        Returns:
+            Mapping of directories to known filenames.
+
+        """
+        started = time.monotonic()
+        known_files = await File.filter(path__startswith=scanpath)\
+                                .filter(dataset__discarded__not=True)\
+                                .using_db(connection)
+        known_filenames = defaultdict(set)
+        for file in known_files:
+            known_filenames[os.path.dirname(file.path)].add(os.path.basename(file.path))
+        log.verbose('loaded %d known files in %.2fs', len(known_files), lap(started))
+
+        # stat known files concurrently, listing each directory once
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(STAT_WORKERS) as executor:
+            mtimes = dict(
+                zip(
+                    known_filenames,
+                    await asyncio.gather(
+                        *[
+                            loop.run_in_executor(executor, utils.mtimes, directory, names)
+                            for directory, names in known_filenames.items()
+                        ],
+                    ),
+                ),
+            )
+        log.verbose('checked known files in %d directories in %.2fs', len(mtimes), lap(started))
+
+        started = time.monotonic()
+        changes = defaultdict(list)  # all mtime/missing changes in one transaction
+        for file in known_files:
+            path = file.path
+            mtime = mtimes[os.path.dirname(path)].get(os.path.basename(path))
+            missing = mtime is None
+            if missing ^ bool(file.missing):
+                log.info("%s '%s'", 'lost' if missing else 'recovered', path)
+                changes[file.dataset_id].append((file, missing))
+            if mtime and int(mtime * 1000) > file.mtime:
+                log.info("mtime newer '%s'", path)
+                changes[file.dataset_id].append((file, mtime))
+
+        # Apply missing/mtime changes
+        if not dry_run and changes:
+            ids = changes.keys()
+            for dataset in await Dataset.filter(id__in=ids).using_db(connection):
+                for file, change in changes.pop(dataset.id):
+                    check_outdated = False
+                    if isinstance(change, bool):
+                        file.missing = change
+                        dataset.missing = change
+                    else:
+                        file.mtime = int(change * 1000)
+                        file.hash = None
+                        check_outdated = True
+                    await file.save(connection)
+                if check_outdated:
+                    await dataset.fetch_related('files', using_db=connection)
+                    self._check_outdated(dataset)
+                dataset.time_updated = int(utils.now())
+                await dataset.save(connection)
+            assert not changes
+        log.verbose('applied changes in %.2fs', lap(started))
+        return known_filenames
+
+    def find_datasets(self, log, scanpath, known_filenames, journal, full=False, stop=None):
+        """Walk scanpath and pass changed directories to scanner.
+
+        Files of found datasets are added to known filenames. Intended
+        to run in a worker thread, stops early once stop is set.
+
+        Yields:
+            Tuples of directory, dataset name, and absolute filenames.
+
+        """
+        started = time.monotonic()
+        scanned = 0
+        for directory, subdirs, filenames in scanjournal.walk(
+            scanpath,
+            journal,
+            known_filenames,
+            full=full,
+        ):
+            if stop and stop.is_set():
+                return
+            scanned += 1
+
+            # Ignore directories containing a .marvignore file
+            if os.path.exists(os.path.join(directory, '.marvignore')):
+                subdirs.clear()
+                continue
 
-        log.verbose("scanning %s'%s'", 'dry_run ' if dry_run else '', scanpath)
+            # Ignore hidden directories and traverse subdirs alphabetically
+            subdirs[:] = sorted(x for x in subdirs if x[0] != '.')
 
-        # missing/changed flag for known files
-        async with scoped_session(self.site.db) as connection:
-            known_files = await File.filter(path__startswith=scanpath)\
-                                    .filter(dataset__discarded__not=True)\
-                                    .using_db(connection)
-            known_filenames = defaultdict(set)
-            changes = defaultdict(list)  # all mtime/missing changes in one transaction
-            for file in known_files:
-                path = file.path
-                known_filenames[os.path.dirname(path)].add(os.path.basename(path))
-                try:
-                    mtime = utils.mtime(path)
-                    missing = False
-                except OSError:
-                    mtime = None
-                    missing = True
-                if missing ^ bool(file.missing):
-                    log.info("%s '%s'", 'lost' if missing else 'recovered', path)
-                    changes[file.dataset_id].append((file, missing))
-                if mtime and int(mtime * 1000) > file.mtime:
-                    log.info("mtime newer '%s'", path)
-                    changes[file.dataset_id].append((file, mtime))
-
-            # Apply missing/mtime changes
-            if not dry_run and changes:
-                ids = changes.keys()
-                for dataset in await Dataset.filter(id__in=ids).using_db(connection):
-                    for file, change in changes.pop(dataset.id):
-                        check_outdated = False
-                        if isinstance(change, bool):
-                            file.missing = change
-                            dataset.missing = change
-                        else:
-                            file.mtime = int(change * 1000)
-                            check_outdated = True
-                        await file.save(connection)
-                    if check_outdated:
-                        await dataset.fetch_related('files', using_db=connection)
-                        self._check_outdated(dataset)
-                    dataset.time_updated = int(utils.now())
-                    await dataset.save(connection)
-                assert not changes
-
-            # Scan for new files
-            batch = []
-            for directory, subdirs, filenames in utils.walk(scanpath):
-                directory = str(directory)  # TODO: for now we don't pass Path into scanner
-                # Ignore directories containing a .marvignore file
-                if os.path.exists(os.path.join(directory, '.marvignore')):
-                    subdirs.clear()
-                    continue
-
-                # Ignore hidden directories and traverse subdirs alphabetically
-                subdirs[:] = sorted(x for x in subdirs if x[0] != '.')
-
-                # Ignore hidden and known files
-                known = known_filenames[directory]
-                filenames = sorted(x for x in filenames if x[0] != '.' and x not in known)
-
-                if not filenames and not subdirs:
-                    continue
-
-                for name, files in self.scanner(directory, subdirs, filenames):
-                    files = [x if os.path.isabs(x) else os.path.join(directory, x) for x in files]
-                    assert all(x.startswith(directory) for x in files), files
-                    if dry_run:
-                        log.info("would add '%s': '%s'", directory, name)
-                    else:
-                        dataset = await self.make_dataset(connection, files, name)
-                        batch.append(dataset)
-                        if len(batch) >= 50:
-                            await self._upsert_listing(connection, log, batch)
-                            batch.clear()
+            # Ignore hidden and known files
+            known = known_filenames[directory]
+            filenames = sorted(x for x in filenames if x[0] != '.' and x not in known)
 
-            if not dry_run and batch:
-                await self._upsert_listing(connection, log, batch)
+            if not filenames and not subdirs:
+                continue
 
-        log.verbose("finished %s'%s'", 'dry_run ' if dry_run else '', scanpath)
+            for name, files in self.scanner(directory, subdirs, filenames):
+                files = [x if os.path.isabs(x) else os.path.join(directory, x) for x in files]
+                assert all(x.startswith(directory) for x in files), files
+                for path in files:
+                    known_filenames[os.path.dirname(path)].add(os.path.basename(path))
+                yield directory, name, files
+        log.verbose('scanned %d changed directories in %.2fs', scanned, lap(started))
 
     def _check_outdated(self, dataset):
+        """Flag dataset outdated if latest node outputs do not match inputs.
+
+        Each node run records a fingerprint of the dataset files, its
+        specs, and the generations of its inputs in ``streams.json``.
+        Outputs of node runs without fingerprint are considered outdated
+        if any of their files is older than the dataset files.
+        """
         storedir = self.config.marv.storedir
         setdir = os.path.join(storedir, str(dataset.setid))
-        latest = [
-            os.path.realpath(x) for x in [os.path.join(setdir, x)
-                                          for x in os.listdir(setdir)] if os.path.islink(x)
-        ]
-        oldest_mtime = utils.mtime(os.path.join(setdir, 'detail.json'))
-        for nodedir in latest:
-            for dirpath, _, filenames in utils.walk(nodedir):
-                for name in filenames:
-                    path = os.path.join(dirpath, name)
-                    oldest_mtime = min(oldest_mtime, utils.mtime(path))
+        files = files_fingerprint(dataset.files)
         dataset_mtime = max(x.mtime for x in dataset.files)
-        dataset.outdated = int(oldest_mtime * 1000) < dataset_mtime
+        oldest_mtime = utils.mtime(os.path.join(setdir, 'detail.json'))
+        outdated = False
+        for name in os.listdir(setdir):
+            try:
+                nodedir = os.path.join(setdir, os.readlink(os.path.join(setdir, name)))
+            except OSError:
+                continue
+
+            try:
+                with open(os.path.join(nodedir, 'streams.json'), encoding='utf-8') as f:
+                    fingerprint = json.load(f).get('fingerprint')
+            except OSError:
+                fingerprint = None
+
+            if fingerprint is None:
+                for dirpath, _, filenames in utils.walk(nodedir):
+                    for filename in filenames:
+                        path = os.path.join(dirpath, filename)
+                        oldest_mtime = min(oldest_mtime, utils.mtime(path))
+                continue
+
+            node = self.nodes.get(name)
+            if fingerprint['files'] != files \
+               or node is not None and fingerprint['specs_hash'] != node.specs_hash \
+               or any(get_generation(setdir, x) != y for x, y in fingerprint['inputs'].items()):
+                outdated = True
+                break
+
+        dataset.outdated = outdated or int(oldest_mtime * 1000) < dataset_mtime
 
     async def restore_datasets(self, data, txn=None):
-        batch = []
         comments = []
         tags = []
         async with scoped_session(self.site.db, txn) as connection:
-            for dataset in data:
-                _comments = dataset.pop('comments')
-                _tags = dataset.pop('tags')
-                dataset = await self.make_dataset(connection, _restore=True, **dataset)
-                comments.extend(Comment(dataset_id=dataset.id, **x) for x in _comments)
-                tags.append((dataset, _tags))
-                batch.append(dataset)
-                if len(batch) > 50:
-                    await Comment.bulk_create(comments, using_db=connection)
-                    await self._add_tags(connection, tags)
-                    comments.clear()
-                    batch.clear()
-                    tags.clear()
-            await Comment.bulk_create(comments, using_db=connection)
-            await self._add_tags(connection, tags)
+            for chunk in utils.chunked(data, BULK_BATCHSIZE):
+                for dataset in chunk:
+                    comments.append(dataset.pop('comments'))
+                    tags.append(dataset.pop('tags'))
+                batch = await self.make_datasets(connection, chunk, _restore=True)
+                await Comment.bulk_create(
+                    [
+                        Comment(dataset_id=dataset.id, **x)
+                        for dataset, _comments in zip(batch, comments) for x in _comments
+                    ],
+                    using_db=connection,
+                )
+                await self._add_tags(connection, list(zip(batch, tags)))
+                comments.clear()
+                tags.clear()
 
     async def _add_tags(self, connection, data):
         add = [(tag, dataset.id) for dataset, tags in data for tag in tags]
         await self.site.db.bulk_tag(add, [], '::', txn=connection)
 
-    async def _upsert_listing(self, txn, log, batch, update=False):
+    async def _upsert_listing(self, txn, log, batch, update=False, listings=None):
         descs = self.table_descriptors
-        rendered = [(dataset.id, *self.render_listing(dataset)) for dataset in batch]
+        if listings is None:
+            listings = [self.render_listing(dataset) for dataset in batch]
+        rendered = [(dataset.id, *listing) for dataset, listing in zip(batch, listings)]
         listing_values = ((id, rowdumps(row), *fields.values()) for id, row, fields, _ in rendered)
         relvalues = sorted(
             (key, value, id) for id, _, _, relfields in rendered
@@ -497,22 +722,76 @@ class Collection:
         timestamp=None,
         _restore=None,
     ):
-        # pylint: disable=too-many-arguments,too-many-locals
-        time_added = int(utils.now() * 1000) if time_added is None else time_added
-
-        if _restore:
-            files = [{'idx': i, **x} for i, x in enumerate(files)]
-        else:
-            files = [
+        # pylint: disable=too-many-arguments
+        datasets = await self.make_datasets(
+            connection,
+            [
                 {
-                    'idx': i,
-                    'missing': False,
-                    'mtime': int(stat.st_mtime * 1000),
-                    'path': path,
-                    'size': stat.st_size,
-                } for i, (path, stat) in enumerate((path, utils.stat(path)) for path in files)
-            ]
-        timestamp = timestamp or max(x['mtime'] for x in files)
+                    'files': files,
+                    'name': name,
+                    'time_added': time_added,
+                    'discarded': discarded,
+                    'setid': setid,
+                    'status': status,
+                    'timestamp': timestamp,
+                },
+            ],
+            _restore=_restore,
+        )
+        return datasets[0]
+
+    async def make_datasets(self, connection, items, _restore=None):
+        """Add datasets in bulk.
+
+        The collection is looked up once, datasets and files are
+        inserted with one statement each. Afterwards, unless restoring,
+        the initial details and listings are rendered in a pool of
+        worker threads and the listings are inserted.
+
+        Args:
+            connection: Database transaction.
+            items: Dictionaries with files and name, and optionally
+                time_added, discarded, setid, status, and timestamp.
+
+        Returns:
+            List of datasets in order of items.
+
+        """
+        # pylint: disable=too-many-locals
+        rows = []
+        datasets = []
+        for item in items:
+            time_added = item.get('time_added')
+            time_added = int(utils.now() * 1000) if time_added is None else time_added
+            if _restore:
+                files = [{'idx': i, **x} for i, x in enumerate(item['files'])]
+            else:
+                files = [
+                    {
+                        'idx': i,
+                        'missing': False,
+                        'mtime': int(stat.st_mtime * 1000),
+                        'path': path,
+                        'size': stat.st_size,
+                    } for i, (path, stat) in enumerate(
+                        (path, utils.stat(path)) for path in item['files']
+                    )
+                ]
+            timestamp = item.get('timestamp') or max(x['mtime'] for x in files)
+            setid = SetID(item.get('setid') or SetID.random())
+            name = item['name']
+            discarded = item.get('discarded', False)
+            status = item.get('status', 0)
+            rows.append((name, discarded, status, time_added, timestamp, str(setid)))
+            datasets.append(
+                make_dataset_obj(name, discarded, status, time_added, timestamp, setid, files),
+            )
+
+        if not datasets:
+            return datasets
+
+        if not _restore and self.section.content_hash:
+            await hash_files([x for dataset in datasets for x in dataset.files])
 
         collection_t, dataset_t, file_t = Tables('collection', 'dataset', 'file')  # pylint: disable=unbalanced-tuple-unpacking
         # yapf: disable
@@ -526,85 +805,74 @@ class Collection:
         )[0]
         # yapf: enable
 
-        setid = SetID(setid or SetID.random())
-
-        await connection.exq(
+        columns = ('name', 'discarded', 'status', 'time_added', 'timestamp', 'setid')
+        await connection.execute_many(
             Query.into(dataset_t).columns(
                 'collection_id',
-                'name',
-                'discarded',
-                'status',
-                'time_added',
-                'timestamp',
-                'setid',
+                *columns,
                 'acn_id',
                 'dacn_id',
-            ).insert(
-                (
-                    collection['id'],
-                    name,
-                    discarded,
-                    status,
-                    time_added,
-                    timestamp,
-                    str(setid),
-                    collection['acn_id'],
-                    2,
-                ),
-            ),
+            ).insert(*[Parameter('?')] * (len(columns) + 3)).get_sql(),
+            [[collection['id'], *row, collection['acn_id'], 2] for row in rows],
         )
-        dataset_id = (await connection.execute_query('SELECT last_insert_rowid()'))[1][0][0]
 
-        await connection.exq(
+        # yapf: disable
+        ids = {
+            x['setid']: x['id'] for x in await connection.exq(
+                Query
+                .from_(dataset_t)
+                .select(dataset_t.id, dataset_t.setid)
+                .where(dataset_t.setid.isin([x[-1] for x in rows])),
+            )
+        }
+        # yapf: enable
+        for dataset in datasets:
+            dataset.id = ids[str(dataset.setid)]
+
+        await connection.execute_many(
             Query.into(file_t).columns(
                 'dataset_id',
                 'idx',
+                'hash',
                 'missing',
                 'mtime',
                 'path',
                 'size',
-            ).insert(
-                *[
-                    (
-                        dataset_id,
-                        x['idx'],
-                        x.get('missing', False),
-                        x['mtime'],
-                        x['path'],
-                        x['size'],
-                    ) for x in files
-                ],
-            ),
+            ).insert(*[Parameter('?')] * 7).get_sql(),
+            [
+                [
+                    dataset.id,
+                    x.idx,
+                    x.hash,
+                    x.missing,
+                    x.mtime,
+                    x.path,
+                    x.size,
+                ] for dataset in datasets for x in dataset.files
+            ],
         )
 
-        dataset = type(
-            'dataset',
-            (),
-            {
-                'id': dataset_id,
-                'discarded': discarded,
-                'name': name,
-                'status': status,
-                'time_added': time_added,
-                'timestamp': timestamp,
-                'setid': setid,
-                'files': [type(
-                    'file',
-                    (),
-                    {
-                        'missing': False,
-                        **x,
-                    },
-                )() for x in files],
-                '__repr__': lambda _: f'<Dataset {setid} {name}>',
-            },
-        )()
         storedir = self.config.marv.storedir
         store = Store(storedir, self.nodes)
-        store.add_dataset(dataset, exists_okay=_restore)
+        for dataset in datasets:
+            store.add_dataset(dataset, exists_okay=_restore)
         if not _restore:
-            self.render_detail(dataset, store)
-        return dataset
+            loop = asyncio.get_running_loop()
+            with ThreadPoolExecutor(RENDER_WORKERS) as executor:
+                listings = await asyncio.gather(
+                    *[
+                        loop.run_in_executor(executor, self._render_new, dataset)
+                        for dataset in datasets
+                    ],
+                )
+            log = getLogger('.'.join([__name__, self.name]))
+            await self._upsert_listing(connection, log, datasets, listings=listings)
+        return datasets
+
+    def _render_new(self, dataset):
+        """Render initial detail and listing of new dataset."""
+        self.render_detail(dataset)
+        return self.render_listing(dataset)
 
     def render_detail(self, dataset, store=None):
         storedir = self.config.marv.storedir
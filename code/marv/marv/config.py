@@ -37,6 +37,7 @@ def make_funcs(dataset, setdir, store):
         'comments': lambda: None,
         'detail_route': detail_route,
         'filter': lambda x, y: list(filter(x, y)),
+        'flatten': lambda x: [y for lst in x for y in lst] if x is not None else None,
         'format': lambda fmt, *args: fmt.format(*args),
         'get': partial(getnode, dataset, setdir, store),
         'getitem': lambda x, y: x[y] if x is not None else None,
@@ -359,6 +360,7 @@ class CollectionConfig(Model):
     scanner: str
     scanroots: Tuple[Path, ...]
     compare: Optional[str] = None
+    content_hash: bool = False
     detail_summary_widgets: Tuple[str, ...] = """
     summary_keyval
     meta_table
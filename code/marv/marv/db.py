@@ -486,6 +486,11 @@ async def dump_files(tables, dump, txn):
         None,
         txn,
     )
+    # content hashes are optional, keep dumps without them restorable by older versions
+    for files in dump['files'].values():
+        for item in files:
+            if item['hash'] is None:
+                del item['hash']
 
 
 async def dump_tags(tables, dump, txn):
@@ -596,7 +601,7 @@ ACLS = {
 class Database:
     # pylint: disable=too-many-public-methods
 
-    VERSION = '21.05'
+    VERSION = '22.01'
     DUMP_VERSION = '21.05'
 
     EXPORT_HANDLERS = (
@@ -1060,6 +1065,19 @@ class Database:
             raise DBPermissionError
         return res[0]['path']
 
+    @run_in_transaction
+    async def get_files(self, txn=None):
+        """Get path, size, and mtime of all files, including those of discarded datasets."""
+        file = Table('file')
+        query = Query.from_(file).select('path', 'size', 'mtime')
+        return [(x['path'], x['size'], x['mtime']) for x in await txn.exq(query)]
+
+    @run_in_transaction
+    async def get_setids(self, txn=None):
+        """Get setids of all datasets, including discarded ones."""
+        dataset = Table('dataset')
+        return [SetID(x['setid']) for x in await txn.exq(Query.from_(dataset).select('setid'))]
+
     @run_in_transaction
     async def get_datasets_for_collections(self, collections, txn=None):
         dataset = Table('dataset')
@@ -0,0 +1,108 @@
+# Copyright 2016 - 2021  Ternaris.
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""Minimal inotify binding via ctypes."""
+
+import ctypes
+import ctypes.util
+import os
+import struct
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+EVENT = struct.Struct('iIII')
+
+_LIBC = None
+
+
+def libc():
+    global _LIBC  # pylint: disable=global-statement
+    if _LIBC is None:
+        _LIBC = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        _LIBC.inotify_init1.argtypes = (ctypes.c_int,)
+        _LIBC.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        _LIBC.inotify_rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+    return _LIBC
+
+
+def check(result):
+    if result < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    return result
+
+
+class Inotify:
+    """Non-blocking inotify instance.
+
+    Watches are not recursive, each directory needs to be added
+    individually. The file descriptor is meant to be registered with an
+    event loop, e.g. via :meth:`asyncio.loop.add_reader`.
+
+    """
+
+    def __init__(self):
+        self.fd = check(libc().inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+        self.paths = {}
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        os.close(self.fd)
+        self.paths.clear()
+
+    def add_watch(self, path, mask):
+        """Watch directory for events given by mask.
+
+        Returns:
+            Watch descriptor.
+
+        Raises:
+            OSError: Path is not a directory, watch limit reached, etc.
+
+        """
+        wd = check(libc().inotify_add_watch(self.fd, os.fsencode(path), mask | IN_ONLYDIR))
+        self.paths[wd] = path
+        return wd
+
+    def read(self):
+        """Read pending events.
+
+        Returns:
+            List of tuples with watched directory, mask, cookie, and
+            name of entry, which is empty for events of the directory
+            itself. The directory is None for queue overflows.
+
+        """
+        events = []
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(buf):
+                wd, mask, cookie, size = EVENT.unpack_from(buf, offset)
+                offset += EVENT.size
+                name = os.fsdecode(buf[offset:offset + size].rstrip(b'\0'))
+                offset += size
+                path = self.paths.get(wd)
+                if mask & IN_IGNORED:
+                    self.paths.pop(wd, None)
+                events.append((path, mask, cookie, name))
@@ -114,6 +114,7 @@ class File(Model):
     idx = IntField()  # files are counted per dataset
 
     missing = BooleanField(default=False)
+    hash = TextField(null=True)  # blake2b of content, see collection content_hash
     mtime = IntField()  # ms since epoch
     path = TextField()
     size = IntField()
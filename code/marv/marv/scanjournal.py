@@ -0,0 +1,176 @@
+# Copyright 2016 - 2021  Ternaris.
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""Journal of directories visited by previous scans."""
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing, suppress
+
+from . import utils
+
+# Directories modified this recently are not journaled, as further
+# changes within the same mtime granularity would go unnoticed.
+RACY_SECONDS = 2
+
+
+class ScanJournal:
+    """Persist state of scanned directories per collection.
+
+    For each directory the mtime and inode of the last scan are stored
+    together with the subdirectories traversed and the filenames known
+    to the database at the time. Adding, removing, or renaming entries
+    of a directory changes its mtime, a directory with unchanged mtime,
+    inode, and known files therefore does not need to be listed and
+    passed to the scanner again.
+
+    Args:
+        path: Path to journal database.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS directory ('
+            'collection TEXT, path TEXT, mtime INTEGER, inode INTEGER, subdirs TEXT, known TEXT,'
+            'PRIMARY KEY (collection, path))',
+        )
+        return conn
+
+    def load(self, collection, scanpath):
+        """Load journal entries of directories within scanpath.
+
+        Args:
+            collection: Name of collection.
+            scanpath: Root directory of scan.
+
+        Returns:
+            Dictionary mapping directories to mtime, inode, subdirs,
+            and known filenames.
+
+        """
+        if not os.path.exists(self.path):
+            return {}
+
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                'SELECT path, mtime, inode, subdirs, known FROM directory '
+                'WHERE collection = ? AND (path = ? OR substr(path, 1, ?) = ?)',
+                (collection, scanpath, len(scanpath) + 1, scanpath + os.sep),
+            )
+            return {
+                path: (mtime, inode, json.loads(subdirs), json.loads(known))
+                for path, mtime, inode, subdirs, known in rows
+            }
+
+    def get(self, collection, path):
+        """Get journal entry of one directory.
+
+        Returns:
+            Tuple of mtime, inode, subdirs, and known filenames, or None.
+
+        """
+        if not os.path.exists(self.path):
+            return None
+
+        with closing(self.connect()) as conn:
+            row = conn.execute(
+                'SELECT mtime, inode, subdirs, known FROM directory '
+                'WHERE collection = ? AND path = ?',
+                (collection, path),
+            ).fetchone()
+        if row is None:
+            return None
+        mtime, inode, subdirs, known = row
+        return mtime, inode, json.loads(subdirs), json.loads(known)
+
+    def store(self, collection, scanpath, entries):
+        """Replace journal entries of directories within scanpath.
+
+        Args:
+            collection: Name of collection.
+            scanpath: Root directory of scan.
+            entries: Dictionary as returned by :meth:`load`.
+
+        """
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                'DELETE FROM directory '
+                'WHERE collection = ? AND (path = ? OR substr(path, 1, ?) = ?)',
+                (collection, scanpath, len(scanpath) + 1, scanpath + os.sep),
+            )
+            conn.executemany(
+                'INSERT INTO directory VALUES (?, ?, ?, ?, ?, ?)',
+                (
+                    (collection, path, mtime, inode, json.dumps(subdirs), json.dumps(known))
+                    for path, (mtime, inode, subdirs, known) in entries.items()
+                ),
+            )
+
+    def clear(self):
+        """Remove journal, e.g. when the database is initialized."""
+        with suppress(FileNotFoundError):
+            os.unlink(self.path)
+
+
+def walk(scanpath, journal, known_filenames, full=False):
+    """Walk directories changed since they were journaled.
+
+    Behaves like :func:`os.walk` in top-down mode, except that
+    directories whose mtime, inode, and known filenames match their
+    journal entry are not listed and not yielded. Their journaled
+    subdirectories are traversed instead. Subdirectories may be
+    modified in-place to control traversal; the remaining
+    subdirectories and known filenames are recorded in the journal
+    when traversal continues.
+
+    Args:
+        scanpath: Root directory to walk.
+        journal: Dictionary of journal entries, updated in-place.
+        known_filenames: Mapping of directories to known filenames.
+        full: Yield all directories regardless of journal.
+
+    Yields:
+        Tuples of directory, subdirs, and filenames.
+
+    """
+    previous = journal.copy()
+    journal.clear()
+    racy = time.time() - RACY_SECONDS
+    stack = [scanpath]
+    while stack:
+        directory = stack.pop()
+        if directory != scanpath and os.path.islink(directory):
+            continue
+
+        try:
+            dirstat = os.stat(directory)
+        except OSError:
+            dirstat = None
+
+        entry = previous.get(directory)
+        if not full and dirstat and entry \
+           and entry[:2] == (dirstat.st_mtime_ns, dirstat.st_ino) \
+           and entry[3] == sorted(known_filenames.get(directory, ())):
+            journal[directory] = entry
+            stack.extend(os.path.join(directory, x) for x in reversed(entry[2]))
+            continue
+
+        # list only this directory, subdirectories are visited via stack
+        listing = next(iter(utils.walk(directory)), None)
+        if listing is None:
+            continue
+
+        _, subdirs, filenames = listing
+        yield directory, subdirs, filenames
+
+        if dirstat and dirstat.st_mtime < racy:
+            known = sorted(known_filenames.get(directory, ()))
+            journal[directory] = (dirstat.st_mtime_ns, dirstat.st_ino, subdirs, known)
+        stack.extend(os.path.join(directory, x) for x in reversed(subdirs))
@@ -18,12 +18,14 @@ from marv.utils import within_pyinstaller_bundle
 from marv_api.utils import find_obj
 from marv_node.node import Node
 from marv_node.run import run_nodes
-from marv_store import Store
+from marv_store import Store, files_fingerprint
+from marv_store.gc import collect_garbage
 
-from .collection import Collections
+from .collection import Collections, scan_roots
 from .config import Config, ConfigError
 from .db import Database, DBNotInitializedError, Tortoise, create_or_ignore, scoped_session
 from .model import Dataset, Group, User
+from .scanjournal import ScanJournal
 
 log = getLogger(__name__)
 
@@ -64,6 +66,8 @@ class Site:
             [y for x in self.collections.values() for y in x.model],
             self.config,
         )
+        dbpath = Path(self.config.marv.dburi.split('sqlite://', 1)[1])
+        self.scanjournal = ScanJournal(dbpath.parent / 'scanjournal.sqlite')
 
     @classmethod
     async def create(cls, siteconf, init=None):  # noqa: C901
@@ -194,6 +198,7 @@ class Site:
     async def init_database(self, store_db_version=False):
         async with scoped_session(self.db) as txn:
             await self.drop_listings(txn)
+        self.scanjournal.clear()
 
         await Tortoise.generate_schemas()
 
@@ -248,7 +253,22 @@ class Site:
     async def cleanup_discarded(self):
         descs = {key: x.table_descriptors for key, x in self.collections.items()}
         await self.db.cleanup_discarded(descs)
-        # TODO: Cleanup corresponding store paths
+
+    async def collect_garbage(self, dry_run=False):
+        """Remove unreachable set and generation directories from store.
+
+        Store directories of datasets removed by :meth:`cleanup_discarded`
+        and generations superseded by later node runs are removed, as
+        are per-file cache entries of files no longer in the database.
+
+        Returns:
+            Tuple of removed directories and cache entries, and number of
+            reclaimed bytes.
+
+        """
+        setids = await self.db.get_setids()
+        files = await self.db.get_files()
+        return collect_garbage(self.config.marv.storedir, setids, files, dry_run=dry_run)
 
     async def cleanup_relations(self):
         descs = {key: x.table_descriptors for key, x in self.collections.items()}
@@ -300,8 +320,17 @@ class Site:
 
         storedir = self.config.marv.storedir
         store = Store(storedir, persistent)
+        store.files_fingerprints[str(dataset.setid)] = files_fingerprint(dataset.files)
 
         changed = False
+        if not force and collection.section.content_hash:
+            async with scoped_session(self.db) as txn:
+                source = await collection.find_identical(txn, dataset)
+            if source is not None and (linked := store.link_generations(source.setid, setid)):
+                log.verbose('%s linked %s from identical %s', setid, ', '.join(linked),
+                            source.setid)
+                changed = True
+
         try:
             if nodes:
                 changed = await run_nodes(
@@ -313,7 +342,7 @@ class Site:
                     deps=deps,
                     cachesize=cachesize,
                     site=self,
-                )
+                ) or changed
         finally:
             if not keep:
                 for stream in store.pending:
@@ -338,7 +367,6 @@ class Site:
 
         return changed
 
-    async def scan(self, dry_run=None):
-        for collection in self.collections.values():
-            for scanroot in collection.scanroots:
-                await collection.scan(scanroot, dry_run)
+    async def scan(self, dry_run=None, full=False):
+        roots = [(x, y) for x in self.collections.values() for y in x.scanroots]
+        await scan_roots(self, roots, dry_run=dry_run, full=full)
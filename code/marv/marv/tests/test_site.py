@@ -1,7 +1,9 @@
 # Copyright 2016 - 2019  Ternaris.
 # SPDX-License-Identifier: AGPL-3.0-only
 
+import fcntl
 import inspect
+import json
 import os
 import random
 import shutil
@@ -9,13 +11,21 @@ import tempfile
 from itertools import count
 from logging import getLogger
 from pathlib import Path
+from types import SimpleNamespace
 
 import pytest
 
 from marv.db import scoped_session
+from marv.inotify import Inotify
+from marv.model import STATUS_OUTDATED, make_status_property
 from marv.site import Site
-from marv_api.utils import echo
+from marv.watch import Watcher
+from marv_api.setid import SetID
+from marv_api.utils import echo, file_cache_key
 from marv_node.testing import make_dataset, marv, run_nodes
+import marv_store
+from marv_store import Store
+from marv_store.gc import collect_garbage
 
 KEEP = os.environ.get('KEEP')
 log = getLogger(__name__)
@@ -170,6 +180,313 @@ async def test_outdated_node(site):  # pylint: disable=redefined-outer-name
     assert foo1id
 
 
+async def test_scan_journal(site, monkeypatch):  # pylint: disable=redefined-outer-name
+    calls = []
+
+    def scan_recorder(directory, subdirs, filenames):  # pylint: disable=unused-argument
+        calls.append(os.path.relpath(directory, site.scanroot_))
+        return []
+
+    monkeypatch.setattr(f'{__name__}.scan_foo', scan_recorder)
+
+    def age(mtime, *paths):
+        for path in paths:
+            os.utime(os.path.join(site.scanroot_, path), (mtime, mtime))
+
+    os.makedirs(os.path.join(site.scanroot_, 'foo', 'a', 'b'))
+    Path(site.scanroot_, 'foo', 'a', 'x.txt').write_text('')
+    Path(site.scanroot_, 'foo', '.hidden').mkdir()
+    age(1000, 'foo', 'foo/a', 'foo/a/b', 'foo/.hidden')
+
+    await site.scan()
+    assert calls == ['foo', 'foo/a']
+
+    calls.clear()
+    await site.scan()
+    assert calls == []
+
+    Path(site.scanroot_, 'foo', 'a', 'b', 'y.txt').write_text('')
+    age(2000, 'foo/a/b')
+    await site.scan()
+    assert calls == ['foo/a/b']
+
+    calls.clear()
+    Path(site.scanroot_, 'foo', 'a', 'b', 'z.txt').write_text('')
+    await site.scan()
+    await site.scan()
+    assert calls == ['foo/a/b', 'foo/a/b']
+
+    calls.clear()
+    age(3000, 'foo/a/b')
+    await site.scan(full=True)
+    await site.scan()
+    assert calls == ['foo', 'foo/a', 'foo/a/b']
+
+
+async def test_watch(site, monkeypatch):  # pylint: disable=redefined-outer-name
+    calls = []
+
+    def scan_recorder(directory, subdirs, filenames):  # pylint: disable=unused-argument
+        calls.append(os.path.relpath(directory, site.scanroot_))
+        return []
+
+    monkeypatch.setattr(f'{__name__}.scan_foo', scan_recorder)
+
+    foo = Path(site.scanroot_, 'foo')
+    (foo / 'a' / 'b').mkdir(parents=True)
+    (foo / 'a' / 'x.txt').write_text('')
+    for path in (foo, foo / 'a', foo / 'a' / 'b'):
+        os.utime(path, (1000, 1000))
+
+    watcher = Watcher(site, debounce=0)
+    watcher.inotify = Inotify()
+    try:
+        watcher.watch_tree(str(foo))
+        await site.scan()
+        assert calls == ['foo', 'foo/a']
+
+        calls.clear()
+        (foo / 'a' / 'b' / 'c').mkdir()
+        (foo / '.hidden').mkdir()
+        watcher.handle_events()
+        (foo / 'a' / 'b' / 'c' / 'y.txt').write_text('')
+        (foo / '.hidden' / 'z.txt').write_text('')
+        watcher.handle_events()
+        assert sorted(watcher.pending) == [
+            str(foo),
+            str(foo / 'a' / 'b'),
+            str(foo / 'a' / 'b' / 'c'),
+        ]
+
+        await watcher.process(sorted(watcher.pending))
+        assert calls == ['foo', 'foo/a/b', 'foo/a/b/c']
+    finally:
+        watcher.inotify.close()
+
+
+async def test_check_outdated(site):  # pylint: disable=redefined-outer-name
+    collection = site.collections['foo']
+    setid = SetID.random()
+    setdir = site.config.marv.storedir / str(setid)
+    setdir.mkdir()
+    (setdir / 'detail.json').write_text('{}')
+
+    class FakeDataset:  # pylint: disable=too-few-public-methods
+        status = 0
+        outdated = make_status_property(STATUS_OUTDATED)
+        files = [SimpleNamespace(idx=0, size=10, mtime=1000)]
+
+    def add_generation(name, fingerprint):
+        gendir = setdir / f'{name}-1'
+        gendir.mkdir()
+        (gendir / 'default-stream').write_text('')
+        streams = {'name': 'default', 'header': {}, 'version': None, 'streams': {}}
+        if fingerprint:
+            streams['fingerprint'] = fingerprint
+        (gendir / 'streams.json').write_text(json.dumps(streams))
+        (setdir / name).symlink_to(gendir.name)
+        return gendir
+
+    dataset = FakeDataset()
+    dataset.setid = setid
+    add_generation('upstream', {'files': [[10, 1000]], 'specs_hash': 'x', 'inputs': {}})
+    add_generation('downstream', {
+        'files': [[10, 1000]],
+        'specs_hash': 'y',
+        'inputs': {'upstream': 'upstream-1'},
+    })
+    collection._check_outdated(dataset)  # pylint: disable=protected-access
+    assert not dataset.outdated
+
+    dataset.files = [SimpleNamespace(idx=0, size=10, mtime=2000)]
+    collection._check_outdated(dataset)  # pylint: disable=protected-access
+    assert dataset.outdated
+
+    dataset.files = [SimpleNamespace(idx=0, size=10, mtime=1000)]
+    (setdir / 'upstream').unlink()
+    (setdir / 'upstream').symlink_to('upstream-2')
+    collection._check_outdated(dataset)  # pylint: disable=protected-access
+    assert dataset.outdated
+
+    (setdir / 'upstream').unlink()
+    (setdir / 'upstream').symlink_to('upstream-1')
+    gendir = add_generation('legacy', None)
+    collection._check_outdated(dataset)  # pylint: disable=protected-access
+    assert not dataset.outdated
+
+    os.utime(gendir / 'default-stream', (0, 0))
+    collection._check_outdated(dataset)  # pylint: disable=protected-access
+    assert dataset.outdated
+
+
+def test_link_generations(tmp_path):
+    store = Store(str(tmp_path), {'upstream': None, 'missing': None})
+    srcid = SetID.random()
+    setid = SetID.random()
+    srcdir = tmp_path / str(srcid)
+    setdir = tmp_path / str(setid)
+    setdir.mkdir()
+    gendir = srcdir / 'upstream-2'
+    (gendir / 'sub').mkdir(parents=True)
+    (gendir / 'default-stream').write_text('stream')
+    (gendir / 'sub' / 'blob').write_text('blob')
+    streams = {'name': 'default', 'fingerprint': {'files': [[10, 1000]], 'inputs': {}}}
+    (gendir / 'streams.json').write_text(json.dumps(streams))
+    (srcdir / 'upstream').symlink_to(gendir.name)
+
+    store.files_fingerprints[str(setid)] = [[10, 2000]]
+    assert store.link_generations(srcid, setid) == ['upstream']
+    assert os.readlink(setdir / 'upstream') == 'upstream-2'
+    linked = setdir / 'upstream-2'
+    assert (linked / 'sub' / 'blob').stat().st_ino == (gendir / 'sub' / 'blob').stat().st_ino
+    assert json.loads((linked / 'streams.json').read_text())['fingerprint']['files'] == \
+        [[10, 2000]]
+    assert json.loads((gendir / 'streams.json').read_text()) == streams
+    assert not (setdir / '.upstream-2').exists()
+
+    assert store.link_generations(srcid, setid) == []
+
+
+def test_collect_garbage(tmp_path):
+    known = SetID.random()
+    unknown = SetID.random()
+    setdir = tmp_path / str(known)
+    for name in ('node-1', 'node-2', '.node-3', '.node-4', 'other-1'):
+        (setdir / name).mkdir(parents=True)
+        (setdir / name / 'default-stream').write_bytes(b'x' * 10)
+    os.link(setdir / 'node-1' / 'default-stream', setdir / 'other-1' / 'linked')
+    (setdir / 'node').symlink_to('node-2')
+    (setdir / 'other').symlink_to('other-1')
+    (setdir / 'detail.json').write_text('{}')
+    (tmp_path / str(unknown) / 'node-1').mkdir(parents=True)
+    (tmp_path / str(unknown) / 'node-1' / 'default-stream').write_bytes(b'x' * 100)
+    os.utime(tmp_path / str(unknown), (0, 0))
+    (tmp_path / 'unrelated').mkdir()
+    (setdir / '.node-5').mkdir()
+    for name in ('.node-3', '.node-4'):
+        os.utime(setdir / name, (0, 0))
+
+    # node run in progress
+    fd = os.open(setdir / '.node-4', os.O_RDONLY)
+    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    try:
+        removed, reclaimed = collect_garbage(tmp_path, [known], dry_run=True)
+        assert sorted(removed) == sorted([
+            str(setdir / '.node-3'),
+            str(setdir / 'node-1'),
+            str(tmp_path / str(unknown)),
+        ])
+        # node-1 is still linked from other-1
+        assert reclaimed == 110
+        assert (setdir / 'node-1').exists()
+
+        removed, reclaimed = collect_garbage(tmp_path, [known])
+        assert reclaimed == 110
+        assert sorted(x.name for x in setdir.iterdir()) == \
+            ['.node-4', '.node-5', 'detail.json', 'node', 'node-2', 'other', 'other-1']
+        assert {x.name for x in tmp_path.iterdir()} == {str(known), 'unrelated'}
+    finally:
+        os.close(fd)
+
+    removed, reclaimed = collect_garbage(tmp_path, [known])
+    assert removed == [str(setdir / '.node-4')]
+    assert reclaimed == 10
+
+
+def test_collect_garbage_lock_tmpdir(tmp_path, monkeypatch):
+    # pylint: disable=protected-access
+    store = Store(str(tmp_path), {})
+    setid = SetID.random()
+    tmpdir = tmp_path / str(setid) / '.node-1'
+    tmpdir.mkdir(parents=True)
+    (tmpdir / 'leftover').write_text('aborted')
+    os.utime(tmpdir, (0, 0))
+
+    collected = []
+    mkdir = os.mkdir
+
+    def mkdir_and_collect(path, *args, **kw):
+        try:
+            mkdir(path, *args, **kw)
+        finally:
+            if len(collected) < 2:
+                collected.append(collect_garbage(tmp_path, [setid]))
+
+    monkeypatch.setattr(os, 'mkdir', mkdir_and_collect)
+
+    # leftover of aborted run removed after mkdir, fresh directory kept
+    fd = store._lock_tmpdir(str(tmpdir))
+    try:
+        assert collected == [([str(tmpdir)], 7), ([], 0)]
+        assert not list(tmpdir.iterdir())
+        assert collect_garbage(tmp_path, [setid]) == ([], 0)
+    finally:
+        os.close(fd)
+    assert collect_garbage(tmp_path, [setid]) == ([], 0)
+
+
+def test_collect_garbage_cache(tmp_path):
+    cachedir = tmp_path / '.cache' / 'node'
+    cachedir.mkdir(parents=True)
+    known = file_cache_key('/known.bag', 1, 2)
+    changed = file_cache_key('/known.bag', 1, 3)
+    (cachedir / f'{known}.json').write_text('known')
+    (cachedir / f'{changed}.json').write_text('changed')
+    (cachedir / f'.{changed}.123.456').write_text('tmp')
+    (cachedir / 'recent').write_text('recent')
+    for path in cachedir.iterdir():
+        if path.name != 'recent':
+            os.utime(path, (0, 0))
+
+    assert collect_garbage(tmp_path, [], dry_run=True) == ([], 0)
+    removed, reclaimed = collect_garbage(tmp_path, [], [('/known.bag', 1, 2)], dry_run=True)
+    assert sorted(removed) == [str(cachedir / f'.{changed}.123.456'),
+                               str(cachedir / f'{changed}.json')]
+    assert reclaimed == 10
+
+    assert collect_garbage(tmp_path, [], [('/known.bag', 1, 2)]) == (removed, reclaimed)
+    assert sorted(x.name for x in cachedir.iterdir()) == [f'{known}.json', 'recent']
+
+
+def test_collect_garbage_link_in_progress(tmp_path, monkeypatch):
+    store = Store(str(tmp_path), {'upstream': None})
+    srcid = SetID.random()
+    setid = SetID.random()
+    gendir = tmp_path / str(srcid) / 'upstream-1'
+    gendir.mkdir(parents=True)
+    (gendir / 'default-stream').write_text('stream')
+    (gendir / 'streams.json').write_text('{}')
+    (tmp_path / str(srcid) / 'upstream').symlink_to(gendir.name)
+    (tmp_path / str(setid)).mkdir()
+    tmpdir = tmp_path / str(setid) / '.upstream-1'
+
+    collected = []
+    link_or_copy = marv_store.link_or_copy
+
+    def link_and_collect(src, dst):
+        if not collected:
+            collected.append(collect_garbage(tmp_path, [srcid, setid]))
+            assert tmpdir.is_dir()
+        link_or_copy(src, dst)
+
+    monkeypatch.setattr(marv_store, 'link_or_copy', link_and_collect)
+    assert store.link_generations(srcid, setid) == ['upstream']
+    assert collected == [([], 0)]
+    assert (tmp_path / str(setid) / 'upstream-1' / 'default-stream').read_text() == 'stream'
+
+    # locked by node run in progress
+    store = Store(str(tmp_path), {'other': None})
+    (tmp_path / str(srcid) / 'other').symlink_to(gendir.name)
+    os.rename(tmp_path / str(setid) / 'upstream-1', tmpdir)
+    (tmp_path / str(setid) / 'upstream').unlink()
+    fd = os.open(tmpdir, os.O_RDONLY)
+    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    try:
+        assert store.link_generations(srcid, setid) == []
+    finally:
+        os.close(fd)
+
+
 @marv.node()
 def useresource():
     path = yield marv.get_resource_path('answer')
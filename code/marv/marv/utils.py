@@ -1,10 +1,12 @@
 # Copyright 2016 - 2018  Ternaris.
 # SPDX-License-Identifier: AGPL-3.0-only
 
+import hashlib
 import os
 import re
 import sys
 import time
+from contextlib import suppress
 from datetime import datetime, timedelta
 from datetime import tzinfo as tzinfo_base
 from itertools import islice
@@ -31,6 +33,48 @@ def mtime(path):
     return os.stat(path).st_mtime
 
 
+def mtimes(directory, names):
+    """Get mtimes of files within directory listing it only once.
+
+    Args:
+        directory: Path of directory.
+        names: Set of filenames within directory.
+
+    Returns:
+        Dictionary mapping filenames to st_mtime, missing files are
+        omitted.
+
+    """
+    result = {}
+    with suppress(OSError), os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name in names:
+                with suppress(OSError):
+                    result[entry.name] = entry.stat().st_mtime
+    return result
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """Hash content of file.
+
+    Args:
+        path: Path of file.
+        chunk_size: Number of bytes read at once.
+
+    Returns:
+        Hexdigest of BLAKE2b, or None if file cannot be read.
+
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    try:
+        with open(path, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
 def stat(path):
     """Wrap os.stat() for ease of mocking."""  # noqa: D402
     # TODO: https://github.com/PyCQA/pydocstyle/issues/284
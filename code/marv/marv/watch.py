@@ -0,0 +1,178 @@
+# Copyright 2016 - 2021  Ternaris.
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""Watch scanroots for changes and scan affected directories."""
+
+import asyncio
+import errno
+import os
+import time
+from logging import getLogger
+
+from . import inotify
+from .collection import scan_roots
+from .db import scoped_session
+
+# Seconds without events before a directory is scanned
+DEBOUNCE = 5
+
+WATCH_MASK = inotify.IN_ATTRIB | inotify.IN_CLOSE_WRITE | inotify.IN_CREATE | inotify.IN_DELETE \
+    | inotify.IN_DELETE_SELF | inotify.IN_MOVED_FROM | inotify.IN_MOVED_TO
+
+log = getLogger(__name__)
+
+
+class Watcher:
+    """Scan directories of scanroots affected by inotify events.
+
+    Events are collected per directory. Once a directory had no events
+    for the debounce period, its known files are checked and, if it is
+    traversed by a regular scan, it is scanned for new datasets. Which
+    directories are traversed is looked up in the scan journal, which
+    reflects hidden directories, ``.marvignore`` files, and
+    subdirectories pruned by scanners.
+
+    Args:
+        site: Site to watch scanroots of.
+        debounce: Seconds without events before a directory is scanned.
+
+    """
+
+    def __init__(self, site, debounce=DEBOUNCE):
+        self.site = site
+        self.debounce = debounce
+        self.roots = [
+            (collection, str(scanroot))
+            for collection in site.collections.values()
+            for scanroot in collection.scanroots
+        ]
+        self.inotify = None
+        self.pending = {}
+        self.overflow = False
+        self.limit_reached = False
+
+    def find_root(self, directory):
+        for collection, scanroot in self.roots:
+            if directory == scanroot or directory.startswith(scanroot + os.sep):
+                return collection, scanroot
+        return None
+
+    def watch_tree(self, directory):
+        """Watch directory and its non-hidden subdirectories."""
+        for dirpath, subdirs, _ in os.walk(directory):
+            try:
+                self.inotify.add_watch(dirpath, WATCH_MASK)
+            except OSError as e:
+                if e.errno == errno.ENOSPC and not self.limit_reached:
+                    self.limit_reached = True
+                    log.warning(
+                        'inotify watch limit reached, raise fs.inotify.max_user_watches; '
+                        'changes will be picked up by periodic scans',
+                    )
+            if os.path.exists(os.path.join(dirpath, '.marvignore')):
+                subdirs.clear()
+            subdirs[:] = [x for x in subdirs if x[0] != '.']
+
+    def handle_events(self):
+        now = time.monotonic()
+        for directory, mask, _, name in self.inotify.read():
+            if mask & inotify.IN_Q_OVERFLOW:
+                self.overflow = True
+                continue
+            if directory is None:
+                continue
+            if mask & inotify.IN_ISDIR and mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO) \
+               and name[0] != '.':
+                self.watch_tree(os.path.join(directory, name))
+            self.pending[directory] = now
+
+    def resolve(self, collection, scanroot, directory):
+        """Find directory to scan for changes within directory.
+
+        Returns:
+            Directory or nearest ancestor without journal entry, or
+            None if a regular scan does not traverse the directory.
+
+        """
+        current = scanroot
+        for part in os.path.relpath(directory, scanroot).split(os.sep):
+            if part == os.curdir:
+                break
+            entry = self.site.scanjournal.get(collection.name, current)
+            if entry is None:
+                return current
+            if part not in entry[2]:
+                return None
+            current = os.path.join(current, part)
+        return current
+
+    async def process(self, directories):
+        """Check known files and scan affected directories."""
+        targets = {}
+        checks = []
+        for directory in directories:
+            root = self.find_root(directory)
+            if root is None:
+                continue
+            target = self.resolve(*root, directory)
+            if target is None:
+                checks.append((root[0], directory))
+            else:
+                targets[target] = root[0]
+
+        # scanning a directory covers its subdirectories
+        targets = [
+            (collection, target) for target, collection in sorted(targets.items())
+            if not any(target.startswith(x + os.sep) for x in targets)
+        ]
+
+        if checks:
+            async with scoped_session(self.site.db) as connection:
+                for collection, directory in checks:
+                    clog = getLogger(f'marv.collection.{collection.name}')
+                    await collection.check_known_files(connection, clog, directory + os.sep)
+
+        if targets:
+            await scan_roots(self.site, targets)
+
+    async def run(self, interval):
+        """Watch scanroots until cancelled.
+
+        Args:
+            interval: Seconds between scans of all scanroots.
+
+        """
+        loop = asyncio.get_running_loop()
+        self.inotify = inotify.Inotify()
+        loop.add_reader(self.inotify.fileno(), self.handle_events)
+        try:
+            for _, scanroot in self.roots:
+                self.watch_tree(scanroot)
+            log.info('watching %d directories', len(self.inotify.paths))
+
+            last_scan = None
+            while True:
+                now = time.monotonic()
+                if self.overflow or last_scan is None or now - last_scan >= interval:
+                    if self.overflow:
+                        log.warning('inotify event queue overflowed, scanning all scanroots')
+                    self.overflow = False
+                    self.pending.clear()
+                    last_scan = now
+                    await self.site.scan()
+                    continue
+
+                ready = sorted(x for x, t in self.pending.items() if now - t >= self.debounce)
+                for directory in ready:
+                    del self.pending[directory]
+                if ready:
+                    await self.process(ready)
+                await asyncio.sleep(1)
+        finally:
+            loop.remove_reader(self.inotify.fileno())
+            self.inotify.close()
+
+
+async def watch(site, interval, debounce=DEBOUNCE):
+    """Scan scanroots and watch them for changes, see :class:`Watcher`."""
+    await Watcher(site, debounce=debounce).run(interval)
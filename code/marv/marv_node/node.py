@@ -15,7 +15,7 @@ from typing import TYPE_CHECKING
 
 from marv_api import dag
 from marv_api.ioctrl import NODE_SCHEMA, Abort, ResourceNotFoundError
-from marv_api.iomsgs import GetLogger, GetResourcePath
+from marv_api.iomsgs import GetCachePath, GetLogger, GetResourcePath
 from marv_api.utils import find_obj
 
 from . import io
@@ -26,6 +26,9 @@ if TYPE_CHECKING:
 
 NODE_CACHE: Dict[Callable, Any] = {}
 
+# Per-file cache directories of nodes, relative to store
+CACHEDIR = '.cache'
+
 
 class InputSpec(Keyed, namedtuple('InputSpec', ('name', 'value', 'foreach'))):
 
@@ -271,6 +274,16 @@ class Node(Keyed):  # pylint: disable=too-many-instance-attributes
                 response = log
                 continue
 
+            if isinstance(request, GetCachePath):
+                if site is None:
+                    response = None
+                elif not request.name.isidentifier():
+                    response = ValueError(f'Invalid cache name {request.name!r}')
+                else:
+                    response = Path(site.config.marv.storedir) / CACHEDIR / request.name
+                    response.mkdir(parents=True, exist_ok=True)
+                continue
+
             if isinstance(request, GetResourcePath):
                 rel = Path(request.name)
                 if rel.anchor:
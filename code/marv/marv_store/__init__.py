@@ -24,11 +24,25 @@ class DirectoryAlreadyExistsError(Exception):
     """
 
 
+def files_fingerprint(files):
+    """Create fingerprint of dataset files from their size and mtime."""
+    return [[x.size, x.mtime] for x in sorted(files, key=lambda x: x.idx)]
+
+
+def link_or_copy(src, dst):
+    """Hardlink file, copy if linking is not possible."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
 class Store(Mapping, LoggerMixin):
 
     def __init__(self, path, nodes):
         self.path = path
         self.pending = {}
+        self.files_fingerprints = {}
         self.nodes = nodes
         self.readstreams = []
         self.name_by_node = {v: k for k, v in nodes.items()}
@@ -84,26 +98,13 @@ class Store(Mapping, LoggerMixin):
         nextdir = os.path.join(setdir, next_name)
         newlink = os.path.join(setdir, f'.{name}')
         tmpdir = os.path.join(setdir, '.' + next_name)
-        with suppress(OSError):
-            os.mkdir(tmpdir)
-        tmpdir_fd = os.open(tmpdir, os.O_RDONLY)
-        try:
-            fcntl.flock(tmpdir_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
-        except IOError:
-            os.close(tmpdir_fd)
-            self.logerror('directory exists %r', tmpdir)
-            raise DirectoryAlreadyExistsError(tmpdir)
-        for path in Path(tmpdir).absolute().iterdir():
-            if path.is_dir():
-                shutil.rmtree(str(path))
-            else:
-                os.remove(str(path))
-        self.logdebug('created directory %r', tmpdir)
+        tmpdir_fd = self._lock_tmpdir(tmpdir)
 
         def commit(stream):
             assert not stream.group or stream.done == stream.streams.keys()
             self.lognoisy('committing %r', nextdir)
             streams = self._streaminfo(stream)
+            streams['fingerprint'] = self._fingerprint(handle, setdir)
             path = os.path.join(tmpdir, 'streams.json')
             fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
             f = os.fdopen(fd, 'w')
@@ -121,6 +122,124 @@ class Store(Mapping, LoggerMixin):
         self.pending[stream] = (tmpdir, tmpdir_fd)
         return stream
 
+    def _lock_tmpdir(self, tmpdir):
+        """Create and exclusively lock empty temporary directory.
+
+        The lock is held until the generation is committed and marks
+        the directory as in use, e.g. for ``marv store gc``. In case
+        gc removes a leftover directory before it is locked, the
+        directory is created again.
+
+        Returns:
+            File descriptor holding the lock.
+
+        Raises:
+            DirectoryAlreadyExistsError: Directory is locked by another run.
+
+        """
+        while True:
+            with suppress(FileExistsError):
+                os.mkdir(tmpdir)
+            try:
+                tmpdir_fd = os.open(tmpdir, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(tmpdir_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                os.close(tmpdir_fd)
+                self.logerror('directory exists %r', tmpdir)
+                raise DirectoryAlreadyExistsError(tmpdir)
+            with suppress(FileNotFoundError):
+                if os.stat(tmpdir).st_ino == os.fstat(tmpdir_fd).st_ino:
+                    break
+            os.close(tmpdir_fd)
+
+        for path in Path(tmpdir).absolute().iterdir():
+            if path.is_dir():
+                shutil.rmtree(str(path))
+            else:
+                os.remove(str(path))
+        self.logdebug('created directory %r', tmpdir)
+        return tmpdir_fd
+
+    def link_generations(self, srcid, setid):
+        """Link current generations of persistent nodes from another set.
+
+        Meant for sets with identical files. Generation directories are
+        recreated with the same name, files are hardlinked if possible,
+        and the fingerprint is updated for the files of the target set.
+        Nodes already present in the target set are skipped.
+
+        Args:
+            srcid: Setid of set to link generations from.
+            setid: Setid of set to link generations into.
+
+        Returns:
+            List of names of linked nodes.
+
+        """
+        srcdir = os.path.join(self.path, str(srcid))
+        setdir = os.path.join(self.path, str(setid))
+        linked = []
+        for name in sorted(self.nodes):
+            symlink = os.path.join(setdir, name)
+            if os.path.lexists(symlink):
+                continue
+            try:
+                gendir = os.readlink(os.path.join(srcdir, name))
+                srcgen = os.path.join(srcdir, gendir)
+                with open(os.path.join(srcgen, 'streams.json'), encoding='utf-8') as f:
+                    streams = json.load(f)
+            except OSError:
+                continue
+
+            # temporary directory of same name and lock as used by create_stream
+            tmpdir = os.path.join(setdir, f'.{gendir}')
+            try:
+                tmpdir_fd = self._lock_tmpdir(tmpdir)
+            except DirectoryAlreadyExistsError:
+                continue
+
+            try:
+                shutil.copytree(
+                    srcgen,
+                    tmpdir,
+                    symlinks=True,
+                    ignore=lambda path, names, top=srcgen: ['streams.json'] if path == top else [],
+                    copy_function=link_or_copy,
+                    dirs_exist_ok=True,
+                )
+                if fingerprint := streams.get('fingerprint'):
+                    fingerprint['files'] = self.files_fingerprints.get(str(setid))
+                with open(os.path.join(tmpdir, 'streams.json'), 'w', encoding='utf-8') as f:
+                    json.dump(streams, f, indent=2, sort_keys=True)
+                os.rename(tmpdir, os.path.join(setdir, gendir))
+                os.symlink(gendir, symlink)
+            except BaseException:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+                raise
+            finally:
+                fcntl.flock(tmpdir_fd, fcntl.LOCK_UN)
+                os.close(tmpdir_fd)
+            self.logdebug('linked %r from %r', name, srcdir)
+            linked.append(name)
+        return linked
+
+    def _fingerprint(self, handle, setdir):
+        inputs = {}
+        for dep in handle.node.deps:
+            name = self.name_by_node.get(dep)
+            if name is None:
+                continue
+            with suppress(OSError):
+                inputs[name] = os.readlink(os.path.join(setdir, name))
+        return {
+            'files': self.files_fingerprints.get(str(handle.setid)),
+            'specs_hash': handle.node.specs_hash,
+            'inputs': inputs,
+        }
+
     def _streaminfo(self, stream):
         return {
             'name': stream.name,
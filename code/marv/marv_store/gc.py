@@ -0,0 +1,229 @@
+# Copyright 2016 - 2021  Ternaris.
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""Garbage collection of unreachable store directories and stale cache entries."""
+
+import fcntl
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from functools import partial
+from logging import getLogger
+
+from marv_api.setid import SetID
+from marv_api.utils import file_cache_key
+from marv_node.node import CACHEDIR
+
+# Directories removed concurrently
+GC_WORKERS = 8
+
+# Set directories of unknown datasets and cache entries of unknown files
+# modified this recently are kept, as their dataset might be added by a
+# transaction not committed yet. Temporary directories modified this
+# recently are kept, as a node run might be about to lock them.
+GRACE_SECONDS = 3600
+
+# Generation directories and temporary directories of node runs
+GENDIR = re.compile(r'^\.?(.+)-\d+$')
+
+log = getLogger(__name__)
+
+
+def is_setid(name):
+    try:
+        SetID(name)
+    except ValueError:
+        return False
+    return True
+
+
+def find_unreachable_generations(setdir):
+    """Find generation directories not pointed to by node symlinks.
+
+    This includes temporary directories of aborted and running node
+    runs, the latter are skipped by :func:`remove` due to their lock.
+
+    """
+    with os.scandir(setdir) as entries:
+        entries = sorted(entries, key=lambda x: x.name)
+    reachable = set()
+    for entry in entries:
+        if entry.is_symlink():
+            with suppress(OSError):
+                reachable.add(os.readlink(entry.path))
+    return [
+        x.path for x in entries
+        if x.is_dir(follow_symlinks=False) and GENDIR.match(x.name) and x.name not in reachable
+    ]
+
+
+def find_garbage(storedir, setids, grace=GRACE_SECONDS):
+    """Find unreachable set and generation directories.
+
+    Set directories of datasets not in the database are unreachable,
+    e.g. after ``marv cleanup --discarded``. Within set directories of
+    known datasets, generation directories not pointed to by a node
+    symlink are unreachable.
+
+    Args:
+        storedir: Path of store.
+        setids: Setids of all datasets in database, including discarded.
+        grace: Seconds since modification to keep unknown set directories.
+
+    Returns:
+        List of paths of unreachable directories.
+
+    """
+    setids = {str(x) for x in setids}
+    threshold = time.time() - grace
+    garbage = []
+    with os.scandir(storedir) as entries:
+        entries = sorted(entries, key=lambda x: x.name)
+    for entry in entries:
+        if not entry.is_dir(follow_symlinks=False) or not is_setid(entry.name):
+            continue
+        if entry.name not in setids:
+            if entry.stat(follow_symlinks=False).st_mtime < threshold:
+                garbage.append(entry.path)
+            continue
+        garbage.extend(find_unreachable_generations(entry.path))
+    return garbage
+
+
+def remove(path, dry_run=False, grace=GRACE_SECONDS):
+    """Remove directory unless it is locked, recent, or became reachable.
+
+    The directory is locked like the temporary directories of
+    :meth:`marv_store.Store.create_stream`, which keep their lock until
+    the generation is committed and linked. Temporary directories are
+    created before they are locked, recently modified ones are kept.
+
+    Args:
+        path: Path of directory.
+        dry_run: Only determine files that would be removed.
+        grace: Seconds since modification to keep temporary directories.
+
+    Returns:
+        List of device, inode, size, and link count of removed files,
+        or None if directory was kept.
+
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+
+    try:
+        name = os.path.basename(path)
+        if name[0] == '.' and os.fstat(fd).st_mtime >= time.time() - grace:
+            log.info('skipping recent %s', path)
+            return None
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            log.info('skipping locked %s', path)
+            return None
+
+        # generation committed since garbage was found
+        if (match := GENDIR.match(name)) and name[0] != '.':
+            with suppress(OSError):
+                if os.readlink(os.path.join(os.path.dirname(path), match.group(1))) == name:
+                    return None
+
+        stats = []
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                with suppress(OSError):
+                    stat = os.lstat(os.path.join(dirpath, filename))
+                    stats.append((stat.st_dev, stat.st_ino, stat.st_size, stat.st_nlink))
+
+        log.info('%s %s', 'would remove' if dry_run else 'removing', path)
+        if not dry_run:
+            shutil.rmtree(path)
+        return stats
+    finally:
+        os.close(fd)
+
+
+def prune_cache(cachedir, keys, grace=GRACE_SECONDS, dry_run=False):
+    """Remove per-file cache entries of files no longer in the database.
+
+    Entries are named by :func:`marv_api.utils.file_cache_key` of their
+    file, optionally prefixed by a dot and followed by an extension.
+
+    Args:
+        cachedir: Path of directory containing cache directories of nodes.
+        keys: Cache keys of all files in database.
+        grace: Seconds since modification to keep entries of unknown files.
+        dry_run: Only determine entries that would be removed.
+
+    Returns:
+        List of paths and sizes of removed entries.
+
+    """
+    threshold = time.time() - grace
+    caches = []
+    with suppress(FileNotFoundError), os.scandir(cachedir) as entries:
+        caches = sorted(x.path for x in entries if x.is_dir(follow_symlinks=False))
+
+    pruned = []
+    for cache in caches:
+        with os.scandir(cache) as entries:
+            entries = sorted(entries, key=lambda x: x.name)
+        for entry in entries:
+            key = entry.name.lstrip('.').split('.')[0]
+            if key in keys or not entry.is_file(follow_symlinks=False):
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime >= threshold:
+                continue
+            log.info('%s %s', 'would remove' if dry_run else 'removing', entry.path)
+            if not dry_run:
+                with suppress(FileNotFoundError):
+                    os.unlink(entry.path)
+            pruned.append((entry.path, stat.st_size))
+    return pruned
+
+
+def collect_garbage(storedir, setids, files=None, dry_run=False, workers=GC_WORKERS):
+    """Remove unreachable directories and stale cache entries from store.
+
+    Directories are removed concurrently. Hardlinked files, e.g. of
+    generations linked from datasets with identical files, only count as
+    reclaimed if all their links are removed.
+
+    Args:
+        storedir: Path of store.
+        setids: Setids of all datasets in database, including discarded.
+        files: Path, size, and mtime of all files in database, including
+            those of discarded datasets, or None to keep cache entries.
+        dry_run: Only report what would be removed.
+        workers: Number of directories removed concurrently.
+
+    Returns:
+        Tuple of removed directories and cache entries, and number of
+        reclaimed bytes.
+
+    """
+    garbage = find_garbage(storedir, setids)
+    with ThreadPoolExecutor(workers) as executor:
+        results = list(executor.map(partial(remove, dry_run=dry_run), garbage))
+
+    inodes = {}
+    for stats in results:
+        for dev, ino, size, nlink in stats or ():
+            seen = inodes.get((dev, ino), (size, nlink, 0))[2]
+            inodes[(dev, ino)] = (size, nlink, seen + 1)
+    reclaimed = sum(size for size, nlink, seen in inodes.values() if seen >= nlink)
+    removed = [path for path, stats in zip(garbage, results) if stats is not None]
+
+    if files is not None:
+        keys = {file_cache_key(*x) for x in files}
+        pruned = prune_cache(os.path.join(storedir, CACHEDIR), keys, dry_run=dry_run)
+        removed.extend(path for path, _ in pruned)
+        reclaimed += sum(size for _, size in pruned)
+    return removed, reclaimed